@@ -0,0 +1,254 @@
+"""
+Локальный список доступа (allowlist) для решения о проходе без обращения к БД
+Номера карт до 24 бит хранятся в битовой карте (2 МБ), более длинные - во множестве.
+При запуске список загружается из снимка на диске, затем синхронизируется
+с таблицей изменений access_change по high-water mark (id последнего изменения).
+Изменения фиксируются не по порядку id, поэтому пропуски id ниже high-water mark
+отслеживаются, и пока пропуск не старше ACCESS_SYNC_SETTLE, изменения
+перечитываются начиная с него.
+"""
+
+import os
+import json
+import time
+import threading
+import logging
+
+BITMAP_BITS = 1 << 24
+SNAPSHOT_VERSION = 1
+
+SELECT_MAX_CHANGE = "SELECT COALESCE(MAX(id), 0) FROM access_change"
+SELECT_ALLOWED = "SELECT card FROM access_card"
+SELECT_CHANGES = "SELECT id, card, allowed FROM access_change WHERE id > %s ORDER BY id LIMIT %s"
+SELECT_CHANGE_IDS = "SELECT id FROM access_change WHERE id > %s AND id <= %s"
+
+
+class AccessList:
+    def __init__(self, db=None, snapshot_file=None):
+        self.db = db
+        self.snapshot_file = snapshot_file or os.getenv('ACCESS_SNAPSHOT', './access.snapshot')
+        self.configure()
+
+        self._bitmap = bytearray(BITMAP_BITS // 8)
+        # Номера карт шире 24 бит (форматы 34/37/48 бит)
+        self._wide = set()
+        self.count = 0
+        # id последнего примененного изменения из access_change
+        self.high_water_mark = 0
+        # Пропущенные id ниже high-water mark -> время обнаружения (monotonic)
+        self._gaps = {}
+        # Список загружен из снимка или из БД (до этого изменения не применяются)
+        self.loaded = False
+
+        self.granted = 0
+        self.denied = 0
+        self.synced = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def configure(self):
+        self.sync_interval = float(os.getenv('ACCESS_SYNC_INTERVAL', '10'))
+        self.sync_batch = int(os.getenv('ACCESS_SYNC_BATCH', '5000'))
+        # Сколько ждать фиксации изменения с пропущенным id (затем пропуск считается откатом)
+        self.sync_settle = float(os.getenv('ACCESS_SYNC_SETTLE', '60'))
+
+    def allowed(self, card_value):
+        """Проверка карты по локальному списку, O(1)"""
+        if 0 <= card_value < BITMAP_BITS:
+            return bool(self._bitmap[card_value >> 3] & (1 << (card_value & 7)))
+        return card_value in self._wide
+
+    def check(self, event):
+        """Событие с решением о доступе (поле granted)"""
+        granted = self.allowed(event.card.value)
+        if granted:
+            self.granted += 1
+        else:
+            self.denied += 1
+        return event._replace(granted=granted)
+
+    def _set(self, card_value, allowed):
+        if 0 <= card_value < BITMAP_BITS:
+            index, mask = card_value >> 3, 1 << (card_value & 7)
+            present = bool(self._bitmap[index] & mask)
+            if allowed and not present:
+                self._bitmap[index] |= mask
+                self.count += 1
+            elif not allowed and present:
+                self._bitmap[index] &= ~mask & 0xff
+                self.count -= 1
+        elif allowed and card_value not in self._wide:
+            self._wide.add(card_value)
+            self.count += 1
+        elif not allowed and card_value in self._wide:
+            self._wide.discard(card_value)
+            self.count -= 1
+
+    def load_snapshot(self):
+        """Загрузка снимка: строка-заголовок JSON и битовая карта"""
+        try:
+            with open(self.snapshot_file, 'rb') as f:
+                header = json.loads(f.readline())
+                bitmap = f.read()
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logging.error(f"Не удалось прочитать снимок списка доступа {self.snapshot_file}: {e}")
+            return False
+
+        if header.get('version') != SNAPSHOT_VERSION or len(bitmap) != len(self._bitmap):
+            logging.error(f"Снимок списка доступа {self.snapshot_file} имеет неверный формат")
+            return False
+
+        with self._lock:
+            self._bitmap[:] = bitmap
+            self._wide = set(header.get('wide', []))
+            self.count = header.get('count', 0)
+            self.high_water_mark = header.get('high_water_mark', 0)
+            self._gaps = dict.fromkeys(header.get('gaps', []), time.monotonic())
+            self.loaded = True
+        logging.info(f"Загружен снимок списка доступа: {self.count} карт, "
+                     f"изменение {self.high_water_mark}")
+        return True
+
+    def save_snapshot(self):
+        """Атомарная запись снимка на диск"""
+        with self._lock:
+            header = {
+                'version': SNAPSHOT_VERSION,
+                'high_water_mark': self.high_water_mark,
+                'count': self.count,
+                'wide': sorted(self._wide),
+                'gaps': sorted(self._gaps),
+            }
+            bitmap = bytes(self._bitmap)
+        tmp_file = self.snapshot_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(json.dumps(header, separators=(',', ':')).encode('utf-8') + b'\n')
+            f.write(bitmap)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.snapshot_file)
+
+    def _query(self, sql, params=()):
+        # db - подключение к MySQL или функция, возвращающая его (локальное хранилище)
+        db = self.db() if callable(self.db) else self.db
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def full_load(self):
+        """Полная загрузка списка из access_card"""
+        # Позиция берется до чтения списка: изменения после нее применятся при синхронизации
+        high_water_mark = self._query(SELECT_MAX_CHANGE)[0][0]
+        # Незафиксированные изменения ниже позиции дочитываются синхронизацией
+        first = max(high_water_mark - self.sync_batch, 0)
+        present = {change_id for (change_id,) in self._query(SELECT_CHANGE_IDS, (first, high_water_mark))}
+        now = time.monotonic()
+        gaps = {change_id: now for change_id in range(first + 1, high_water_mark) if change_id not in present}
+        rows = self._query(SELECT_ALLOWED)
+        with self._lock:
+            self._bitmap[:] = bytes(len(self._bitmap))
+            self._wide = set()
+            self.count = 0
+            for (card,) in rows:
+                self._set(int(card), True)
+            self.high_water_mark = high_water_mark
+            self._gaps = gaps
+            self.loaded = True
+        logging.info(f"Список доступа загружен из БД: {self.count} карт")
+
+    def sync(self):
+        """Применение изменений из access_change после high-water mark; возвращает их число
+
+        Изменение с меньшим id может быть зафиксировано позже большего. Пока
+        такой пропуск не старше sync_settle, изменения читаются с него и
+        применяются повторно в порядке id: итог для каждой карты - ее последнее
+        изменение, поэтому опоздавший отзыв доступа не теряется.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._gaps = {gap: seen for gap, seen in self._gaps.items() if now - seen < self.sync_settle}
+            start = min(self._gaps) - 1 if self._gaps else self.high_water_mark
+        applied = 0
+        while True:
+            rows = self._query(SELECT_CHANGES, (start, self.sync_batch))
+            if not rows:
+                break
+            with self._lock:
+                for change_id, card, allowed in rows:
+                    if change_id > self.high_water_mark:
+                        self._add_gaps(self.high_water_mark + 1, change_id, now)
+                        self.high_water_mark = change_id
+                        applied += 1
+                    elif self._gaps.pop(change_id, None) is not None:
+                        applied += 1
+                    self._set(int(card), bool(allowed))
+            start = rows[-1][0]
+            if len(rows) < self.sync_batch:
+                break
+        return applied
+
+    def _add_gaps(self, first, last, now):
+        """Пропуск id first..last-1 между примененными изменениями"""
+        if last - first > self.sync_batch:
+            # Скачок AUTO_INCREMENT (откат большой транзакции, перезапуск сервера)
+            logging.warning(f"Пропуск id {first}-{last - 1} в access_change не отслеживается")
+            return
+        for gap in range(first, last):
+            self._gaps[gap] = now
+
+    def start(self):
+        """Загрузка снимка и запуск фоновой синхронизации
+
+        Без снимка список загружается из БД в потоке синхронизации: загрузка
+        повторяется каждые ACCESS_SYNC_INTERVAL, пока БД недоступна.
+        """
+        if not self.load_snapshot() and self.db is None:
+            logging.warning("Снимок списка доступа отсутствует, все карты будут отклоняться")
+        if self.db is None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sync_loop, name='access-sync', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _sync_loop(self):
+        while not self._stop.is_set():
+            try:
+                if not self.loaded:
+                    self.full_load()
+                    self.save_snapshot()
+                elif self.sync():
+                    self.save_snapshot()
+                    logging.info(f"Список доступа обновлен до изменения {self.high_water_mark}: "
+                                 f"{self.count} карт")
+                self.synced = True
+            except Exception as e:
+                # Решения продолжают приниматься по локальному списку
+                if self.synced is not False:
+                    if self.loaded:
+                        logging.error(f"Ошибка синхронизации списка доступа: {e}")
+                    else:
+                        logging.error(f"Не удалось загрузить список доступа из БД: {e}")
+                self.synced = False
+            self._stop.wait(self.sync_interval)
+
+    def stats(self):
+        return {
+            'access_cards': self.count,
+            'access_granted': self.granted,
+            'access_denied': self.denied,
+            'access_high_water_mark': self.high_water_mark,
+            'access_pending_gaps': len(self._gaps),
+        }
@@ -0,0 +1,144 @@
+"""
+Демон на asyncio (DAEMON_MODE=asyncio)
+Модуль импортируется только в этом режиме: asyncio заметно увеличивает время запуска.
+"""
+
+import sys
+import time
+import signal
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from wg_daemon import WGDaemon, STARTED
+
+
+class AsyncWGDaemon(WGDaemon):
+    """Демон на asyncio (DAEMON_MODE=asyncio)
+
+    Захват кадров, запись в БД, статистика и сигналы - задачи одного цикла событий;
+    блокирующие вызовы драйвера и БД выполняются в пуле потоков.
+    """
+
+    mode = 'asyncio'
+
+    def __init__(self):
+        super().__init__()
+        self.loop = None
+        self.executor = None
+        self.workers = 0
+        self.capture_tasks = {}
+        self.stopping = None
+
+    def signal_handler(self, signum, frame=None):
+        super().signal_handler(signum, frame)
+        if self.stopping:
+            self.stopping.set()
+
+    def reload_handler(self, signum, frame=None):
+        super().reload_handler(signum, frame)
+        # Перечитывание выполняется в пуле: пересоздание считывателей ждет их задачи
+        self.loop.run_in_executor(self.executor, self.reload)
+
+    def start_reader(self, reader):
+        """Задача захвата считывателя (вызывается и из потока перечитывания конфигурации)"""
+        if len(self.readers) + 2 > self.workers:
+            # Размер пула не меняется: новые вызовы идут в новый пул, старый завершит текущие
+            previous = self.executor
+            self.workers = len(self.readers) + 2
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='wg-io')
+            previous.shutdown(wait=False)
+        self.loop.call_soon_threadsafe(self._create_capture_task, reader)
+
+    def _create_capture_task(self, reader):
+        self.capture_tasks[reader.reader_id] = asyncio.create_task(self.capture_task(reader))
+
+    def join_capture(self, reader):
+        task = self.capture_tasks.pop(reader.reader_id, None)
+        if task:
+            asyncio.run_coroutine_threadsafe(asyncio.wait([task], timeout=2), self.loop).result()
+
+    async def capture_task(self, reader):
+        """Захват кадров одного считывателя: событие обрабатывается сразу по завершении кадра"""
+        while self.running and reader in self.readers:
+            try:
+                event = await self.loop.run_in_executor(self.executor, reader.read_event, 1.0)
+                if event:
+                    self.handle_event(event)
+            except Exception as e:
+                self.errors_count += 1
+                logging.error(f"Ошибка захвата считывателя {reader.reader_id}: {e}")
+                await asyncio.sleep(1)
+
+    async def writer_task(self):
+        """Запись пакетов в БД; после остановки захвата очередь дописывается"""
+        next_stats_count = 100
+        while self.running or self.writer.depth:
+            try:
+                events = await self.loop.run_in_executor(self.executor, self.writer.next_batch, 0.5)
+                if not events:
+                    continue
+                await self.loop.run_in_executor(self.executor, self.writer.process, events)
+            except Exception as e:
+                self.errors_count += 1
+                logging.error(f"Ошибка записи: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            # Статистика каждые 100 карт
+            if self.writer.written >= next_stats_count:
+                self.log_statistics()
+                next_stats_count = (self.writer.written // 100 + 1) * 100
+
+    async def stats_task(self):
+        """Статистика каждые 10 минут"""
+        while self.running:
+            try:
+                await asyncio.wait_for(self.stopping.wait(), timeout=600)
+            except asyncio.TimeoutError:
+                self.log_statistics()
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self.loop.add_signal_handler(signum, self.signal_handler, signum)
+        self.loop.add_signal_handler(signal.SIGHUP, self.reload_handler, signal.SIGHUP)
+        # Поток на каждый считыватель, на запись и на перечитывание конфигурации,
+        # чтобы ожидание кадра не задерживало запись
+        self.workers = len(self.readers) + 2
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='wg-io')
+
+        self.running = True
+        self.start_time = time.time()
+        for reader in self.readers:
+            self._create_capture_task(reader)
+        self.startup['capture_ms'] = round((time.monotonic() - STARTED) * 1000)
+        logging.info(f"Демон запущен (asyncio), считывателей: {len(self.readers)}, "
+                     f"захват готов через {self.startup['capture_ms']} мс")
+        self.start_storage()
+        writer = asyncio.create_task(self.writer_task())
+        stats = asyncio.create_task(self.stats_task())
+
+        try:
+            await self.stopping.wait()
+            await asyncio.gather(*self.capture_tasks.values(), return_exceptions=True)
+            try:
+                await asyncio.wait_for(writer, timeout=10)
+            except asyncio.TimeoutError:
+                logging.error("Превышено время дозаписи очереди при остановке")
+            stats.cancel()
+        finally:
+            self.executor.shutdown(wait=True)
+
+    def run(self):
+        self.start_logging()
+        if not self.setup():
+            logging.error("Не удалось инициализировать демон")
+            sys.exit(1)
+
+        try:
+            asyncio.run(self.main())
+        except Exception as e:
+            logging.error(f"Критическая ошибка: {e}")
+        finally:
+            self.cleanup()
@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Нагрузочные тесты: декодирование, захват кадров, запись в БД, полный конвейер,
+запуск демона и рассылка событий подписчикам
+Кадры подаются синтетическими импульсами через симулированный бэкенд GPIO,
+запись идет в SQLite (по умолчанию) или в MySQL из .env. Результаты
+сохраняются в JSON и могут сравниваться с результатами предыдущей версии.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import random
+import platform
+import argparse
+import tempfile
+import threading
+import subprocess
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Направление улучшения метрик для сравнения с базовыми результатами
+HIGHER_IS_BETTER = {
+    ('decode', 'frames_per_sec'),
+    ('capture', 'frames_per_sec'),
+    ('writes', 'inserts_per_sec'),
+    ('end_to_end', 'frames_per_sec'),
+}
+LOWER_IS_BETTER = {
+    ('decode', 'cpu_us_per_frame'),
+    ('capture', 'cpu_ms_per_frame'),
+    ('capture', 'latency_ms', 'p50'),
+    ('capture', 'latency_ms', 'p99'),
+    ('end_to_end', 'card_to_commit_ms', 'p50'),
+    ('end_to_end', 'card_to_commit_ms', 'p99'),
+    ('startup', 'capture_ready_ms', 'p50'),
+    ('startup', 'first_card_ms', 'p50'),
+    ('events', 'publish_us'),
+    ('events', 'delivery_ms', 'p50'),
+    ('events', 'delivery_ms', 'p99'),
+}
+
+# Запуск демона в отдельном процессе: печатает строку при готовности захвата
+# и после обработки первой карты; MySQL при этом недоступен
+STARTUP_SCRIPT = '''
+import sys
+import time
+import wg_daemon
+from wiegand import FORMATS
+
+daemon = wg_daemon.WGDaemon()
+if not daemon.setup():
+    sys.exit(1)
+daemon.running = True
+daemon.start_time = time.time()
+daemon.start_capture()
+print('ready', flush=True)
+daemon.start_storage()
+reader = daemon.readers[0]
+reader.backend.send_frame(FORMATS[26].encode(12345), reader.zero_pin, reader.one_pin,
+                          pulse_us=50, interval_us=500)
+while reader.reader_id not in daemon.last_card_time:
+    time.sleep(0.001)
+print('card', flush=True)
+'''
+
+
+def percentiles(values):
+    """p50/p99/max в миллисекундах (метод ближайшего ранга)"""
+    if not values:
+        return {'p50': None, 'p99': None, 'max': None}
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p * len(ordered))) - 1))]
+    return {'p50': round(rank(0.50) * 1000, 3),
+            'p99': round(rank(0.99) * 1000, 3),
+            'max': round(ordered[-1] * 1000, 3)}
+
+
+def create_readers(count):
+    from gpio_backends import SimulatedBackend
+    from rfid_reader import RFIDReader
+    backend = SimulatedBackend()
+    readers = [RFIDReader(backend=backend, data0_pin=2 + i * 2, data1_pin=3 + i * 2,
+                          reader_id=f'bench{i + 1}', formats='26')
+               for i in range(count)]
+    return backend, readers
+
+
+def send_frames(backend, readers, frames, pulse_us, interval_us, sent):
+    """Отправка кадров: по потоку на считыватель, sent[значение] = время конца кадра"""
+    from wiegand import FORMATS
+
+    def sender(index, reader):
+        for value in range(index + 1, frames + 1, len(readers)):
+            backend.send_frame(FORMATS[26].encode(value), reader.zero_pin, reader.one_pin,
+                               pulse_us=pulse_us, interval_us=interval_us, block=True)
+            sent[value] = time.time()
+            # Пауза больше frame_gap, чтобы кадры не слились
+            time.sleep(reader.frame_gap * 1.5)
+
+    threads = [threading.Thread(target=sender, args=(i, reader), daemon=True)
+               for i, reader in enumerate(readers)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def bench_decode(frames):
+    """Декодирование кадров всех поддерживаемых форматов"""
+    from wiegand import FORMATS, decode
+    random.seed(1)
+    samples = [fmt.encode(random.randint(1, fmt.max_value)) for fmt in FORMATS.values() for _ in range(100)]
+    started, cpu_started = time.perf_counter(), time.process_time()
+    for i in range(frames):
+        decode(samples[i % len(samples)])
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    return {
+        'frames': frames,
+        'frames_per_sec': round(frames / elapsed),
+        'cpu_us_per_frame': round(cpu / frames * 1e6, 3),
+    }
+
+
+def bench_capture(frames, readers_count, pulse_us, interval_us):
+    """Захват кадров RFIDReader: задержка от конца кадра до события"""
+    backend, readers = create_readers(readers_count)
+    sent, latencies = {}, []
+    done = threading.Event()
+
+    def collector(reader):
+        while not done.is_set():
+            event = reader.read_event(timeout=0.2)
+            if event:
+                latencies.append(time.time() - sent.get(event.card.value, time.time()))
+
+    collectors = [threading.Thread(target=collector, args=(reader,), daemon=True) for reader in readers]
+    for thread in collectors:
+        thread.start()
+
+    started, cpu_started = time.perf_counter(), time.process_time()
+    for thread in send_frames(backend, readers, frames, pulse_us, interval_us, sent):
+        thread.join()
+    deadline = time.monotonic() + 2
+    while len(latencies) < frames and time.monotonic() < deadline:
+        time.sleep(0.01)
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    done.set()
+    for thread in collectors:
+        thread.join()
+    for reader in readers:
+        reader.cleanup()
+
+    return {
+        'frames': frames,
+        'readers': readers_count,
+        'received': len(latencies),
+        'rejected': sum(reader.frames_rejected for reader in readers),
+        'frames_per_sec': round(len(latencies) / elapsed, 1),
+        # Включает затраты симулятора импульсов
+        'cpu_ms_per_frame': round(cpu / max(len(latencies), 1) * 1000, 3),
+        'latency_ms': percentiles(latencies),
+    }
+
+
+def bench_writes(db, rows, batch_size):
+    """Пакетная запись в БД без захвата"""
+    cards = [(random.randint(1, 0xffffff), 'bench', time.time()) for _ in range(rows)]
+    started = time.perf_counter()
+    for start in range(0, rows, batch_size):
+        if not db.save_cards(cards[start:start + batch_size]):
+            raise RuntimeError("Ошибка записи в БД")
+    elapsed = time.perf_counter() - started
+    return {
+        'rows': rows,
+        'batch_size': batch_size,
+        'inserts_per_sec': round(rows / elapsed),
+    }
+
+
+def bench_end_to_end(db, frames, readers_count, pulse_us, interval_us):
+    """Полный конвейер демона: захват, очередь, журнал, запись в БД"""
+    from card_writer import CardWriter
+    from wg_daemon import WGDaemon
+
+    sent, latencies = {}, []
+    save_cards = db.save_cards
+
+    def timed_save_cards(cards):
+        result = save_cards(cards)
+        if result:
+            now = time.time()
+            latencies.extend(now - sent[card] for card, _, _ in cards if card in sent)
+        return result
+
+    db.save_cards = timed_save_cards
+    daemon = WGDaemon()
+    daemon.db = db
+    daemon.dedup.window = 0
+    daemon.writer = CardWriter(db)
+    backend, daemon.readers = create_readers(readers_count)
+    daemon.running = True
+    daemon.start_time = time.time()
+    daemon.writer.start()
+    daemon.start_capture()
+
+    started = time.perf_counter()
+    try:
+        for thread in send_frames(backend, daemon.readers, frames, pulse_us, interval_us, sent):
+            thread.join()
+        deadline = time.monotonic() + 5
+        while len(latencies) < frames and time.monotonic() < deadline:
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - started
+    finally:
+        daemon.running = False
+        for thread in daemon.capture_threads.values():
+            thread.join()
+        for reader in daemon.readers:
+            reader.cleanup()
+        daemon.writer.stop()
+        db.save_cards = save_cards
+
+    return {
+        'frames': frames,
+        'readers': readers_count,
+        'committed': len(latencies),
+        'frames_per_sec': round(len(latencies) / elapsed, 1),
+        'card_to_commit_ms': percentiles(latencies),
+    }
+
+
+def bench_startup(runs, target_ms):
+    """Холодный запуск: от старта процесса до готовности захвата и до первой карты"""
+    env = dict(os.environ,
+               GPIO_BACKEND='sim', READERS='bench1:24:23:26', STATUS_SOCKET='', METRICS_PORT='0',
+               ACCESS_CONTROL='0', CAPTURE_PROCESS='0', DAEMON_MODE='thread', STORAGE_BACKEND='mysql',
+               # Недоступный адрес (TEST-NET): подключение к БД зависает, как после отключения питания
+               DB_HOST='192.0.2.1')
+    ready, first_card = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        process = subprocess.Popen([sys.executable, '-c', STARTUP_SCRIPT], env=env, text=True,
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+        try:
+            for marks in (ready, first_card):
+                if not process.stdout.readline():
+                    raise RuntimeError("Процесс демона завершился до готовности захвата")
+                marks.append(time.perf_counter() - started)
+        finally:
+            process.kill()
+            process.wait()
+
+    capture_ready = percentiles(ready)
+    return {
+        'runs': runs,
+        'capture_ready_ms': capture_ready,
+        # Включает передачу кадра (26 бит по 0,5 мс) и паузу WIEGAND_FRAME_GAP_MS
+        'first_card_ms': percentiles(first_card),
+        'target_ms': target_ms,
+        'within_target': capture_ready['max'] <= target_ms,
+    }
+
+
+def bench_events(tmp, events, subscribers, interval_us):
+    """Рассылка событий: задержка доставки подписчикам и стоимость publish при зависшем подписчике"""
+    from event_stream import EventPublisher, iter_events
+    from rfid_reader import CardEvent
+    from wiegand import FORMATS, decode
+
+    path = os.path.join(tmp, 'events.sock')
+    publisher = EventPublisher().start(path=path, port=0)
+    delays = []
+    lock = threading.Lock()
+
+    def subscriber(stream):
+        for event in stream:
+            received = time.time()
+            with lock:
+                delays.append(received - event['time'])
+            if event['card'] == events:
+                break
+
+    streams = [iter_events(path, timeout=10) for _ in range(subscribers)]
+    threads = [threading.Thread(target=subscriber, args=(stream,), daemon=True) for stream in streams]
+    for thread in threads:
+        thread.start()
+    # Подписчик, который не читает: его очередь переполняется, остальные не должны замедлиться
+    stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stalled.connect(path)
+    deadline = time.time() + 5
+    while len(publisher.subscribers) < subscribers + 1 and time.time() < deadline:
+        time.sleep(0.01)
+
+    cards = [decode(FORMATS[26].encode(value)) for value in range(1, events + 1)]
+    publish_time = 0.0
+    for card in cards:
+        started = time.perf_counter()
+        publisher.publish(CardEvent('bench1', card, time.time()))
+        publish_time += time.perf_counter() - started
+        time.sleep(interval_us / 1e6)
+    for thread in threads:
+        thread.join(timeout=10)
+    stats = publisher.stats()
+    stalled.close()
+    publisher.stop()
+    return {
+        'events': events,
+        'subscribers': subscribers,
+        'publish_us': round(publish_time / events * 1e6, 3),
+        'delivery_ms': percentiles(delays),
+        'delivered': len(delays),
+        'dropped_for_stalled': stats['dropped'],
+    }
+
+
+def metadata():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                  text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        revision = ''
+    return {
+        'revision': revision or None,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+    }
+
+
+def lookup(results, path):
+    for key in path:
+        if not isinstance(results, dict) or key not in results:
+            return None
+        results = results[key]
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Список ухудшений относительно базовых результатов больше допуска"""
+    regressions = []
+    for path in sorted(HIGHER_IS_BETTER | LOWER_IS_BETTER):
+        current, previous = lookup(results, path), lookup(baseline, path)
+        if not current or not previous:
+            continue
+        change = (current - previous) / previous
+        worse = -change if path in HIGHER_IS_BETTER else change
+        if worse > tolerance:
+            regressions.append(f"{'.'.join(path)}: {previous} -> {current} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочные тесты считывателя")
+    parser.add_argument('--frames', type=int, default=200, help="кадров для захвата и полного конвейера")
+    parser.add_argument('--decode-frames', type=int, default=100000, help="кадров для теста декодирования")
+    parser.add_argument('--readers', type=int, default=2, help="число симулированных считывателей")
+    parser.add_argument('--pulse-us', type=int, default=50, help="длительность импульса, мкс")
+    parser.add_argument('--interval-us', type=int, default=500, help="период битов, мкс")
+    parser.add_argument('--rows', type=int, default=20000, help="строк для теста записи в БД")
+    parser.add_argument('--batch-size', type=int, default=int(os.getenv('WRITE_BATCH_SIZE', '100')))
+    parser.add_argument('--database', choices=['sqlite', 'mysql'], default='sqlite',
+                        help="sqlite - временная база, mysql - база из .env (пишет в таблицу pass)")
+    parser.add_argument('--startup-runs', type=int, default=5, help="запусков для теста холодного старта")
+    parser.add_argument('--startup-target-ms', type=float, default=float(os.getenv('STARTUP_TARGET_MS', '1000')),
+                        help="допустимое время от запуска до готовности захвата, мс")
+    parser.add_argument('--events', type=int, default=2000, help="событий для теста рассылки подписчикам")
+    parser.add_argument('--subscribers', type=int, default=4, help="подписчиков в тесте рассылки")
+    parser.add_argument('--only', choices=['decode', 'capture', 'writes', 'end_to_end', 'startup', 'events'],
+                        action='append', help="запустить только указанные тесты")
+    parser.add_argument('--output', help="файл для результатов JSON")
+    parser.add_argument('--baseline', help="JSON с результатами предыдущей версии для сравнения")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="допустимое ухудшение (доля)")
+    parser.add_argument('--verbose', action='store_true', help="выводить логи компонентов")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    selected = set(args.only or ['decode', 'capture', 'writes', 'end_to_end', 'startup', 'events'])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Журнал и снимки - во временном каталоге, чтобы не трогать рабочие данные
+        os.environ['SPOOL_DIR'] = os.path.join(tmp, 'spool')
+        os.environ.setdefault('LOG_DIR', os.path.join(tmp, 'logs'))
+        results = {'meta': metadata()}
+
+        db = None
+        if selected & {'writes', 'end_to_end'}:
+            if args.database == 'mysql':
+                from database import Database
+                db = Database()
+            else:
+                from storage import SQLiteStorage
+                # FULL: каждая фиксация дожидается fsync, как запись в MySQL с InnoDB
+                os.environ.setdefault('STORAGE_SQLITE_SYNC', 'FULL')
+                db = SQLiteStorage(os.path.join(tmp, 'bench.db'))
+            results['meta']['database'] = args.database
+
+        if 'decode' in selected:
+            results['decode'] = bench_decode(args.decode_frames)
+        if 'capture' in selected:
+            results['capture'] = bench_capture(args.frames, args.readers, args.pulse_us, args.interval_us)
+        if 'writes' in selected:
+            results['writes'] = bench_writes(db, args.rows, args.batch_size)
+        if 'end_to_end' in selected:
+            results['end_to_end'] = bench_end_to_end(db, args.frames, args.readers,
+                                                     args.pulse_us, args.interval_us)
+        if 'startup' in selected:
+            results['startup'] = bench_startup(args.startup_runs, args.startup_target_ms)
+        if 'events' in selected:
+            results['events'] = bench_events(tmp, args.events, args.subscribers, args.interval_us)
+        if db:
+            db.close()
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Ухудшения относительно базовых результатов:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print("Ухудшений относительно базовых результатов нет", file=sys.stderr)
+    if 'startup' in results and not results['startup']['within_target']:
+        print(f"Запуск до готовности захвата дольше {args.startup_target_ms:g} мс", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,450 @@
+"""
+Захват кадров в отдельном процессе (CAPTURE_PROCESS=1)
+Процесс захвата работает с GPIO и передает завершенные кадры основному
+процессу через кольцевой буфер в разделяемой памяти (один писатель, один
+читатель, без блокировок между процессами). Процесс захвата может закрепить
+память (mlockall), работать с приоритетом реального времени (SCHED_FIFO) и на
+выделенных ядрах, поэтому запись в БД, логирование и сборка мусора основного
+процесса не влияют на прием битов. Декодирование и валидация кадров остаются
+в основном процессе вместе с метриками и логами. Записи лога и статистика
+импульсов процесса захвата передаются основному процессу по каналу (Pipe).
+"""
+
+import os
+import gc
+import sys
+import time
+import mmap
+import queue
+import select
+import struct
+import signal
+import tempfile
+import threading
+import logging
+import multiprocessing
+from logging.handlers import QueueHandler
+from gpio_backends import create_backend
+from rfid_reader import RFIDReader
+
+# Заголовок: позиция записи и число отброшенных кадров (пишет процесс захвата),
+# позиция чтения (пишет основной процесс) - в разных строках кэша
+HEAD_OFFSET = 0
+DROPPED_OFFSET = 8
+TAIL_OFFSET = 64
+HEADER_SIZE = 128
+# Слот: время завершения кадра, биты (до 64), номер считывателя, число битов
+SLOT = struct.Struct('<dQBB6x')
+COUNTER = struct.Struct('<Q')
+SLOT_BITS = 64
+# Период передачи статистики импульсов основному процессу, сек
+PULSE_STATS_INTERVAL = 2.0
+
+
+class FrameRing:
+    """Кольцевой буфер кадров в разделяемой памяти (SPSC)
+
+    Писатель сначала заполняет слот, затем сдвигает позицию записи; читатель
+    читает слот и только после этого сдвигает позицию чтения. Позиции растут
+    монотонно, номер слота - позиция по модулю числа слотов.
+
+    Порядок записи в память между процессами гарантирован только на x86; на ARM
+    (Raspberry Pi) другое ядро может увидеть новую позицию раньше данных слота.
+    Поэтому позиции читаются и публикуются под межпроцессной блокировкой lock:
+    ее захват и освобождение служат барьерами памяти. Слоты копируются вне
+    блокировки, она удерживается только на время чтения и записи позиций.
+    """
+
+    def __init__(self, buffer, slots, lock=None):
+        self.buffer = buffer
+        self.slots = slots
+        self.lock = lock or threading.Lock()
+
+    def _positions(self, timeout=None):
+        """(позиция записи, позиция чтения) или None, если блокировка не получена"""
+        # timeout=None - без ограничения (у threading.Lock это timeout=-1)
+        if not (self.lock.acquire() if timeout is None else self.lock.acquire(timeout=timeout)):
+            return None
+        try:
+            return self._get(HEAD_OFFSET), self._get(TAIL_OFFSET)
+        finally:
+            self.lock.release()
+
+    def _publish(self, offset, value):
+        with self.lock:
+            self._set(offset, value)
+
+    @staticmethod
+    def size(slots):
+        return HEADER_SIZE + slots * SLOT.size
+
+    def _get(self, offset):
+        return COUNTER.unpack_from(self.buffer, offset)[0]
+
+    def _set(self, offset, value):
+        COUNTER.pack_into(self.buffer, offset, value)
+
+    @property
+    def dropped(self):
+        return self._get(DROPPED_OFFSET)
+
+    def depth(self):
+        return self._get(HEAD_OFFSET) - self._get(TAIL_OFFSET)
+
+    def push(self, reader_index, bits, timestamp):
+        """Запись кадра (вызывается только процессом захвата); False - буфер полон"""
+        head, tail = self._positions()
+        if head - tail >= self.slots:
+            self._set(DROPPED_OFFSET, self.dropped + 1)
+            return False
+        value = 0
+        for bit in bits[:SLOT_BITS]:
+            value = (value << 1) | bit
+        SLOT.pack_into(self.buffer, HEADER_SIZE + (head % self.slots) * SLOT.size,
+                       timestamp, value, reader_index, min(len(bits), 255))
+        # Позиция публикуется после записи слота
+        self._publish(HEAD_OFFSET, head + 1)
+        return True
+
+    def pop(self):
+        """(номер считывателя, биты, время) или None (вызывается только основным процессом)"""
+        # Ожидание ограничено: процесс захвата мог завершиться, удерживая блокировку
+        positions = self._positions(timeout=1.0)
+        if positions is None:
+            return None
+        head, tail = positions
+        if tail == head:
+            return None
+        timestamp, value, reader_index, bit_count = SLOT.unpack_from(
+            self.buffer, HEADER_SIZE + (tail % self.slots) * SLOT.size)
+        self._publish(TAIL_OFFSET, tail + 1)
+        stored = min(bit_count, SLOT_BITS)
+        bits = [(value >> (stored - 1 - i)) & 1 for i in range(stored)]
+        # Кадр длиннее слота передается только по длине - декодер его отклонит
+        bits.extend([0] * (bit_count - stored))
+        return reader_index, bits, timestamp
+
+
+def ring_path(pid=None):
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, f'rfid-capture-{pid or os.getpid()}')
+
+
+def remove_stale_rings():
+    """Удаление буферов, оставшихся после аварийно завершенных демонов"""
+    directory = os.path.dirname(ring_path())
+    for name in os.listdir(directory):
+        if not name.startswith('rfid-capture-'):
+            continue
+        try:
+            os.kill(int(name.rsplit('-', 1)[1]), 0)
+        except ProcessLookupError:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+        except (ValueError, OSError):
+            pass
+
+
+def parse_cpus(value):
+    """'2,3' или '2-3' -> {2, 3}"""
+    cpus = set()
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def apply_realtime(cpus, priority, lock_memory):
+    """Настройка процесса захвата; ошибки не фатальны (нет прав или лимитов)"""
+    if cpus:
+        try:
+            os.sched_setaffinity(0, parse_cpus(cpus))
+            logging.info(f"Процесс захвата закреплен за ядрами {cpus}")
+        except (OSError, ValueError) as e:
+            logging.warning(f"Не удалось закрепить процесс захвата за ядрами {cpus}: {e}")
+    if lock_memory:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        # MCL_CURRENT | MCL_FUTURE: страницы процесса не выгружаются
+        if libc.mlockall(1 | 2) != 0:
+            logging.warning(f"Не удалось закрепить память процесса захвата: "
+                            f"{os.strerror(ctypes.get_errno())} (проверьте LimitMEMLOCK)")
+    if priority:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+            logging.info(f"Процесс захвата работает с приоритетом SCHED_FIFO {priority}")
+        except (OSError, AttributeError) as e:
+            logging.warning(f"Не удалось установить приоритет реального времени: {e} (проверьте LimitRTPRIO)")
+
+
+class ParentChannel:
+    """Канал процесса захвата к основному процессу: записи лога и статистика импульсов"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        with self._lock:
+            self.conn.send(message)
+
+
+class PipeLogHandler(QueueHandler):
+    """Передача записей лога основному процессу (после Daemonize stderr - /dev/null)"""
+
+    def enqueue(self, record):
+        self.queue.send(record)
+
+
+class RemotePulses:
+    """Статистика импульсов считывателя, полученная от процесса захвата"""
+
+    def __init__(self, stats):
+        self.snapshot = stats
+
+    def stats(self):
+        return self.snapshot
+
+
+def run_capture(path, slots, configs, wake, options, log_conn=None, ring_lock=None):
+    """Точка входа процесса захвата"""
+    channel = ParentChannel(log_conn) if log_conn is not None else None
+    if channel is not None:
+        # Записи выводит основной процесс: один писатель файла лога и его ротации
+        handler = PipeLogHandler(channel)
+        handler.setFormatter(logging.Formatter('[capture] %(message)s'))
+        root = logging.getLogger()
+        root.handlers = [handler]
+        root.setLevel(logging.INFO)
+    else:
+        logging.basicConfig(level=logging.INFO, stream=sys.stderr,
+                            format='%(asctime)s - %(levelname)s - [capture] %(message)s')
+    parent = os.getppid()
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # Приоритет задается до создания потоков, чтобы они его унаследовали
+    apply_realtime(options['cpus'], options['priority'], options['lock_memory'])
+
+    with open(path, 'r+b') as f:
+        buffer = mmap.mmap(f.fileno(), FrameRing.size(slots))
+    ring = FrameRing(buffer, slots, ring_lock)
+    wake_fd = wake.fileno()
+    os.set_blocking(wake_fd, False)
+    push_lock = threading.Lock()
+
+    backend = create_backend()
+    readers = [RFIDReader(backend=backend, **config) for config in configs]
+    # Долгоживущие объекты исключаются из сборки мусора - паузы GC не растут с кучей
+    gc.freeze()
+
+    def capture(index, reader):
+        while not stopping.is_set():
+            try:
+                frame = reader._next_frame(0.5)
+                if frame is None:
+                    continue
+                bits, timestamp = frame
+                with push_lock:
+                    pushed = ring.push(index, bits, timestamp)
+                if not pushed:
+                    logging.warning(f"Буфер кадров переполнен, кадр считывателя {reader.reader_id} отброшен")
+                try:
+                    os.write(wake_fd, b'\0')
+                except BlockingIOError:
+                    # Канал заполнен - основной процесс и так будет разбужен
+                    pass
+            except Exception as e:
+                logging.error(f"Ошибка захвата считывателя {reader.reader_id}: {e}")
+                time.sleep(1)
+
+    threads = [threading.Thread(target=capture, args=(index, reader), name=f'capture-{reader.reader_id}',
+                                daemon=True)
+               for index, reader in enumerate(readers)]
+    for thread in threads:
+        thread.start()
+    logging.info(f"Процесс захвата запущен (PID: {os.getpid()}), считывателей: {len(readers)}")
+
+    # Завершение по SIGTERM или при завершении основного процесса
+    sent_pulses = {}
+    next_stats = 0.0
+    while not stopping.wait(0.5):
+        if os.getppid() != parent:
+            break
+        if channel is not None and time.monotonic() >= next_stats:
+            # Статистика импульсов нужна основному процессу для состояния и команды pulses;
+            # передается только при появлении новых импульсов
+            next_stats = time.monotonic() + PULSE_STATS_INTERVAL
+            pulses = {index: reader.pulses.stats() for index, reader in enumerate(readers)
+                      if reader.pulses and reader.pulses.count != sent_pulses.get(index)}
+            if pulses:
+                sent_pulses.update((index, stats['pulses']) for index, stats in pulses.items())
+                try:
+                    channel.send(('pulses', pulses))
+                except OSError:
+                    break
+    stopping.set()
+    for thread in threads:
+        thread.join(timeout=2)
+    for reader in readers:
+        reader.cleanup()
+    buffer.close()
+
+
+class RemoteReader(RFIDReader):
+    """Считыватель основного процесса: кадры приходят из процесса захвата"""
+
+    def setup_gpio(self):
+        # GPIO принадлежит процессу захвата
+        pass
+
+    def deliver(self, bits, timestamp):
+        try:
+            self._frames.put_nowait((bits, timestamp))
+        except queue.Full:
+            logging.warning(f"Очередь кадров считывателя {self.reader_id} переполнена, кадр отброшен")
+
+    def _next_frame(self, timeout):
+        try:
+            return self._frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def cleanup(self):
+        pass
+
+
+class CaptureProcess:
+    """Запуск процесса захвата и раздача кадров из кольцевого буфера считывателям"""
+
+    def __init__(self, configs):
+        self.configs = configs
+        self.slots = int(os.getenv('CAPTURE_RING_SLOTS', '1024'))
+        self.options = {
+            'cpus': os.getenv('CAPTURE_CPUS', ''),
+            'priority': int(os.getenv('CAPTURE_RT_PRIORITY', '0')),
+            'lock_memory': os.getenv('CAPTURE_MLOCK', '1') == '1',
+        }
+        self.readers = [RemoteReader(**config) for config in configs]
+        remove_stale_rings()
+        self.path = ring_path()
+        with open(self.path, 'w+b') as f:
+            f.truncate(FrameRing.size(self.slots))
+            self.buffer = mmap.mmap(f.fileno(), FrameRing.size(self.slots))
+        self.ring = FrameRing(self.buffer, self.slots)
+        self.restarts = 0
+        self.process = None
+        self._wake = None
+        self._running = False
+        self._thread = None
+        # spawn: дочерний процесс не наследует потоки и блокировки основного
+        self._context = multiprocessing.get_context('spawn')
+
+    def _spawn(self):
+        wake, child_wake = self._context.Pipe(duplex=False)
+        messages, child_messages = self._context.Pipe(duplex=False)
+        # Новая блокировка позиций: прежний процесс мог завершиться, удерживая ее
+        self.ring.lock = self._context.Lock()
+        # Конфигурации считывателей передаются без считывателей основного процесса
+        self.process = self._context.Process(
+            target=run_capture,
+            args=(self.path, self.slots, self.configs, child_wake, self.options, child_messages, self.ring.lock),
+            name='wg-capture', daemon=True
+        )
+        self.process.start()
+        child_wake.close()
+        child_messages.close()
+        self._wake = wake
+        threading.Thread(target=self._receive, args=(messages,), name='capture-messages', daemon=True).start()
+        logging.info(f"Запущен процесс захвата (PID: {self.process.pid})")
+
+    def start(self):
+        self._running = True
+        self._spawn()
+        self._thread = threading.Thread(target=self._dispatch, name='capture-dispatch', daemon=True)
+        self._thread.start()
+        return self
+
+    def _dispatch(self):
+        while self._running:
+            try:
+                ready, _, _ = select.select([self._wake], [], [], 0.5)
+                if ready:
+                    try:
+                        os.read(self._wake.fileno(), 4096)
+                    except OSError:
+                        pass
+                self.drain()
+                if self._running and not self.process.is_alive():
+                    logging.error(f"Процесс захвата завершился (код {self.process.exitcode}), перезапуск")
+                    self._wake.close()
+                    time.sleep(1)
+                    self.restarts += 1
+                    self._spawn()
+            except Exception as e:
+                logging.error(f"Ошибка приема кадров из процесса захвата: {e}")
+                time.sleep(1)
+
+    def _receive(self, conn):
+        """Записи лога процесса захвата - в логирование основного процесса, статистика - считывателям"""
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    # Процесс захвата завершился
+                    return
+                if isinstance(message, logging.LogRecord):
+                    logging.getLogger(message.name).handle(message)
+                elif message[0] == 'pulses':
+                    for index, stats in message[1].items():
+                        if index < len(self.readers):
+                            self.readers[index].pulses = RemotePulses(stats)
+
+    def drain(self):
+        """Раздача накопленных кадров считывателям; возвращает их число"""
+        count = 0
+        while True:
+            frame = self.ring.pop()
+            if frame is None:
+                return count
+            reader_index, bits, timestamp = frame
+            if reader_index < len(self.readers):
+                self.readers[reader_index].deliver(bits, timestamp)
+            count += 1
+
+    def stop(self, timeout=3):
+        self._running = False
+        if self.process and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.kill()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+        self.drain()
+        self.buffer.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def stats(self):
+        return {
+            'pid': self.process.pid if self.process else None,
+            'alive': bool(self.process and self.process.is_alive()),
+            'restarts': self.restarts,
+            'ring_depth': self.ring.depth(),
+            'ring_slots': self.slots,
+            'dropped': self.ring.dropped,
+        }
@@ -0,0 +1,200 @@
+"""
+Фоновая запись событий считывателей в базу данных
+Захват карт не ждет БД: события передаются через ограниченную очередь,
+затем (если включен журнал) сохраняются на диск и переносятся в БД пакетами
+"""
+
+import os
+import queue
+import threading
+import time
+import logging
+from spool import CardSpool
+import metrics
+
+
+class CardWriter:
+    def __init__(self, db, max_size=None):
+        self.db = db
+        max_size = max_size or int(os.getenv('WRITE_QUEUE_SIZE', '10000'))
+        self.queue = queue.Queue(maxsize=max_size)
+        self.max_retries = 5
+        self.retry_delay = 1
+        self.configure()
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.written_by_reader = {}
+        # Результат и время последней записи в БД (None - записей еще не было)
+        self.db_ok = None
+        self.db_checked = None
+        self._stop = threading.Event()
+        self._thread = None
+        # Локальный журнал: события переживают недоступность БД
+        # (для локального хранилища не нужен - запись в него не зависит от сети)
+        self.spool = None
+        if os.getenv('SPOOL_ENABLED', '1') == '1' and not getattr(db, 'local', False):
+            self.spool = CardSpool(self._save_records)
+        metrics.WRITE_QUEUE_DEPTH.set_function(function=self.queue.qsize)
+        if self.spool:
+            metrics.SPOOL_PENDING_BYTES.set_function(function=self.spool.pending_bytes)
+            metrics.SPOOL_SIZE_BYTES.set_function(function=self.spool.size_bytes)
+
+    def configure(self):
+        """Параметры пакетной записи (перечитываются без сброса очереди)"""
+        # Пакет сбрасывается при накоплении batch_size событий или через flush_interval
+        self.batch_size = int(os.getenv('WRITE_BATCH_SIZE', '100'))
+        self.flush_interval = float(os.getenv('WRITE_FLUSH_MS', '50')) / 1000
+
+    def start(self, thread=True):
+        """Запуск записи; thread=False - пакеты обрабатывает вызывающий (next_batch/process)"""
+        self._stop.clear()
+        if self.spool:
+            self.spool.start()
+        if thread:
+            self._thread = threading.Thread(target=self._run, name='card-writer', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=10):
+        """Остановка потока записи с дозаписью очереди (не дольше timeout секунд)"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        if self.depth:
+            logging.error(f"При остановке не записано событий: {self.depth}")
+        if self.spool:
+            # Не перенесенные в БД события остаются в журнале до следующего запуска
+            self.spool.stop()
+
+    def submit(self, event):
+        """Постановка события в очередь записи без блокировки"""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            metrics.WRITE_QUEUE_DROPPED.inc(event.reader_id)
+            logging.error(f"Очередь записи переполнена, карта {event.card.value} "
+                          f"(считыватель {event.reader_id}) отброшена")
+            return False
+
+    @property
+    def depth(self):
+        """Текущая глубина очереди записи"""
+        return self.queue.qsize()
+
+    def stats(self):
+        stats = {
+            'written': self.written,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'queue_depth': self.depth,
+            'queue_size': self.queue.maxsize,
+            'db_ok': self.db_ok,
+            'db_checked': self.db_checked,
+        }
+        if self.spool:
+            stats.update(self.spool.stats())
+        return stats
+
+    def _run(self):
+        while not (self._stop.is_set() and self.queue.empty()):
+            events = self.next_batch()
+            if events:
+                self.process(events)
+
+    def next_batch(self, timeout=0.5):
+        """Ожидание очередного пакета событий (пустой список по таймауту)"""
+        try:
+            event = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return []
+        return self._collect(event)
+
+    def process(self, events):
+        """Сохранение пакета: в журнал или напрямую в БД"""
+        if self.spool:
+            self._spool(events)
+        else:
+            self._write(events)
+
+    def _collect(self, event):
+        """Пакет событий: до batch_size штук или до истечения flush_interval от первого"""
+        events = [event]
+        deadline = time.monotonic() + self.flush_interval
+        while len(events) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0 and not self._stop.is_set():
+                    events.append(self.queue.get(timeout=remaining))
+                else:
+                    events.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def _spool(self, events):
+        records = [{
+            'reader': event.reader_id,
+            'card': event.card.value,
+            'time': event.timestamp,
+            'format': event.card.format,
+        } for event in events]
+        try:
+            self.spool.append(records)
+        except OSError as e:
+            # Журнал недоступен (например, диск заполнен): пишем напрямую в БД
+            logging.error(f"Ошибка записи в журнал: {e}")
+            self._write(events)
+
+    def _save_records(self, records):
+        """Перенос записей журнала в БД; возвращает число сохраненных с начала пакета"""
+        valid = []
+        for record in records:
+            if self.db.validate_card_data(record['card']):
+                valid.append(record)
+            else:
+                # Невалидная запись не должна блокировать журнал
+                self.failed += 1
+
+        if not self._save_cards([(r['card'], r['reader'], r['time']) for r in valid]):
+            return 0
+        for record in valid:
+            self._count_written(record['reader'], record['time'])
+        return len(records)
+
+    def _save_cards(self, cards):
+        """Пакетная запись в БД с замером времени"""
+        started = time.perf_counter()
+        saved = False
+        try:
+            saved = self.db.save_cards(cards)
+            return saved
+        finally:
+            metrics.DB_SECONDS.observe(value=time.perf_counter() - started)
+            self.db_ok = bool(saved)
+            self.db_checked = time.time()
+
+    def _count_written(self, reader_id, timestamp=None):
+        self.written += 1
+        self.written_by_reader[reader_id] = self.written_by_reader.get(reader_id, 0) + 1
+        metrics.DB_ROWS.inc(reader_id)
+        if timestamp is not None:
+            metrics.COMMIT_LATENCY.observe(reader_id, value=max(time.time() - timestamp, 0.0))
+
+    def _write(self, events):
+        """Запись пакета событий напрямую в БД с повторными попытками"""
+        cards = [(event.card.value, event.reader_id, event.timestamp) for event in events]
+        for attempt in range(self.max_retries):
+            if self._save_cards(cards):
+                for event in events:
+                    self._count_written(event.reader_id, event.timestamp)
+                return True
+            if attempt + 1 < self.max_retries and not self._stop.is_set():
+                time.sleep(self.retry_delay)
+
+        self.failed += len(events)
+        logging.error(f"Не удалось сохранить пакет из {len(events)} карт "
+                      f"после {self.max_retries} попыток: {', '.join(str(card[0]) for card in cards)}")
+        return False
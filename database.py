@@ -1,32 +1,88 @@
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
+from mysql.connector.errors import PoolError
 import os
 import time
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import logging
+from storage import Storage
 
 load_dotenv()
 
-class Database:
-    def __init__(self):
+INSERT_PASS = "INSERT INTO pass (time, card) VALUES (%s, %s)"
+INSERT_PASS_WITH_READER = "INSERT INTO pass (time, card, reader) VALUES (%s, %s, %s)"
+COUNT_PASSES_SINCE = "SELECT COUNT(*) FROM pass WHERE time > %s"
+
+
+@lru_cache(maxsize=64)
+def insert_rows_query(rows, with_reader):
+    """Многострочный INSERT на rows строк (для подготовленного запроса)
+
+    Строка кэшируется: курсор mysql.connector готовит запрос заново, если ему
+    передан другой объект строки, даже равный предыдущему.
+    """
+    if with_reader:
+        return "INSERT INTO pass (time, card, reader) VALUES " + ", ".join(["(%s, %s, %s)"] * rows)
+    return "INSERT INTO pass (time, card) VALUES " + ", ".join(["(%s, %s)"] * rows)
+
+
+class Database(Storage):
+    name = 'mysql'
+
+    def __init__(self, pool_size=None, connect=True):
         self.connection = None
+        # Пул соединений (DB_POOL_SIZE > 0) для нескольких потоков записи и мониторинга
+        self.pool = None
+        self.pool_size = pool_size if pool_size is not None else int(os.getenv('DB_POOL_SIZE', '0'))
+        # Сколько ждать свободного соединения, когда все соединения пула заняты
+        self.pool_timeout = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+        # Подготовленные на сервере запросы для вставки и проверки активности
+        self.use_prepared = os.getenv('DB_PREPARED', '1') == '1'
+        # Подготовленных запросов на соединение: многострочный INSERT свой для каждого размера пакета
+        self.prepared_cache_size = int(os.getenv('DB_PREPARED_CACHE', '16'))
+        # Основное соединение используется потоками по очереди
+        self._lock = threading.RLock()
+        # Наличие столбца reader в таблице pass (определяется при первой записи)
+        self.has_reader_column = None
         self.max_retries = 3
         self.retry_delay = 1
-        self.connect()
+        # Максимум строк в одном многострочном INSERT
+        self.insert_chunk_size = int(os.getenv('DB_INSERT_CHUNK', '1000'))
+        # connect=False - подключение при первом запросе (запуск демона не ждет БД)
+        if connect:
+            self.connect()
+
+    def _connection_params(self):
+        return dict(
+            host=os.getenv('DB_HOST'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            database=os.getenv('DB_NAME'),
+            autocommit=True,
+            charset='utf8mb4'
+        )
 
     def connect(self):
         retry_count = 0
         while retry_count < self.max_retries:
             try:
-                self.connection = mysql.connector.connect(
-                    host=os.getenv('DB_HOST'),
-                    user=os.getenv('DB_USER'),
-                    password=os.getenv('DB_PASSWORD'),
-                    database=os.getenv('DB_NAME'),
-                    autocommit=True,
-                    charset='utf8mb4'
-                )
-                logging.info("Успешное подключение к базе данных")
+                if self.pool_size > 0:
+                    if self.pool is None:
+                        # Сброс сессии при возврате в пул отключен: он удаляет подготовленные запросы
+                        self.pool = pooling.MySQLConnectionPool(
+                            pool_name=os.getenv('DB_POOL_NAME', 'rfid_reader'),
+                            pool_size=self.pool_size,
+                            pool_reset_session=False,
+                            **self._connection_params()
+                        )
+                    logging.info(f"Успешное подключение к базе данных (пул из {self.pool_size} соединений)")
+                else:
+                    self.connection = mysql.connector.connect(**self._connection_params())
+                    logging.info("Успешное подключение к базе данных")
                 return
             except Error as e:
                 retry_count += 1
@@ -36,33 +92,141 @@ class Database:
                 else:
                     raise
 
-    def validate_card_data(self, card_number):
-        """Валидация данных карты перед сохранением"""
-        if card_number is None:
-            return False
-        
-        # Проверяем, что card_number является числом
+    def _checkout(self):
+        """Соединение из пула с проверкой работоспособности"""
+        last_error = None
+        for _ in range(self.pool_size):
+            conn = self._pool_connection()
+            try:
+                if not conn.is_connected():
+                    raw = getattr(conn, '_cnx', conn)
+                    raw.reconnect(attempts=1, delay=0)
+                    self._forget_statements(raw)
+                return conn
+            except Error as e:
+                last_error = e
+                conn.close()
+        raise last_error
+
+    def _pool_connection(self):
+        """Свободное соединение пула; при исчерпании пула - ожидание до DB_POOL_TIMEOUT"""
+        deadline = time.monotonic() + self.pool_timeout
+        delay = 0.005
+        while True:
+            try:
+                return self.pool.get_connection()
+            except PoolError:
+                # get_connection не ждет: занятые соединения опрашиваются с нарастающей паузой
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, 0.1)
+
+    @contextmanager
+    def get_connection(self):
+        """Соединение для запросов: из пула или основное (с переподключением)"""
+        if self.pool_size > 0:
+            if self.pool is None:
+                with self._lock:
+                    if self.pool is None:
+                        self.connect()
+            conn = self._checkout()
+            try:
+                yield conn
+            finally:
+                # Возврат соединения в пул
+                conn.close()
+        else:
+            with self._lock:
+                if not self.connection or not self.connection.is_connected():
+                    self.connect()
+                yield self.connection
+
+    def _prepared_cursor(self, conn, query):
+        """Курсор с подготовленным запросом, кэшируется на соединение"""
+        raw = getattr(conn, '_cnx', conn)
+        statements = getattr(raw, '_rfid_statements', None)
+        if statements is None:
+            statements = OrderedDict()
+            raw._rfid_statements = statements
+        cursor = statements.get(query)
+        if cursor is None:
+            cursor = raw.cursor(prepared=True)
+            statements[query] = cursor
+            # Давно не использованный запрос освобождается на сервере
+            while len(statements) > self.prepared_cache_size:
+                _, evicted = statements.popitem(last=False)
+                try:
+                    evicted.close()
+                except Exception:
+                    pass
+        else:
+            statements.move_to_end(query)
+        return cursor
+
+    def _forget_statements(self, conn):
+        raw = getattr(conn, '_cnx', conn)
+        for cursor in getattr(raw, '_rfid_statements', {}).values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        raw._rfid_statements = OrderedDict()
+
+    def _execute(self, conn, query, params, fetch=False):
+        """Выполнение запроса (подготовленного, если включено)"""
+        if not self.use_prepared:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                return cursor.fetchall() if fetch else None
+            finally:
+                cursor.close()
+
+        cursor = self._prepared_cursor(conn, query)
         try:
-            card_number = int(card_number)
-        except (ValueError, TypeError):
-            logging.warning(f"Недопустимый тип данных для номера карты: {type(card_number)}")
-            return False
-        
-        # Проверяем диапазон
-        if card_number < 1 or card_number > 0x00ffffff:
-            logging.warning(f"Номер карты вне допустимого диапазона: {card_number}")
-            return False
-            
-        return True
+            cursor.execute(query, params)
+            return cursor.fetchall() if fetch else None
+        except Error:
+            # Подготовленный запрос мог стать недействительным (переподключение)
+            self._forget_statements(conn)
+            raise
+
+    def _recover(self):
+        """Переподключение после ошибки запроса"""
+        if self.pool:
+            # Соединения пула проверяются при следующем получении
+            return
+        try:
+            with self._lock:
+                self.connect()
+        except Exception:
+            pass
+
+    def detect_reader_column(self, conn=None):
+        """Проверка наличия столбца reader в таблице pass"""
+        if conn is None:
+            with self.get_connection() as conn:
+                return self.detect_reader_column(conn)
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SHOW COLUMNS FROM pass LIKE 'reader'")
+            self.has_reader_column = cursor.fetchone() is not None
+        finally:
+            cursor.close()
+        if not self.has_reader_column:
+            logging.warning("В таблице pass нет столбца reader, идентификатор считывателя не сохраняется")
+        return self.has_reader_column
 
-    def save_card(self, card_number):
+    def save_card(self, card_number, reader_id=None, event_time=None):
         # Валидация данных
         if not self.validate_card_data(card_number):
             logging.error(f"Невалидные данные карты: {card_number}")
             return False
 
         # Проверка подключения
-        if not self.connection or not self.connection.is_connected():
+        if not self.pool and (not self.connection or not self.connection.is_connected()):
             try:
                 self.connect()
             except Exception as e:
@@ -72,11 +236,15 @@ class Database:
         retry_count = 0
         while retry_count < self.max_retries:
             try:
-                cursor = self.connection.cursor()
-                query = "INSERT INTO pass (time, card) VALUES (%s, %s)"
-                current_time = int(time.time())
-                cursor.execute(query, (current_time, str(card_number)))
-                self.connection.commit()
+                with self.get_connection() as conn:
+                    if self.has_reader_column is None:
+                        self.detect_reader_column(conn)
+                    current_time = int(event_time if event_time is not None else time.time())
+                    if self.has_reader_column:
+                        self._execute(conn, INSERT_PASS_WITH_READER, (current_time, int(card_number), reader_id))
+                    else:
+                        self._execute(conn, INSERT_PASS, (current_time, int(card_number)))
+                    conn.commit()
                 logging.info(f"Карта {card_number} успешно сохранена в {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(current_time))}")
                 return True
             except Error as e:
@@ -85,32 +253,108 @@ class Database:
                 if retry_count < self.max_retries:
                     time.sleep(self.retry_delay)
                     # Попытка переподключения
-                    try:
-                        self.connect()
-                    except:
-                        pass
-            finally:
-                if 'cursor' in locals():
-                    cursor.close()
-        
+                    self._recover()
+
         logging.error(f"Не удалось сохранить карту {card_number} после {self.max_retries} попыток")
         return False
 
+    def save_cards(self, cards):
+        """Пакетное сохранение карт: cards - список (номер карты, считыватель, время)"""
+        rows = []
+        for card_number, reader_id, event_time in cards:
+            if not self.validate_card_data(card_number):
+                logging.error(f"Невалидные данные карты: {card_number}")
+                continue
+            current_time = int(event_time if event_time is not None else time.time())
+            rows.append((current_time, int(card_number), reader_id))
+        if not rows:
+            return True
+
+        # Проверка подключения
+        if not self.pool and (not self.connection or not self.connection.is_connected()):
+            try:
+                self.connect()
+            except Exception as e:
+                logging.error(f"Не удалось переподключиться к базе данных: {e}")
+                return False
+
+        retry_count = 0
+        while retry_count < self.max_retries:
+            try:
+                with self.get_connection() as conn:
+                    if self.has_reader_column is None:
+                        self.detect_reader_column(conn)
+                    with_reader = self.has_reader_column
+                    params = rows if with_reader else [row[:2] for row in rows]
+                    cursor = None if self.use_prepared else conn.cursor()
+                    try:
+                        conn.start_transaction()
+                        # Пакет делится на части, чтобы не превысить max_allowed_packet
+                        for start in range(0, len(params), self.insert_chunk_size):
+                            chunk = params[start:start + self.insert_chunk_size]
+                            if cursor is None:
+                                # Подготовленный многострочный INSERT: полные пакеты под нагрузкой
+                                # и одиночные события повторяют размер и не разбираются заново
+                                self._execute(conn, insert_rows_query(len(chunk), with_reader),
+                                              [value for row in chunk for value in row])
+                            else:
+                                # executemany объединяет строки в многострочный INSERT
+                                cursor.executemany(INSERT_PASS_WITH_READER if with_reader else INSERT_PASS, chunk)
+                        conn.commit()
+                    except Error:
+                        try:
+                            conn.rollback()
+                        except Exception:
+                            pass
+                        raise
+                    finally:
+                        if cursor is not None:
+                            cursor.close()
+                logging.info(f"Сохранено карт пакетом: {len(rows)}")
+                return True
+            except Error as e:
+                retry_count += 1
+                logging.error(f"Ошибка пакетного сохранения {len(rows)} карт (попытка {retry_count}/{self.max_retries}): {e}")
+                if retry_count < self.max_retries:
+                    time.sleep(self.retry_delay)
+                    # Попытка переподключения
+                    self._recover()
+
+        logging.error(f"Не удалось сохранить пакет из {len(rows)} карт после {self.max_retries} попыток")
+        return False
+
+    def check_schema(self):
+        """Проверка структуры таблицы pass после подключения"""
+        self.detect_reader_column()
+
+    def count_passes_since(self, since):
+        """Количество проходов после указанного времени (unix time)"""
+        with self.get_connection() as conn:
+            return self._execute(conn, COUNT_PASSES_SINCE, (int(since),), fetch=True)[0][0]
+
     def test_connection(self):
         """Тест подключения к базе данных"""
         try:
-            if not self.connection or not self.connection.is_connected():
-                self.connect()
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT 1")
-            cursor.fetchone()
-            cursor.close()
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+                cursor.close()
             logging.info("Тест подключения к базе данных успешен")
             return True
         except Exception as e:
             logging.error(f"Тест подключения к базе данных не удался: {e}")
             return False
 
+    def close(self):
+        """Закрытие основного соединения (после завершения выполняемого запроса)"""
+        with self._lock:
+            if self.connection:
+                self._forget_statements(self.connection)
+                if self.connection.is_connected():
+                    self.connection.close()
+                self.connection = None
+
     def __del__(self):
         if self.connection and self.connection.is_connected():
-            self.connection.close() 
\ No newline at end of file
+            self.connection.close()
\ No newline at end of file
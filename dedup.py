@@ -0,0 +1,62 @@
+"""
+Подавление повторных чтений одной и той же карты
+Карта, удерживаемая у считывателя, читается многократно; в БД попадает одно событие
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+import metrics
+
+
+class DuplicateFilter:
+    def __init__(self, window=None, max_entries=None):
+        self.configure(window, max_entries)
+        # (считыватель, карта) -> время последнего чтения; порядок - от давних к свежим
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.suppressed = 0
+        self.suppressed_by_reader = {}
+
+    def configure(self, window=None, max_entries=None):
+        """Настройки фильтра (при перечитывании конфигурации запомненные чтения сохраняются)"""
+        # Окно подавления в секундах (0 - фильтр выключен)
+        self.window = window if window is not None else float(os.getenv('DEDUP_WINDOW_MS', '3000')) / 1000
+        self.max_entries = max_entries or int(os.getenv('DEDUP_MAX_ENTRIES', '4096'))
+
+    def accept(self, event, now=None):
+        """True, если событие нужно обработать; False для повтора в пределах окна"""
+        if self.window <= 0:
+            return True
+        now = time.monotonic() if now is None else now
+        key = (event.reader_id, event.card.value)
+
+        with self._lock:
+            # Устаревшие записи находятся в начале словаря
+            while self._seen:
+                oldest_key, oldest_time = next(iter(self._seen.items()))
+                if now - oldest_time < self.window:
+                    break
+                del self._seen[oldest_key]
+
+            duplicate = key in self._seen
+            # Повтор продлевает окно: удержание карты дает одно событие
+            self._seen[key] = now
+            self._seen.move_to_end(key)
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+
+            if duplicate:
+                self.suppressed += 1
+                self.suppressed_by_reader[event.reader_id] = self.suppressed_by_reader.get(event.reader_id, 0) + 1
+                metrics.DUPLICATES.inc(event.reader_id)
+                return False
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._seen.clear()
+
+    def __len__(self):
+        return len(self._seen)
@@ -0,0 +1,214 @@
+"""
+Рассылка событий проходов локальным подписчикам
+Подписчик подключается к Unix-сокету (EVENT_SOCKET) или TCP-порту (EVENT_PORT)
+и получает события построчно в JSON сразу после решения о проходе, без опроса
+таблицы pass. У каждого подписчика своя очередь ограниченного размера и свой
+поток отправки: при медленном подписчике отбрасываются самые старые события,
+а захват и запись в БД не ждут отправки.
+"""
+
+import os
+import json
+import select
+import socket
+import socketserver
+import threading
+import logging
+from collections import deque
+import metrics
+
+
+def event_json(event, seq):
+    """Строка NDJSON для события; seq - сквозной номер (пропуски - отброшенные события)"""
+    record = {
+        'seq': seq,
+        'reader': event.reader_id,
+        'card': event.card.value,
+        'format': event.card.format,
+        'facility': event.card.facility,
+        'card_number': event.card.card_number,
+        'time': event.timestamp,
+    }
+    if event.granted is not None:
+        record['granted'] = event.granted
+    return json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+class Subscriber:
+    """Очередь одного подписчика: при переполнении вытесняется самое старое событие"""
+
+    def __init__(self, size, address):
+        self.queue = deque(maxlen=size)
+        self.ready = threading.Event()
+        self.address = address
+        self.sent = 0
+        self.dropped = 0
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def setup(self):
+        if self.request.family != socket.AF_UNIX:
+            # События отправляются по одному - без задержки Нейгла
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.request.settimeout(self.server.publisher.send_timeout)
+
+    def handle(self):
+        publisher = self.server.publisher
+        subscriber = publisher.subscribe(self.client_address or 'unix')
+        try:
+            while publisher.running:
+                if not subscriber.ready.wait(1.0):
+                    if self._closed():
+                        break
+                    continue
+                subscriber.ready.clear()
+                lines = []
+                while subscriber.queue:
+                    lines.append(subscriber.queue.popleft())
+                if lines:
+                    self.request.sendall(b''.join(lines))
+                    subscriber.sent += len(lines)
+        except OSError as e:
+            # Подписчик отключился или не принимает данные дольше EVENT_SEND_TIMEOUT
+            logging.debug(f"Подписчик событий {subscriber.address} отключен: {e}")
+        finally:
+            publisher.unsubscribe(subscriber)
+
+    def _closed(self):
+        """Подписчик закрыл соединение (проверяется, пока событий нет); присланные им данные отбрасываются"""
+        readable, _, _ = select.select([self.request], [], [], 0)
+        return bool(readable) and not self.request.recv(4096)
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class EventPublisher:
+    """Рассылка событий всем подписчикам; publish не блокируется на сети"""
+
+    def __init__(self, buffer_size=None):
+        self.configure(buffer_size)
+        # Кортеж заменяется целиком при подключении и отключении подписчика
+        self.subscribers = ()
+        self.seq = 0
+        self.dropped = 0
+        self.running = False
+        self.servers = []
+        self.paths = []
+        self._lock = threading.Lock()
+        metrics.EVENT_SUBSCRIBERS.set_function(function=lambda: len(self.subscribers))
+
+    def configure(self, buffer_size=None):
+        # Размер очереди применяется к новым подписчикам
+        self.buffer_size = buffer_size or int(os.getenv('EVENT_BUFFER', '256'))
+        self.send_timeout = float(os.getenv('EVENT_SEND_TIMEOUT', '5'))
+
+    def subscribe(self, address):
+        subscriber = Subscriber(self.buffer_size, address)
+        with self._lock:
+            self.subscribers = self.subscribers + (subscriber,)
+        logging.info(f"Подписчик событий подключен: {address}")
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self.subscribers = tuple(s for s in self.subscribers if s is not subscriber)
+        logging.info(f"Подписчик событий отключен: {subscriber.address} "
+                     f"(отправлено {subscriber.sent}, отброшено {subscriber.dropped})")
+
+    def publish(self, event):
+        """Постановка события в очереди подписчиков; возвращает его номер"""
+        with self._lock:
+            self.seq += 1
+            seq = self.seq
+            subscribers = self.subscribers
+            if not subscribers:
+                return seq
+            line = event_json(event, seq)
+            for subscriber in subscribers:
+                if len(subscriber.queue) == subscriber.queue.maxlen:
+                    subscriber.dropped += 1
+                    self.dropped += 1
+                    metrics.EVENTS_DROPPED.inc(event.reader_id)
+                subscriber.queue.append(line)
+        for subscriber in subscribers:
+            subscriber.ready.set()
+        return seq
+
+    def start(self, path=None, port=None, host=None):
+        """Запуск серверов подписки (EVENT_SOCKET и/или EVENT_PORT)"""
+        path = path if path is not None else os.getenv('EVENT_SOCKET', '')
+        port = port if port is not None else int(os.getenv('EVENT_PORT', '0'))
+        host = host or os.getenv('EVENT_HOST', '127.0.0.1')
+        self.running = True
+        if path:
+            if os.path.exists(path):
+                # Сокет остался от предыдущего запуска
+                os.remove(path)
+            server = _UnixServer(path, _Handler)
+            os.chmod(path, 0o660)
+            self.paths.append(path)
+            self._serve(server, f"сокет {path}")
+        if port:
+            self._serve(_TCPServer((host, port), _Handler), f"{host}:{port}")
+        return self
+
+    def _serve(self, server, address):
+        server.publisher = self
+        thread = threading.Thread(target=server.serve_forever, name='event-server', daemon=True)
+        thread.start()
+        self.servers.append(server)
+        logging.info(f"События проходов доступны подписчикам: {address}")
+
+    def stop(self):
+        self.running = False
+        for subscriber in self.subscribers:
+            subscriber.ready.set()
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
+        for path in self.paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.paths = []
+
+    def stats(self):
+        return {
+            'published': self.seq,
+            'dropped': self.dropped,
+            'subscribers': [{'address': str(s.address), 'queued': len(s.queue), 'sent': s.sent,
+                             'dropped': s.dropped} for s in self.subscribers],
+        }
+
+
+def iter_events(path=None, host=None, port=None, timeout=None):
+    """События работающего демона (словари) по мере поступления
+
+    Подключение выполняется сразу: события после возврата не пропускаются.
+    """
+    if port:
+        sock = socket.create_connection((host or '127.0.0.1', port), timeout=timeout)
+    else:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(path or os.getenv('EVENT_SOCKET', ''))
+        except OSError:
+            sock.close()
+            raise
+    return _read_events(sock)
+
+
+def _read_events(sock):
+    with sock, sock.makefile('rb') as stream:
+        for line in stream:
+            yield json.loads(line)
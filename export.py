@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Выгрузка истории проходов из таблицы pass в CSV или Parquet
+Строки читаются страницами по id (keyset-пагинация) через небуферизованный
+курсор и сразу пишутся в файл, поэтому память не зависит от объема выгрузки.
+После каждой страницы позиция сохраняется в файле состояния, и прерванную
+выгрузку можно продолжить с --resume.
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import logging
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from database import Database
+
+load_dotenv()
+
+COLUMNS = ['id', 'time', 'datetime', 'card', 'reader']
+
+
+class CsvSink:
+    """Один CSV-файл; при продолжении файл усекается до сохраненной позиции"""
+
+    def __init__(self, path, position=None):
+        self.path = path
+        if position is None:
+            self.file = open(path, 'w', newline='', encoding='utf-8')
+            csv.writer(self.file).writerow(COLUMNS)
+        else:
+            self.file = open(path, 'r+', newline='', encoding='utf-8')
+            self.file.truncate(position)
+            self.file.seek(position)
+        self.writer = csv.writer(self.file)
+
+    def write(self, rows):
+        self.writer.writerows(
+            (row_id, event_time, datetime.fromtimestamp(event_time).strftime('%Y-%m-%d %H:%M:%S'), card, reader)
+            for row_id, event_time, card, reader in rows
+        )
+
+    def checkpoint(self):
+        """Сброс на диск; возвращает позицию для продолжения"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    """Каталог с файлами part-NNNNNN.parquet, по одному на страницу (нужен pyarrow)"""
+
+    def __init__(self, path, position=None):
+        import pyarrow
+        import pyarrow.parquet
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.schema = pyarrow.schema([
+            ('id', pyarrow.int64()),
+            ('time', pyarrow.int64()),
+            ('card', pyarrow.uint64()),
+            ('reader', pyarrow.string()),
+        ])
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        if position is None:
+            # Новая выгрузка: файлы предыдущей удаляются
+            for name in os.listdir(path):
+                if name.startswith('part-'):
+                    os.remove(os.path.join(path, name))
+        # Номер следующего файла; файлы после сохраненной позиции не завершены
+        self.part = position or 0
+        self._rows = []
+
+    def write(self, rows):
+        self._rows.extend(rows)
+
+    def checkpoint(self):
+        if self._rows:
+            ids, times, cards, readers = zip(*self._rows)
+            table = self.pa.table([list(ids), list(times), [int(card) for card in cards], list(readers)],
+                                  schema=self.schema)
+            final_path = os.path.join(self.path, f'part-{self.part:06d}.parquet')
+            self.pq.write_table(table, final_path + '.tmp')
+            os.replace(final_path + '.tmp', final_path)
+            self.part += 1
+            self._rows = []
+        return self.part
+
+    def close(self):
+        self._rows = []
+
+
+SINKS = {
+    'csv': CsvSink,
+    'parquet': ParquetSink,
+}
+
+
+class PassExporter:
+    def __init__(self, db, page_size=50000, fetch_size=1000):
+        self.db = db
+        self.page_size = page_size
+        self.fetch_size = fetch_size
+
+    def _page(self, sink, sql, after_id, time_from, time_to):
+        """Одна страница после after_id; возвращает (число строк, последний id)"""
+        count, last_id = 0, after_id
+        with self.db.get_connection() as conn:
+            # Небуферизованный курсор: строки передаются с сервера по мере чтения
+            cursor = conn.cursor(buffered=False)
+            try:
+                cursor.execute(sql, (after_id, time_from, time_to, self.page_size))
+                while True:
+                    rows = cursor.fetchmany(self.fetch_size)
+                    if not rows:
+                        break
+                    sink.write(rows)
+                    count += len(rows)
+                    last_id = rows[-1][0]
+            finally:
+                cursor.close()
+        return count, last_id
+
+    def export(self, sink, state, state_file, time_from, time_to):
+        """Выгрузка страницами с сохранением позиции после каждой"""
+        # Наличие столбца reader проверяется один раз на всю выгрузку
+        reader_column = 'reader' if self.db.detect_reader_column() else 'NULL'
+        sql = (f"SELECT id, time, card, {reader_column} FROM pass "
+               f"WHERE id > %s AND time >= %s AND time < %s ORDER BY id LIMIT %s")
+        while True:
+            started = time.monotonic()
+            count, last_id = self._page(sink, sql, state['last_id'], time_from, time_to)
+            if not count:
+                break
+            state['last_id'] = last_id
+            state['rows'] += count
+            state['position'] = sink.checkpoint()
+            save_state(state_file, state)
+            logging.info(f"Выгружено строк: {state['rows']} (id до {last_id}, "
+                         f"{count / max(time.monotonic() - started, 1e-6):.0f} строк/с)")
+            if count < self.page_size:
+                break
+        return state['rows']
+
+
+def save_state(path, state):
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+
+
+def day_start(value):
+    return int(time.mktime(datetime.strptime(value, '%Y-%m-%d').timetuple()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка истории проходов")
+    parser.add_argument('output', help="файл CSV или каталог Parquet")
+    parser.add_argument('--format', choices=list(SINKS), default='csv')
+    parser.add_argument('--from', dest='date_from', help="начало периода (ГГГГ-ММ-ДД)")
+    parser.add_argument('--to', dest='date_to', help="конец периода включительно (ГГГГ-ММ-ДД)")
+    parser.add_argument('--page', type=int, default=50000, help="строк на страницу")
+    parser.add_argument('--resume', action='store_true', help="продолжить прерванную выгрузку")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    time_from = day_start(args.date_from) if args.date_from else 0
+    time_to = (day_start(args.date_to) + int(timedelta(days=1).total_seconds())) if args.date_to else 2 ** 32
+    state_file = args.output.rstrip('/') + '.state.json'
+    params = {'format': args.format, 'time_from': time_from, 'time_to': time_to}
+
+    state = None
+    if args.resume and os.path.exists(state_file):
+        with open(state_file, 'r') as f:
+            state = json.load(f)
+        if state.get('params') != params:
+            print("Параметры не совпадают с прерванной выгрузкой, запустите без --resume")
+            return 1
+        print(f"Продолжение выгрузки после id {state['last_id']} (выгружено строк: {state['rows']})")
+    if state is None:
+        state = {'params': params, 'last_id': 0, 'rows': 0, 'position': None}
+
+    try:
+        sink = SINKS[args.format](args.output, state['position'])
+    except ImportError:
+        print("Для формата parquet установите pyarrow: pip install pyarrow")
+        return 1
+
+    try:
+        exporter = PassExporter(Database(), page_size=args.page)
+        rows = exporter.export(sink, state, state_file, time_from, time_to)
+        sink.checkpoint()
+    except Exception as e:
+        print(f"Ошибка выгрузки: {e}")
+        print("Для продолжения запустите команду повторно с --resume")
+        return 1
+    finally:
+        sink.close()
+
+    if os.path.exists(state_file):
+        os.remove(state_file)
+    print(f"Выгружено строк: {rows}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+"""
+Бэкенды доступа к GPIO для RFIDReader
+rpi - RPi.GPIO, gpiod - libgpiod (v2), sim - симуляция/воспроизведение импульсов Wiegand
+"""
+
+import os
+import select
+import threading
+import time
+import logging
+
+
+class GPIOBackend:
+    """Базовый интерфейс бэкенда GPIO
+
+    Колбэк спада фронта вызывается как callback(pin, timestamp_ns),
+    где timestamp_ns - время события по time.monotonic_ns().
+    Колбэк подъема фронта (rising) вызывается так же, если бэкенд
+    различает фронты (reports_rising); иначе он не вызывается.
+    """
+
+    name = 'base'
+    reports_rising = False
+
+    def setup_input(self, pin):
+        """Настройка пина на вход с подтяжкой к питанию"""
+        raise NotImplementedError
+
+    def read(self, pin):
+        """Текущий уровень пина (0 или 1)"""
+        raise NotImplementedError
+
+    def watch_falling(self, pin, callback, rising=None):
+        """Подписка на спад (и, если указан rising, подъем) фронта пина"""
+        raise NotImplementedError
+
+    def unwatch(self, pin):
+        """Отписка от событий пина"""
+        raise NotImplementedError
+
+    def cleanup(self, pins=None):
+        """Освобождение пинов (всех, если pins не указан)"""
+        raise NotImplementedError
+
+
+class RPiGPIOBackend(GPIOBackend):
+    """Бэкенд на RPi.GPIO"""
+
+    name = 'rpi'
+
+    def __init__(self):
+        import RPi.GPIO as GPIO
+        self.GPIO = GPIO
+        self.GPIO.setmode(GPIO.BCM)
+
+    def setup_input(self, pin):
+        self.GPIO.setup(pin, self.GPIO.IN, pull_up_down=self.GPIO.PUD_UP)
+
+    def read(self, pin):
+        return self.GPIO.input(pin)
+
+    def watch_falling(self, pin, callback, rising=None):
+        # RPi.GPIO не сообщает тип фронта, а чтение уровня в колбэке ненадежно
+        # для импульсов в десятки микросекунд - подъем фронта не отслеживается
+        self.GPIO.add_event_detect(
+            pin, self.GPIO.FALLING,
+            callback=lambda channel: callback(channel, time.monotonic_ns())
+        )
+
+    def unwatch(self, pin):
+        self.GPIO.remove_event_detect(pin)
+
+    def cleanup(self, pins=None):
+        if pins:
+            self.GPIO.cleanup(list(pins))
+        else:
+            self.GPIO.cleanup()
+
+
+class GpiodBackend(GPIOBackend):
+    """Бэкенд на libgpiod v2 (python3-libgpiod), события с метками времени ядра"""
+
+    name = 'gpiod'
+    reports_rising = True
+
+    def __init__(self, chip_path=None):
+        import gpiod
+        from gpiod.line import Bias, Direction, Edge, Value
+        from gpiod import EdgeEvent
+        self.gpiod = gpiod
+        self.FALLING_EDGE = EdgeEvent.Type.FALLING_EDGE
+        self.Bias = Bias
+        self.Direction = Direction
+        self.Edge = Edge
+        self.Value = Value
+        self.chip_path = chip_path or os.getenv('GPIO_CHIP', '/dev/gpiochip0')
+        self.requests = {}
+        self.callbacks = {}
+        self.rising_callbacks = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+
+    def _settings(self, edge=None):
+        return self.gpiod.LineSettings(
+            direction=self.Direction.INPUT,
+            bias=self.Bias.PULL_UP,
+            edge_detection=edge or self.Edge.NONE
+        )
+
+    def setup_input(self, pin):
+        with self._lock:
+            if pin not in self.requests:
+                self.requests[pin] = self.gpiod.request_lines(
+                    self.chip_path,
+                    consumer='rfid-reader',
+                    config={pin: self._settings()}
+                )
+
+    def read(self, pin):
+        return 1 if self.requests[pin].get_value(pin) == self.Value.ACTIVE else 0
+
+    def watch_falling(self, pin, callback, rising=None):
+        self.setup_input(pin)
+        edge = self.Edge.BOTH if rising else self.Edge.FALLING
+        self.requests[pin].reconfigure_lines({pin: self._settings(edge)})
+        with self._lock:
+            self.callbacks[pin] = callback
+            if rising:
+                self.rising_callbacks[pin] = rising
+            if not self._running:
+                self._running = True
+                self._thread = threading.Thread(
+                    target=self._event_loop, name='gpiod-events', daemon=True
+                )
+                self._thread.start()
+
+    def unwatch(self, pin):
+        with self._lock:
+            self.callbacks.pop(pin, None)
+            self.rising_callbacks.pop(pin, None)
+        if pin in self.requests:
+            self.requests[pin].reconfigure_lines({pin: self._settings()})
+
+    def _event_loop(self):
+        while self._running:
+            with self._lock:
+                watched = {self.requests[pin].fd: self.requests[pin] for pin in self.callbacks}
+            if not watched:
+                time.sleep(0.1)
+                continue
+            try:
+                ready, _, _ = select.select(list(watched), [], [], 0.5)
+            except (OSError, ValueError):
+                # Запрос линии закрыт во время ожидания
+                continue
+            for fd in ready:
+                for event in watched[fd].read_edge_events():
+                    if event.event_type == self.FALLING_EDGE:
+                        callback = self.callbacks.get(event.line_offset)
+                    else:
+                        callback = self.rising_callbacks.get(event.line_offset)
+                    if callback:
+                        callback(event.line_offset, event.timestamp_ns)
+
+    def cleanup(self, pins=None):
+        with self._lock:
+            pins = list(self.requests) if pins is None else [p for p in pins if p in self.requests]
+            for pin in pins:
+                self.callbacks.pop(pin, None)
+                self.rising_callbacks.pop(pin, None)
+                self.requests.pop(pin).release()
+            if not self.requests:
+                self._running = False
+        if not self._running and self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+
+def wiegand_pulse_train(bits, zero_pin, one_pin, pulse_us=50, interval_us=2000, start_us=0):
+    """Синтетическая последовательность переходов для кадра Wiegand
+
+    zero_pin/one_pin - линии, импульс на которых передает бит 0/1.
+    Возвращает список (t_us, pin, level) - моменты смены уровня относительно начала.
+    """
+    transitions = []
+    t = start_us
+    for bit in bits:
+        pin = one_pin if bit else zero_pin
+        transitions.append((t, pin, 0))
+        transitions.append((t + pulse_us, pin, 1))
+        t += interval_us
+    return transitions
+
+
+def load_pulse_train(path):
+    """Загрузка записанной последовательности переходов (строки 't_us,pin,level')"""
+    transitions = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            t_us, pin, level = line.split(',')
+            transitions.append((int(t_us), int(pin), int(level)))
+    return transitions
+
+
+class SimulatedBackend(GPIOBackend):
+    """Симуляция GPIO: воспроизводит последовательности импульсов с микросекундной точностью"""
+
+    name = 'sim'
+    reports_rising = True
+
+    # Последние N мкс ожидания выполняются активным циклом вместо sleep
+    SPIN_US = 300
+
+    def __init__(self):
+        self.levels = {}
+        self.callbacks = {}
+        self.rising_callbacks = {}
+        self._lock = threading.Lock()
+        self._replays = []
+
+    def setup_input(self, pin):
+        self.levels[pin] = 1
+
+    def read(self, pin):
+        return self.levels.get(pin, 1)
+
+    def watch_falling(self, pin, callback, rising=None):
+        self.callbacks[pin] = callback
+        if rising:
+            self.rising_callbacks[pin] = rising
+
+    def unwatch(self, pin):
+        self.callbacks.pop(pin, None)
+        self.rising_callbacks.pop(pin, None)
+
+    def cleanup(self, pins=None):
+        self.wait_idle()
+        for pin in (list(self.levels) if pins is None else pins):
+            self.callbacks.pop(pin, None)
+            self.rising_callbacks.pop(pin, None)
+            self.levels.pop(pin, None)
+
+    def _set_level(self, pin, level, timestamp_ns):
+        previous = self.levels.get(pin, 1)
+        self.levels[pin] = level
+        if previous == 1 and level == 0:
+            callback = self.callbacks.get(pin)
+        elif previous == 0 and level == 1:
+            callback = self.rising_callbacks.get(pin)
+        else:
+            return
+        if callback:
+            callback(pin, timestamp_ns)
+
+    def _play(self, transitions):
+        start = time.monotonic_ns()
+        spin_ns = self.SPIN_US * 1000
+        for t_us, pin, level in sorted(transitions):
+            deadline = start + t_us * 1000
+            remaining = deadline - time.monotonic_ns()
+            if remaining > spin_ns:
+                time.sleep((remaining - spin_ns) / 1e9)
+            now = time.monotonic_ns()
+            while now < deadline:
+                now = time.monotonic_ns()
+            self._set_level(pin, level, now)
+
+    def replay(self, transitions, block=True):
+        """Воспроизведение последовательности переходов (t_us, pin, level)"""
+        if block:
+            self._play(transitions)
+            return None
+        thread = threading.Thread(target=self._play, args=(transitions,), name='gpio-sim', daemon=True)
+        with self._lock:
+            self._replays = [t for t in self._replays if t.is_alive()]
+            self._replays.append(thread)
+        thread.start()
+        return thread
+
+    def send_frame(self, bits, zero_pin, one_pin, pulse_us=50, interval_us=2000, block=True):
+        """Воспроизведение синтетического кадра Wiegand из списка битов"""
+        return self.replay(
+            wiegand_pulse_train(bits, zero_pin, one_pin, pulse_us, interval_us),
+            block=block
+        )
+
+    def wait_idle(self, timeout=None):
+        """Ожидание завершения фоновых воспроизведений"""
+        with self._lock:
+            replays = list(self._replays)
+            self._replays = []
+        for thread in replays:
+            thread.join(timeout)
+
+
+BACKENDS = {
+    RPiGPIOBackend.name: RPiGPIOBackend,
+    GpiodBackend.name: GpiodBackend,
+    SimulatedBackend.name: SimulatedBackend,
+}
+
+
+def create_backend(name=None):
+    """Создание бэкенда по имени (по умолчанию из GPIO_BACKEND, иначе rpi)"""
+    name = name or os.getenv('GPIO_BACKEND', 'rpi')
+    if name not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд GPIO: {name}")
+    backend = BACKENDS[name]()
+    logging.info(f"Используется бэкенд GPIO: {name}")
+    return backend
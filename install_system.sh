@@ -135,17 +135,6 @@ apt-get update && apt-get install -y python3-rpi.gpio python3-mysql.connector py
     }
 }
 
-# Настройка ротации логов
-print_message "Настройка ротации логов..."
-if [ -f "$INSTALL_DIR/logrotate.conf" ]; then
-    sed "s|/opt/rfid-reader|$INSTALL_DIR|g" "$INSTALL_DIR/logrotate.conf" > /etc/logrotate.d/rfid-reader
-    sed -i "s/User=pi/User=$SERVICE_USER/g" /etc/logrotate.d/rfid-reader
-    sed -i "s/Group=pi/Group=$SERVICE_USER/g" /etc/logrotate.d/rfid-reader
-    print_message "Ротация логов настроена"
-else
-    print_warning "Файл logrotate.conf не найден, ротация логов не настроена"
-fi
-
 # Создание исполняемых скриптов
 print_message "Создание исполняемых скриптов..."
 chmod +x "$INSTALL_DIR/wg_daemon.py"
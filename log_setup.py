@@ -0,0 +1,123 @@
+"""
+Неблокирующее логирование демона
+Потоки захвата только ставят записи в очередь; запись в файл с ротацией
+по размеру выполняет фоновый QueueListener. Повторяющиеся одинаковые
+предупреждения подавляются и выводятся одной записью с числом повторов.
+"""
+
+import os
+import time
+import queue
+import threading
+import logging
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+class RateLimitFilter(logging.Filter):
+    """Одинаковое предупреждение (или ошибка) выводится не чаще одного раза в interval секунд"""
+
+    def __init__(self, interval=None, max_keys=1024, level=logging.WARNING):
+        super().__init__()
+        self.level = level
+        self.interval = interval if interval is not None else float(os.getenv('LOG_RATE_LIMIT', '60'))
+        self.max_keys = max_keys
+        # (уровень, текст) -> [время последнего вывода, число подавленных повторов]
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def filter(self, record):
+        if self.interval <= 0 or record.levelno < self.level:
+            return True
+        key = (record.levelno, record.getMessage())
+        now = time.monotonic()
+        with self._lock:
+            state = self._seen.get(key)
+            if state is not None and now - state[0] < self.interval:
+                state[1] += 1
+                self.suppressed += 1
+                return False
+
+            repeated = state[1] if state else 0
+            self._seen[key] = [now, 0]
+            self._seen.move_to_end(key)
+            if len(self._seen) > self.max_keys:
+                self._seen.popitem(last=False)
+
+        if repeated:
+            record.msg = f"{record.getMessage()} (повторялось еще {repeated} раз)"
+            record.args = None
+        return True
+
+    def pending(self):
+        """Подавленные и еще не выведенные повторы: [(уровень, текст, число)]"""
+        with self._lock:
+            return [(level, message, state[1]) for (level, message), state in self._seen.items() if state[1]]
+
+
+class LogPipeline:
+    """Очередь записей и фоновый поток записи в файл"""
+
+    def __init__(self, log_file, level=logging.INFO):
+        self.log_file = log_file
+        self.level = level
+        self.queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', '10000')))
+        self.rate_limit = RateLimitFilter()
+        self.listener = None
+        self._handler = None
+
+    def start(self):
+        file_handler = RotatingFileHandler(
+            self.log_file,
+            maxBytes=int(float(os.getenv('LOG_MAX_MB', '10')) * 1024 * 1024),
+            backupCount=int(os.getenv('LOG_BACKUP_COUNT', '5')),
+            encoding='utf-8'
+        )
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+        self._handler = _NonBlockingQueueHandler(self.queue)
+        self._handler.addFilter(self.rate_limit)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self._handler)
+        root.setLevel(self.level)
+
+        self.listener = QueueListener(self.queue, file_handler, respect_handler_level=True)
+        self.listener.start()
+        return self
+
+    def stop(self):
+        """Вывод итогов подавленных повторов и дозапись очереди в файл"""
+        if not self.listener:
+            return
+        for level, message, count in self.rate_limit.pending():
+            logging.getLogger().handle(logging.LogRecord(
+                'root', level, __file__, 0, f"{message} (повторялось еще {count} раз)", None, None
+            ))
+        logging.getLogger().removeHandler(self._handler)
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+        self.listener = None
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """При переполненной очереди запись отбрасывается, а не блокирует поток захвата"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(log_file, level=logging.INFO):
+    """Запуск конвейера логирования для демона"""
+    return LogPipeline(log_file, level).start()
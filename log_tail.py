@@ -0,0 +1,175 @@
+"""
+Инкрементальное чтение лога демона и скользящая статистика ошибок
+Позиция чтения (inode и смещение) и поминутные счетчики сохраняются в файле
+состояния, поэтому каждая проверка читает только новые байты лога, а ротация
+(переименование или усечение файла) не приводит к пропуску или повторному
+учету записей.
+"""
+
+import os
+import re
+import json
+import logging
+from datetime import datetime, timedelta
+
+# Строка лога: '2026-01-01 12:00:00,000 - WARNING - текст'
+LINE_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}):\d{2},\d+ - ([A-Z]+) - (.*)$')
+REPEATED_PATTERN = re.compile(r'\(повторялось еще (\d+) раз\)$')
+
+# Категории сообщений по тексту (первое совпадение)
+CATEGORIES = [
+    ('frames', re.compile(r'Кадр считывателя|Невалидный номер карты|Очередь кадров')),
+    ('timeouts', re.compile(r'Таймаут')),
+    ('database', re.compile(r'баз[аеы] данных|БД|сохранени|сохранить')),
+    ('queue', re.compile(r'Очередь записи')),
+    ('spool', re.compile(r'[Жж]урнал')),
+    ('gpio', re.compile(r'GPIO')),
+    ('access', re.compile(r'доступа')),
+]
+
+LEVELS = ('WARNING', 'ERROR', 'CRITICAL')
+# Начало файла, по которому обнаруживается усечение при ротации
+HEAD_BYTES = 128
+MINUTE_FORMAT = '%Y-%m-%d %H:%M'
+
+
+def categorize(message):
+    for name, pattern in CATEGORIES:
+        if pattern.search(message):
+            return name
+    return 'other'
+
+
+class LogTailer:
+    def __init__(self, log_file, state_file=None, window=None, initial_bytes=None):
+        self.log_file = log_file
+        self.state_file = state_file or os.path.join(os.path.dirname(log_file) or '.', '.monitor_state.json')
+        # Окно скользящей статистики, минуты
+        self.window = window or int(os.getenv('MONITOR_RATE_WINDOW', '5'))
+        # При первом запуске читается только хвост лога
+        self.initial_bytes = initial_bytes if initial_bytes is not None else \
+            int(os.getenv('MONITOR_INITIAL_KB', '64')) * 1024
+        self.inode = None
+        self.offset = None
+        self.head = ''
+        # 'YYYY-MM-DD HH:MM' -> {'категория:уровень': количество}
+        self.buckets = {}
+        self.bytes_read = 0
+        self._load_state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+            self.inode = state.get('inode')
+            self.offset = state.get('offset')
+            self.head = state.get('head', '')
+            self.buckets = state.get('buckets', {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logging.warning(f"Не удалось прочитать состояние монитора {self.state_file}: {e}")
+
+    def save_state(self):
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({'inode': self.inode, 'offset': self.offset, 'head': self.head,
+                       'buckets': self.buckets}, f)
+        os.replace(tmp_file, self.state_file)
+
+    def _read_from(self, path, offset):
+        """Полные строки файла начиная со смещения; возвращает новое смещение"""
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end:
+            self.bytes_read += end
+            for line in data[:end].decode('utf-8', errors='replace').splitlines():
+                self._count(line)
+        return offset + end
+
+    def _read_head(self):
+        with open(self.log_file, 'rb') as f:
+            return f.read(HEAD_BYTES).decode('latin-1')
+
+    def _rotated_file(self):
+        """Переименованный при ротации файл с прежним inode"""
+        directory = os.path.dirname(self.log_file) or '.'
+        prefix = os.path.basename(self.log_file)
+        for name in sorted(os.listdir(directory)):
+            if name.startswith(prefix) and name != prefix and not name.endswith('.gz'):
+                path = os.path.join(directory, name)
+                try:
+                    if os.stat(path).st_ino == self.inode:
+                        return path
+                except OSError:
+                    continue
+        return None
+
+    def poll(self):
+        """Чтение новых строк лога; False, если лог не найден"""
+        try:
+            stat = os.stat(self.log_file)
+        except FileNotFoundError:
+            return False
+
+        if self.inode is None or self.offset is None:
+            # Первый запуск: только хвост лога
+            self.inode = stat.st_ino
+            self.offset = max(0, stat.st_size - self.initial_bytes)
+            if self.offset:
+                with open(self.log_file, 'rb') as f:
+                    f.seek(self.offset)
+                    self.offset += len(f.readline())
+        elif stat.st_ino != self.inode:
+            # Файл переименован при ротации: дочитываем старый, новый - с начала
+            rotated = self._rotated_file()
+            if rotated:
+                self._read_from(rotated, self.offset)
+            self.inode = stat.st_ino
+            self.offset = 0
+        elif stat.st_size < self.offset or not self._read_head().startswith(self.head):
+            # Файл усечен (copytruncate) и, возможно, уже дописан заново
+            self.offset = 0
+
+        self.offset = self._read_from(self.log_file, self.offset)
+        self.head = self._read_head()[:self.offset]
+        self._expire()
+        self.save_state()
+        return True
+
+    def _count(self, line):
+        match = LINE_PATTERN.match(line)
+        if not match:
+            return
+        minute, level, message = match.groups()
+        if level not in LEVELS:
+            return
+        # Подавленные при записи повторы учитываются в статистике
+        count = 1
+        repeated = REPEATED_PATTERN.search(message)
+        if repeated:
+            count += int(repeated.group(1))
+        key = f"{categorize(message)}:{'ERROR' if level == 'CRITICAL' else level}"
+        bucket = self.buckets.setdefault(minute, {})
+        bucket[key] = bucket.get(key, 0) + count
+
+    def _window_minutes(self, now=None):
+        now = now or datetime.now()
+        return {(now - timedelta(minutes=i)).strftime(MINUTE_FORMAT) for i in range(self.window)}
+
+    def _expire(self, now=None):
+        oldest = ((now or datetime.now()) - timedelta(minutes=self.window)).strftime(MINUTE_FORMAT)
+        for minute in [m for m in self.buckets if m <= oldest]:
+            del self.buckets[minute]
+
+    def rates(self, now=None):
+        """Средняя частота за окно, событий в минуту: {'категория:уровень': частота}"""
+        minutes = self._window_minutes(now)
+        totals = {}
+        for minute, bucket in self.buckets.items():
+            if minute in minutes:
+                for key, count in bucket.items():
+                    totals[key] = totals.get(key, 0) + count
+        return {key: count / self.window for key, count in sorted(totals.items())}
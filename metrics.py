@@ -0,0 +1,213 @@
+"""
+Метрики демона в текстовом формате Prometheus
+Счетчики и гистограммы обновляются компонентами демона, HTTP-сервер
+(METRICS_PORT, только 127.0.0.1 по умолчанию) отдает их по запросу /metrics.
+"""
+
+import threading
+import logging
+
+# Границы гистограмм задержек, секунды
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"Метрика {self.name}: ожидаются метки {self.label_names}")
+        return tuple(str(label) for label in labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}'
+                for key, value in items]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), registry=None):
+        super().__init__(name, documentation, labels, registry)
+        self._functions = {}
+
+    def set(self, *labels, value):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, *labels, function):
+        """Значение вычисляется при каждом запросе метрик"""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = function
+
+    def _samples(self):
+        with self._lock:
+            functions = list(self._functions.items())
+        for key, function in functions:
+            try:
+                value = function()
+            except Exception as e:
+                logging.debug(f"Метрика {self.name}: ошибка вычисления: {e}")
+                continue
+            with self._lock:
+                self._values[key] = value
+        return super()._samples()
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS, registry=None):
+        super().__init__(name, documentation, labels, registry)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, *labels, value):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Счетчики по корзинам (не накопительные), сумма, количество
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, key, ('le', _format_value(float(bound))))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.label_names, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+FRAMES = Counter('rfid_frames_total', 'Кадры Wiegand, принятые считывателем', ['reader'])
+FRAMES_REJECTED = Counter('rfid_frames_rejected_total',
+                          'Отклоненные кадры (length - неизвестная длина, parity - ошибка четности)',
+                          ['reader', 'reason'])
+READ_TIMEOUTS = Counter('rfid_read_timeouts_total', 'Таймауты чтения бита в режиме poll', ['reader'])
+DUPLICATES = Counter('rfid_duplicates_suppressed_total', 'Подавленные повторные чтения', ['reader'])
+DECODE_SECONDS = Histogram('rfid_decode_seconds', 'Время декодирования кадра', ['reader'],
+                           buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005))
+COMMIT_LATENCY = Histogram('rfid_card_to_commit_seconds',
+                           'Задержка от завершения кадра до фиксации в БД', ['reader'])
+DB_SECONDS = Histogram('rfid_db_save_seconds', 'Время пакетной записи в БД (с повторами внутри Database)')
+DB_ROWS = Counter('rfid_db_rows_total', 'Записанные в БД события', ['reader'])
+FRAME_QUEUE_DEPTH = Gauge('rfid_frame_queue_depth', 'Кадры, ожидающие декодирования', ['reader'])
+WRITE_QUEUE_DEPTH = Gauge('rfid_write_queue_depth', 'События в очереди записи')
+WRITE_QUEUE_DROPPED = Counter('rfid_write_queue_dropped_total',
+                              'События, отброшенные при переполнении очереди записи', ['reader'])
+SPOOL_PENDING_BYTES = Gauge('rfid_spool_pending_bytes', 'Объем журнала, еще не перенесенный в БД')
+SPOOL_SIZE_BYTES = Gauge('rfid_spool_size_bytes', 'Размер журнала на диске')
+REPLICATION_PENDING = Gauge('rfid_replication_pending_rows',
+                            'Записи локального хранилища, еще не перенесенные в MySQL')
+EVENT_SUBSCRIBERS = Gauge('rfid_event_subscribers', 'Подключенные подписчики событий проходов')
+EVENTS_DROPPED = Counter('rfid_events_dropped_total',
+                         'События, вытесненные из очереди медленного подписчика', ['reader'])
+
+
+def start_server(port, host='127.0.0.1', registry=None):
+    """Запуск HTTP-сервера метрик в фоновом потоке"""
+    # http.server импортируется только при включенных метриках (время запуска демона)
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = self.server.registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Запросы сборщика метрик не пишутся в лог демона
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.registry = registry or REGISTRY
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    logging.info(f"Метрики доступны по адресу http://{host}:{server.server_port}/metrics")
+    return server
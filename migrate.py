@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Миграция схемы таблицы pass
+- столбец reader для идентификатора считывателя
+- номер карты как BIGINT UNSIGNED вместо VARCHAR (перенос порциями без остановки записи)
+- индексы (time) и (card, time)
+- помесячное секционирование по time (опционально)
+Шаги, кроме секционирования, выполняются онлайн (ALGORITHM=INPLACE, LOCK=NONE):
+если сервер не может выполнить изменение без блокировки записи, шаг сразу
+завершается ошибкой, а не блокирует демон на время копирования таблицы.
+"""
+
+import sys
+import time
+import argparse
+import logging
+from datetime import datetime
+from dotenv import load_dotenv
+from database import Database
+
+load_dotenv()
+
+TRIGGER_NAME = 'pass_card_num_migrate'
+
+# Изменение без копирования таблицы и без блокировки записи (иначе - ошибка)
+ONLINE = "ALGORITHM=INPLACE, LOCK=NONE"
+
+INDEXES = {
+    'idx_pass_time': '(time)',
+    'idx_pass_card_time': '(card, time)',
+}
+
+
+def add_months(year, month, months):
+    """Год и месяц через указанное число месяцев"""
+    index = year * 12 + month - 1 + months
+    return index // 12, index % 12 + 1
+
+
+def month_start(year, month):
+    """Начало месяца (локальное время) в unix time"""
+    return int(time.mktime((year, month, 1, 0, 0, 0, 0, 0, -1)))
+
+
+class Migrator:
+    def __init__(self, db, chunk_size=10000, pause=0.05):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.pause = pause
+
+    def query(self, sql, params=None, fetch=True):
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params or ())
+                return cursor.fetchall() if fetch else None
+            finally:
+                cursor.close()
+
+    def execute(self, sql, params=None):
+        logging.info(f"Миграция: {sql}")
+        return self.query(sql, params, fetch=False)
+
+    def columns(self):
+        rows = self.query(
+            "SELECT column_name, column_type FROM information_schema.columns "
+            "WHERE table_schema = DATABASE() AND table_name = 'pass'"
+        )
+        return {name: column_type.decode() if isinstance(column_type, bytes) else column_type
+                for name, column_type in rows}
+
+    def indexes(self):
+        rows = self.query(
+            "SELECT DISTINCT index_name FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = 'pass'"
+        )
+        return {row[0] for row in rows}
+
+    def partitions(self):
+        rows = self.query(
+            "SELECT partition_name, partition_description FROM information_schema.partitions "
+            "WHERE table_schema = DATABASE() AND table_name = 'pass' AND partition_name IS NOT NULL "
+            "ORDER BY partition_ordinal_position"
+        )
+        return rows
+
+    def status(self):
+        """Текущее состояние схемы"""
+        columns = self.columns()
+        card_type = columns.get('card', '?')
+        return {
+            'reader_column': 'reader' in columns,
+            'card_type': card_type,
+            'card_integer': 'int' in card_type.lower(),
+            'conversion_in_progress': 'card_num' in columns or 'card_old' in columns,
+            'indexes': {name: name in self.indexes() for name in INDEXES},
+            'partitions': len(self.partitions()),
+        }
+
+    def add_reader_column(self):
+        if 'reader' in self.columns():
+            return False
+        self.execute(f"ALTER TABLE pass ADD COLUMN reader VARCHAR(32) NULL, {ONLINE}")
+        return True
+
+    def _backfill(self):
+        """Заполнение card_num порциями по диапазонам id"""
+        low, high = self.query("SELECT MIN(id), MAX(id) FROM pass")[0]
+        if low is None:
+            return 0
+        updated = 0
+        start = low - 1
+        while start < high:
+            end = start + self.chunk_size
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "UPDATE pass SET card_num = CAST(card AS UNSIGNED) "
+                    "WHERE id > %s AND id <= %s AND card_num = 0",
+                    (start, end)
+                )
+                updated += cursor.rowcount
+                cursor.close()
+            start = end
+            if self.pause:
+                # Пауза между порциями снижает нагрузку на рабочую БД
+                time.sleep(self.pause)
+        return updated
+
+    def convert_card(self):
+        """Перевод card в BIGINT UNSIGNED через теневой столбец"""
+        columns = self.columns()
+        if 'int' in columns.get('card', '').lower():
+            if 'card_old' not in columns:
+                return False
+            # Прерванная миграция: столбцы уже поменяны местами
+            self.execute(f"ALTER TABLE pass DROP COLUMN card_old, {ONLINE}")
+            return True
+
+        bad = self.query("SELECT COUNT(*) FROM pass WHERE card NOT REGEXP '^[0-9]+$'")[0][0]
+        if bad:
+            raise RuntimeError(f"В таблице pass {bad} записей с нечисловым номером карты, "
+                               f"исправьте их перед миграцией")
+
+        if 'card_num' not in columns:
+            self.execute(f"ALTER TABLE pass ADD COLUMN card_num BIGINT UNSIGNED NOT NULL DEFAULT 0, {ONLINE}")
+
+        # Новые записи получают card_num триггером, существующие заполняются порциями
+        self.execute(f"DROP TRIGGER IF EXISTS {TRIGGER_NAME}")
+        self.execute(
+            f"CREATE TRIGGER {TRIGGER_NAME} BEFORE INSERT ON pass FOR EACH ROW "
+            f"SET NEW.card_num = CAST(NEW.card AS UNSIGNED)"
+        )
+        updated = self._backfill()
+        logging.info(f"Миграция: заполнено card_num для {updated} записей")
+
+        # Триггер удаляется вместе с переименованием столбцов под короткой блокировкой
+        # записи: меняются только метаданные, данные таблицы не копируются
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("LOCK TABLES pass WRITE")
+                cursor.execute(f"DROP TRIGGER IF EXISTS {TRIGGER_NAME}")
+                # У старого столбца появляется значение по умолчанию: новые записи его не заполняют
+                cursor.execute("ALTER TABLE pass RENAME COLUMN card TO card_old, "
+                               "RENAME COLUMN card_num TO card, "
+                               "ALTER COLUMN card_old SET DEFAULT '', "
+                               "ALTER COLUMN card DROP DEFAULT, ALGORITHM=INPLACE")
+            finally:
+                cursor.execute("UNLOCK TABLES")
+                cursor.close()
+        # Удаление старого столбца перестраивает таблицу, но запись при этом не блокируется
+        self.execute(f"ALTER TABLE pass DROP COLUMN card_old, {ONLINE}")
+        return True
+
+    def add_indexes(self):
+        existing = self.indexes()
+        created = []
+        for name, columns in INDEXES.items():
+            if name not in existing:
+                # Онлайн-построение индекса без блокировки записи
+                self.execute(f"ALTER TABLE pass ADD INDEX {name} {columns}, {ONLINE}")
+                created.append(name)
+        return created
+
+    def partition(self, months_ahead=3):
+        """Помесячное секционирование по time или добавление будущих секций"""
+        now = datetime.now()
+        existing = self.partitions()
+
+        if not existing:
+            oldest = self.query("SELECT MIN(time) FROM pass")[0][0]
+            first = datetime.fromtimestamp(oldest) if oldest else now
+            # Секционированная таблица требует, чтобы time входил в первичный ключ
+            self.execute(f"ALTER TABLE pass DROP PRIMARY KEY, ADD PRIMARY KEY (id, time), {ONLINE}")
+            definitions = []
+            year, month = first.year, first.month
+            while (year, month) <= add_months(now.year, now.month, months_ahead):
+                definitions.append(
+                    f"PARTITION p{year:04d}{month:02d} "
+                    f"VALUES LESS THAN ({month_start(*add_months(year, month, 1))})"
+                )
+                year, month = add_months(year, month, 1)
+            definitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+            # Онлайн-секционирования нет: таблица копируется, запись блокируется до конца
+            # копирования (чтение разрешено), демон на это время копит события в журнале
+            logging.warning("Миграция: секционирование копирует таблицу pass, запись заблокирована до завершения")
+            self.execute(f"ALTER TABLE pass PARTITION BY RANGE (time) ({', '.join(definitions)}), "
+                         f"ALGORITHM=COPY, LOCK=SHARED")
+            return len(definitions)
+
+        # Таблица уже секционирована: выделяем из pmax секции на months_ahead месяцев вперед
+        names = {name.decode() if isinstance(name, bytes) else name for name, _ in existing}
+        definitions = []
+        for offset in range(months_ahead + 1):
+            year, month = add_months(now.year, now.month, offset)
+            name = f"p{year:04d}{month:02d}"
+            if name not in names:
+                definitions.append(
+                    f"PARTITION {name} VALUES LESS THAN ({month_start(*add_months(year, month, 1))})"
+                )
+        if definitions:
+            definitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+            self.execute(f"ALTER TABLE pass REORGANIZE PARTITION pmax INTO ({', '.join(definitions)})")
+        return len(definitions)
+
+    def upgrade(self, with_partitions=False, months_ahead=3):
+        self.add_reader_column()
+        self.convert_card()
+        self.add_indexes()
+        if with_partitions:
+            self.partition(months_ahead)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Миграция схемы таблицы pass",
+        epilog="Все шаги, кроме --partition, выполняются без блокировки записи. Секционирование "
+               "копирует таблицу и блокирует запись в pass на все время копирования."
+    )
+    parser.add_argument('command', choices=['status', 'upgrade', 'partitions'],
+                        help="status - состояние схемы, upgrade - применить миграции, "
+                             "partitions - добавить секции на будущие месяцы")
+    parser.add_argument('--partition', action='store_true',
+                        help="при upgrade секционировать таблицу по месяцам "
+                             "(блокирует запись на время копирования таблицы)")
+    parser.add_argument('--months-ahead', type=int, default=3,
+                        help="сколько будущих месяцев держать в отдельных секциях")
+    parser.add_argument('--chunk', type=int, default=10000, help="размер порции при переносе данных")
+    parser.add_argument('--pause', type=float, default=0.05, help="пауза между порциями, сек")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    try:
+        migrator = Migrator(Database(), chunk_size=args.chunk, pause=args.pause)
+        if args.command == 'upgrade':
+            migrator.upgrade(args.partition, args.months_ahead)
+        elif args.command == 'partitions':
+            print(f"Добавлено секций: {migrator.partition(args.months_ahead)}")
+        for key, value in migrator.status().items():
+            print(f"{key}: {value}")
+        return 0
+    except Exception as e:
+        print(f"Ошибка миграции: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,6 +12,8 @@ import logging
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from database import Database
+from status_server import query_status
+from log_tail import LogTailer
 
 load_dotenv()
 
@@ -20,6 +22,11 @@ class ServiceMonitor:
         self.service_name = "rfid-reader.service"
         self.log_dir = os.getenv('LOG_DIR', './logs')
         self.db = None
+        # Лог читается инкрементально, позиция сохраняется между запусками
+        self.log_tailer = LogTailer(os.path.join(self.log_dir, 'wg_daemon.log'))
+        # Пороги частоты (событий в минуту) по категории для ошибок и предупреждений
+        self.error_rate = float(os.getenv('MONITOR_ERROR_RATE', '1'))
+        self.warning_rate = float(os.getenv('MONITOR_WARNING_RATE', '10'))
         
     def check_service_status(self):
         """Проверка статуса systemd сервиса"""
@@ -35,27 +42,12 @@ class ServiceMonitor:
             print(f"Ошибка проверки статуса сервиса: {e}")
             return False
     
-    def check_service_logs(self):
-        """Проверка последних логов сервиса"""
-        try:
-            # Проверяем логи за последние 5 минут
-            result = subprocess.run([
-                'journalctl', '-u', self.service_name, 
-                '--since', '5 minutes ago',
-                '--no-pager'
-            ], capture_output=True, text=True, timeout=10)
-            
-            if result.stdout.strip():
-                return True, result.stdout
-            else:
-                return False, "Нет логов за последние 5 минут"
-        except Exception as e:
-            return False, f"Ошибка чтения логов: {e}"
-    
     def check_database_connection(self):
         """Проверка подключения к базе данных"""
         try:
-            self.db = Database()
+            # Соединение создается один раз и переиспользуется между проверками
+            if not self.db:
+                self.db = Database()
             if self.db.test_connection():
                 return True, "Подключение к БД успешно"
             else:
@@ -69,13 +61,8 @@ class ServiceMonitor:
             if not self.db:
                 self.db = Database()
             
-            cursor = self.db.connection.cursor()
             ten_minutes_ago = int(time.time()) - 600
-            
-            query = "SELECT COUNT(*) FROM pass WHERE time > %s"
-            cursor.execute(query, (ten_minutes_ago,))
-            count = cursor.fetchone()[0]
-            cursor.close()
+            count = self.db.count_passes_since(ten_minutes_ago)
             
             if count > 0:
                 return True, f"Активность обнаружена: {count} записей за 10 минут"
@@ -84,6 +71,69 @@ class ServiceMonitor:
         except Exception as e:
             return False, f"Ошибка проверки активности: {e}"
     
+    def get_daemon_status(self):
+        """Снимок состояния демона через сокет (None, если демон не отвечает)"""
+        try:
+            return query_status()
+        except (OSError, ValueError):
+            return None
+    
+    def check_daemon(self, status):
+        """Состояние демона по снимку"""
+        uptime = int(status.get('uptime', 0))
+        message = (f"PID {status['pid']}, режим {status['mode']}, "
+                   f"время работы {uptime // 3600:02d}:{uptime % 3600 // 60:02d}:{uptime % 60:02d}, "
+                   f"считывателей: {len(status['readers'])}, ошибок: {status['errors']}")
+        return status.get('running', False), message
+    
+    def check_daemon_database(self, status):
+        """Состояние БД по результату последней записи демона"""
+        writer = status['writer']
+        if writer.get('db_ok') is None:
+            return True, "Записей в БД с момента запуска не было"
+        checked = datetime.fromtimestamp(writer['db_checked']).strftime('%H:%M:%S')
+        if writer['db_ok']:
+            return True, f"Последняя запись в БД успешна ({checked})"
+        pending = writer.get('spool_pending_bytes')
+        return False, (f"Ошибка записи в БД ({checked})"
+                       + (f", в журнале {pending} байт" if pending is not None else ""))
+    
+    def check_daemon_activity(self, status):
+        """Активность считывателей за последние 10 минут по снимку"""
+        by_reader = ', '.join(f"{reader_id}: {reader['written']}"
+                              for reader_id, reader in status['readers'].items())
+        last = status.get('last_card_time')
+        if last and time.time() - last < 600:
+            return True, f"Последняя карта {int(time.time() - last)} с назад, записано ({by_reader})"
+        return False, f"Нет активности за последние 10 минут, записано ({by_reader})"
+    
+    def check_daemon_queue(self, status):
+        """Очередь записи и локальный журнал"""
+        writer = status['writer']
+        message = f"Очередь {writer['queue_depth']}/{writer['queue_size']}, отброшено: {writer['dropped']}"
+        if 'spool_pending_bytes' in writer:
+            message += (f", в журнале: {writer['spool_pending_bytes']} байт"
+                        f", потеряно из журнала: {writer['spool_dropped']}")
+        healthy = (writer['queue_depth'] < writer['queue_size'] * 0.9 and not writer['dropped']
+                   and not writer.get('spool_dropped'))
+        return healthy, message
+    
+    def check_log_rates(self):
+        """Частота ошибок и предупреждений в логе демона по категориям"""
+        try:
+            if not self.log_tailer.poll():
+                return False, "Файл логов не найден"
+        except OSError as e:
+            return False, f"Ошибка чтения логов: {e}"
+        
+        rates = self.log_tailer.rates()
+        summary = ', '.join(f"{key} {rate:.1f}/мин" for key, rate in rates.items()) or "нет"
+        alerts = [f"{key} {rate:.1f}/мин" for key, rate in rates.items()
+                  if rate >= (self.error_rate if key.endswith(':ERROR') else self.warning_rate)]
+        if alerts:
+            return False, f"Превышен порог частоты: {', '.join(alerts)}"
+        return True, f"Ошибки и предупреждения за {self.log_tailer.window} мин: {summary}"
+    
     def check_log_file_size(self):
         """Проверка размера файла логов"""
         log_file = os.path.join(self.log_dir, 'wg_daemon.log')
@@ -102,28 +152,34 @@ class ServiceMonitor:
         print(f"Время проверки: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print()
         
-        checks = [
-            ("Статус сервиса", self.check_service_status),
-            ("Логи сервиса", self.check_service_logs),
-            ("Подключение к БД", self.check_database_connection),
-            ("Активность", self.check_recent_activity),
-            ("Размер логов", self.check_log_file_size)
-        ]
+        snapshot = self.get_daemon_status()
+        if snapshot:
+            # Демон отвечает через сокет: все данные из одного снимка, без systemctl и БД
+            checks = [
+                ("Демон", lambda: self.check_daemon(snapshot)),
+                ("Подключение к БД", lambda: self.check_daemon_database(snapshot)),
+                ("Активность", lambda: self.check_daemon_activity(snapshot)),
+                ("Очередь записи", lambda: self.check_daemon_queue(snapshot)),
+                ("Ошибки в логах", self.check_log_rates),
+                ("Размер логов", self.check_log_file_size)
+            ]
+        else:
+            checks = [
+                ("Статус сервиса", self.check_service_status),
+                ("Ошибки в логах", self.check_log_rates),
+                ("Подключение к БД", self.check_database_connection),
+                ("Активность", self.check_recent_activity),
+                ("Размер логов", self.check_log_file_size)
+            ]
         
         all_good = True
         
         for check_name, check_func in checks:
             try:
-                if check_name == "Логи сервиса":
-                    status, message = check_func()
-                    print(f"✓ {check_name}: {'OK' if status else 'WARNING'}")
-                    if not status:
-                        print(f"  {message}")
-                else:
-                    status, message = check_func()
-                    print(f"{'✓' if status else '✗'} {check_name}: {message}")
-                    if not status:
-                        all_good = False
+                status, message = check_func()
+                print(f"{'✓' if status else '✗'} {check_name}: {message}")
+                if not status:
+                    all_good = False
             except Exception as e:
                 print(f"✗ {check_name}: Ошибка - {e}")
                 all_good = False
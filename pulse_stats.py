@@ -0,0 +1,124 @@
+"""
+Диагностика качества сигнала Wiegand
+Для каждого импульса в кольцевом буфере фиксированного размера (array)
+сохраняются линия, длительность импульса и интервал от начала предыдущего
+импульса. Запись выполняется в колбэке фронта и сводится к нескольким
+присваиваниям, поэтому диагностику можно не выключать в рабочем режиме.
+Гистограммы строятся по запросу из содержимого буфера.
+"""
+
+import os
+from array import array
+
+# Границы гистограмм, мкс
+WIDTH_BOUNDS = (10, 20, 50, 100, 200, 500, 1000)
+INTERVAL_BOUNDS = (250, 500, 1000, 2000, 5000, 10000, 20000)
+
+# Поле длительности: импульс еще не завершен или подъем фронта не наблюдается
+WIDTH_UNKNOWN = 0
+
+
+def histogram(values, bounds):
+    """[(верхняя граница или None для остатка, число значений)]"""
+    counts = [0] * (len(bounds) + 1)
+    for value in values:
+        for index, bound in enumerate(bounds):
+            if value <= bound:
+                counts[index] += 1
+                break
+        else:
+            counts[-1] += 1
+    return list(zip(list(bounds) + [None], counts))
+
+
+class PulseRecorder:
+    """Кольцевой буфер импульсов одного считывателя и счетчики аномалий
+
+    Линия 0 - импульсы бита 0, линия 1 - бита 1. Методы falling/rising
+    вызываются из одного потока событий GPIO и не используют блокировок.
+    Без подъема фронта (measure_widths=False) записываются только интервалы.
+    """
+
+    def __init__(self, size=None, frame_gap=0.025, measure_widths=True):
+        self.size = size or int(os.getenv('PULSE_BUFFER_SIZE', '1024'))
+        # Пороги аномалий: короткий импульс (помеха), длинный импульс,
+        # длинный интервал внутри кадра (риск разрыва кадра)
+        self.min_width_us = int(os.getenv('PULSE_MIN_US', '20'))
+        self.max_width_us = int(os.getenv('PULSE_MAX_US', '200'))
+        self.max_interval_us = int(os.getenv('PULSE_MAX_INTERVAL_US', '10000'))
+        # Интервал не короче паузы между кадрами считается началом нового кадра
+        self.frame_gap_us = int(frame_gap * 1_000_000)
+        self.measure_widths = measure_widths
+
+        self.lines = array('B', bytes(self.size))
+        self.widths = array('I', bytes(4 * self.size))
+        self.intervals = array('I', bytes(4 * self.size))
+        # Всего записанных импульсов (позиция в буфере - count % size)
+        self.count = 0
+
+        self.short_pulses = 0
+        self.long_pulses = 0
+        self.long_intervals = 0
+        self.simultaneous_low = 0
+
+        self._last_fall = 0
+        self._fall = [0, 0]
+        self._low = [False, False]
+        self._slot = [0, 0]
+
+    def falling(self, line, timestamp_ns):
+        """Начало импульса на линии"""
+        if self._low[1 - line]:
+            # Обе линии в низком уровне: перекрестные помехи или замыкание
+            self.simultaneous_low += 1
+        interval = (timestamp_ns - self._last_fall) // 1000 if self._last_fall else 0
+        if interval >= self.frame_gap_us:
+            interval = 0
+        elif interval > self.max_interval_us:
+            self.long_intervals += 1
+        self._last_fall = timestamp_ns
+        self._fall[line] = timestamp_ns
+        self._low[line] = self.measure_widths
+
+        slot = self.count % self.size
+        self.lines[slot] = line
+        self.widths[slot] = WIDTH_UNKNOWN
+        self.intervals[slot] = interval
+        self._slot[line] = slot
+        self.count += 1
+
+    def rising(self, line, timestamp_ns):
+        """Конец импульса на линии"""
+        if not self._low[line]:
+            return
+        self._low[line] = False
+        width = min((timestamp_ns - self._fall[line]) // 1000, 0xffffffff)
+        if width < self.min_width_us:
+            self.short_pulses += 1
+        elif width > self.max_width_us:
+            self.long_pulses += 1
+        self.widths[self._slot[line]] = max(width, 1)
+
+    def records(self):
+        """Содержимое буфера от старых к новым: [(линия, длительность, интервал)]"""
+        count = min(self.count, self.size)
+        start = (self.count - count) % self.size
+        order = [(start + i) % self.size for i in range(count)]
+        return [(self.lines[i], self.widths[i], self.intervals[i]) for i in order]
+
+    def stats(self):
+        """Счетчики аномалий и гистограммы по текущему содержимому буфера"""
+        records = self.records()
+        widths = [width for _, width, _ in records if width != WIDTH_UNKNOWN]
+        intervals = [interval for _, _, interval in records if interval]
+        return {
+            'pulses': self.count,
+            'measure_widths': self.measure_widths,
+            'buffered': len(records),
+            'short_pulses': self.short_pulses,
+            'long_pulses': self.long_pulses,
+            'long_intervals': self.long_intervals,
+            'simultaneous_low': self.simultaneous_low,
+            'width_us': histogram(widths, WIDTH_BOUNDS),
+            'interval_us': histogram(intervals, INTERVAL_BOUNDS),
+        }
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Отчеты по проходам на основе сводной таблицы pass_daily
+Таблица хранит первый и последний проход и число проходов по карте за день
+и обновляется инкрементально: обрабатываются только строки pass с id больше
+сохраненной позиции (high-water mark), поэтому отчеты не просматривают
+таблицу pass целиком.
+"""
+
+import sys
+import csv
+import time
+import argparse
+import logging
+from datetime import date, datetime, timedelta
+from dotenv import load_dotenv
+from database import Database
+
+load_dotenv()
+
+STATE_NAME = 'pass_daily'
+
+CREATE_DAILY = """
+CREATE TABLE IF NOT EXISTS pass_daily (
+    day DATE NOT NULL,
+    card BIGINT UNSIGNED NOT NULL,
+    first_in INT NOT NULL,
+    last_out INT NOT NULL,
+    passes INT NOT NULL,
+    PRIMARY KEY (day, card),
+    INDEX idx_pass_daily_card (card, day)
+)
+"""
+
+CREATE_STATE = """
+CREATE TABLE IF NOT EXISTS report_state (
+    name VARCHAR(64) PRIMARY KEY,
+    last_id BIGINT NOT NULL
+)
+"""
+
+# Агрегация порции pass и слияние с уже посчитанными днями
+MERGE_CHUNK = """
+INSERT INTO pass_daily (day, card, first_in, last_out, passes)
+SELECT DATE(FROM_UNIXTIME(time)), CAST(card AS UNSIGNED), MIN(time), MAX(time), COUNT(*)
+FROM pass
+WHERE id > %s AND id <= %s
+GROUP BY 1, 2
+ON DUPLICATE KEY UPDATE
+    first_in = LEAST(first_in, VALUES(first_in)),
+    last_out = GREATEST(last_out, VALUES(last_out)),
+    passes = passes + VALUES(passes)
+"""
+
+SAVE_STATE = ("INSERT INTO report_state (name, last_id) VALUES (%s, %s) "
+              "ON DUPLICATE KEY UPDATE last_id = VALUES(last_id)")
+
+
+class DailyReports:
+    def __init__(self, db, chunk_size=50000, pause=0.0, settle=5.0):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.pause = pause
+        # Время, за которое фиксируются начатые вставки в pass (см. update)
+        self.settle = settle
+
+    def query(self, sql, params=None, fetch=True):
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params or ())
+                return cursor.fetchall() if fetch else None
+            finally:
+                cursor.close()
+
+    def ensure_schema(self):
+        self.query(CREATE_DAILY, fetch=False)
+        self.query(CREATE_STATE, fetch=False)
+
+    def high_water_mark(self):
+        rows = self.query("SELECT last_id FROM report_state WHERE name = %s", (STATE_NAME,))
+        return rows[0][0] if rows else 0
+
+    def pending(self):
+        """Строки pass, еще не учтенные в сводной таблице"""
+        return self.query("SELECT COUNT(*) FROM pass WHERE id > %s", (self.high_water_mark(),))[0][0]
+
+    def update(self):
+        """Учет новых строк pass; возвращает число обработанных порций
+
+        Порция и новая позиция сохраняются в одной транзакции, поэтому
+        прерванное обновление не приводит к двойному учету. Строки pass
+        вставляют несколько потоков и процессов, и id фиксируются не по
+        порядку: меньший id может стать видимым позже большего. Если ниже
+        MAX(id) есть пропуски, обновление ждет settle секунд - за это время
+        начатые вставки фиксируются или откатываются, и оставшиеся пропуски
+        считаются окончательными. Вставка, не зафиксированная дольше settle,
+        в сводку не попадет (пересчет - rebuild).
+        """
+        self.ensure_schema()
+        last_id = self.high_water_mark()
+        max_id = self.query("SELECT COALESCE(MAX(id), 0) FROM pass")[0][0]
+        if max_id > last_id and self.settle > 0:
+            present = self.query("SELECT COUNT(*) FROM pass WHERE id > %s AND id <= %s",
+                                 (last_id, max_id))[0][0]
+            if present < max_id - last_id:
+                logging.info(f"Пропуски id в pass до {max_id}: ожидание фиксации вставок {self.settle:g} с")
+                time.sleep(self.settle)
+        chunks = 0
+        while last_id < max_id:
+            end = min(last_id + self.chunk_size, max_id)
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    conn.start_transaction()
+                    cursor.execute(MERGE_CHUNK, (last_id, end))
+                    cursor.execute(SAVE_STATE, (STATE_NAME, end))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    cursor.close()
+            last_id = end
+            chunks += 1
+            if self.pause:
+                time.sleep(self.pause)
+        if chunks:
+            logging.info(f"Сводная таблица pass_daily обновлена до id {last_id}")
+        return chunks
+
+    def rebuild(self):
+        """Пересчет сводной таблицы с начала"""
+        self.ensure_schema()
+        self.query("TRUNCATE TABLE pass_daily", fetch=False)
+        self.query(SAVE_STATE, (STATE_NAME, 0), fetch=False)
+        return self.update()
+
+    def daily(self, date_from, date_to, card=None):
+        """Строки сводки: (день, карта, первый проход, последний проход, число проходов)"""
+        sql = ("SELECT day, card, first_in, last_out, passes FROM pass_daily "
+               "WHERE day BETWEEN %s AND %s")
+        params = [date_from, date_to]
+        if card is not None:
+            sql += " AND card = %s"
+            params.append(int(card))
+        return self.query(sql + " ORDER BY day, card", params)
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отчеты по проходам (сводная таблица pass_daily)")
+    parser.add_argument('command', choices=['update', 'rebuild', 'status', 'daily'],
+                        help="update - учесть новые проходы, rebuild - пересчитать с начала, "
+                             "status - позиция и число неучтенных строк, daily - отчет по дням")
+    parser.add_argument('--from', dest='date_from', type=parse_date, help="начало периода (ГГГГ-ММ-ДД)")
+    parser.add_argument('--to', dest='date_to', type=parse_date, help="конец периода (ГГГГ-ММ-ДД)")
+    parser.add_argument('--card', type=int, help="номер карты")
+    parser.add_argument('--csv', action='store_true', help="вывод в формате CSV")
+    parser.add_argument('--no-update', action='store_true', help="не обновлять сводку перед отчетом")
+    parser.add_argument('--chunk', type=int, default=50000, help="строк pass в одной порции")
+    parser.add_argument('--pause', type=float, default=0.0, help="пауза между порциями, сек")
+    parser.add_argument('--settle', type=float, default=5.0,
+                        help="ожидание фиксации вставок при пропусках id в pass, сек")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    try:
+        reports = DailyReports(Database(), chunk_size=args.chunk, pause=args.pause, settle=args.settle)
+        if args.command == 'update':
+            reports.update()
+        elif args.command == 'rebuild':
+            reports.rebuild()
+        if args.command in ('update', 'rebuild', 'status'):
+            reports.ensure_schema()
+            print(f"Позиция: id {reports.high_water_mark()}, неучтенных строк: {reports.pending()}")
+            return 0
+
+        if not args.no_update:
+            reports.update()
+        date_to = args.date_to or date.today()
+        date_from = args.date_from or date_to - timedelta(days=6)
+        rows = reports.daily(date_from, date_to, args.card)
+
+        if args.csv:
+            writer = csv.writer(sys.stdout)
+            writer.writerow(['day', 'card', 'first_in', 'last_out', 'passes'])
+        for day, card, first_in, last_out, passes in rows:
+            first = datetime.fromtimestamp(first_in).strftime('%H:%M:%S')
+            last = datetime.fromtimestamp(last_out).strftime('%H:%M:%S')
+            if args.csv:
+                writer.writerow([day, card, first, last, passes])
+            else:
+                print(f"{day}  {card:>10}  {first} - {last}  проходов: {passes}")
+        return 0
+    except Exception as e:
+        print(f"Ошибка отчета: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,102 +1,331 @@
-import RPi.GPIO as GPIO
 import time
 import os
+import queue
+import threading
 from dotenv import load_dotenv
 import logging
+from collections import namedtuple
+from gpio_backends import create_backend
+import metrics
+import wiegand
+from pulse_stats import PulseRecorder
 
 load_dotenv()
 
+# Верхняя граница длины кадра: более длинная последовательность считается помехой
+MAX_FRAME_BITS = 64
+
+# Прочитанная карта с привязкой к считывателю и времени завершения кадра;
+# granted - решение о доступе (None, если контроль доступа выключен)
+CardEvent = namedtuple('CardEvent', ['reader_id', 'card', 'timestamp', 'granted'], defaults=(None,))
+
+
+def load_reader_configs():
+    """Описания считывателей из READERS или одиночного DATA0_PIN/DATA1_PIN
+
+    Формат READERS: 'id:data0:data1[:форматы]' через ';',
+    например 'door1:24:23:26;door2:17:27:26,34'.
+    """
+    spec = os.getenv('READERS', '').strip()
+    if not spec:
+        return [{
+            'reader_id': os.getenv('READER_ID', '1'),
+            'data0_pin': int(os.getenv('DATA0_PIN')),
+            'data1_pin': int(os.getenv('DATA1_PIN')),
+            'formats': None,
+        }]
+
+    configs = []
+    for item in spec.split(';'):
+        item = item.strip()
+        if not item:
+            continue
+        parts = item.split(':')
+        if len(parts) not in (3, 4):
+            raise ValueError(f"Неверное описание считывателя: {item}")
+        configs.append({
+            'reader_id': parts[0],
+            'data0_pin': int(parts[1]),
+            'data1_pin': int(parts[2]),
+            'formats': parts[3] if len(parts) == 4 else None,
+        })
+
+    ids = [config['reader_id'] for config in configs]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"Повторяющиеся идентификаторы считывателей: {', '.join(ids)}")
+    return configs
+
+
 class RFIDReader:
-    def __init__(self):
-        self.data0_pin = int(os.getenv('DATA0_PIN'))
-        self.data1_pin = int(os.getenv('DATA1_PIN'))
+    def __init__(self, backend=None, data0_pin=None, data1_pin=None, reader_id=None, formats=None):
+        # Бэкенд GPIO (rpi, gpiod или sim); по умолчанию выбирается через GPIO_BACKEND.
+        # Несколько считывателей в одном процессе используют общий бэкенд.
+        self.backend = backend
+        self.reader_id = reader_id or os.getenv('READER_ID', '1')
+        self.data0_pin = data0_pin if data0_pin is not None else int(os.getenv('DATA0_PIN'))
+        self.data1_pin = data1_pin if data1_pin is not None else int(os.getenv('DATA1_PIN'))
+        # Историческое соответствие линий битам (как в исходном опросе пинов):
+        # импульс на DATA0_PIN дает бит 1, на DATA1_PIN - бит 0.
+        # Так номера карт совпадают с уже сохраненными в БД. Считыватель,
+        # подключенный по названиям линий (DATA0 - бит 0), требует
+        # WIEGAND_SWAP_LINES=1: иначе каждый кадр не проходит проверку четности.
+        if os.getenv('WIEGAND_SWAP_LINES', '0') == '1':
+            self.one_pin = self.data1_pin
+            self.zero_pin = self.data0_pin
+        else:
+            self.one_pin = self.data0_pin
+            self.zero_pin = self.data1_pin
+        # edge - захват по прерываниям (спад фронта), poll - опрос пинов в цикле
+        self.capture_mode = os.getenv('CAPTURE_MODE', 'edge')
+        # Пауза между битами, после которой кадр считается завершенным
+        self.frame_gap = float(os.getenv('WIEGAND_FRAME_GAP_MS', '25')) / 1000
+        # Допустимые форматы Wiegand (по длине кадра)
+        self.formats = wiegand.parse_formats(formats)
+        self.frames_rejected = 0
+        # Кольцевой буфер длительностей импульсов и интервалов для диагностики линии
+        self.pulses = None
+
+        self._bits = []
+        self._last_bit_time = 0.0
+        self._bits_lock = threading.Lock()
+        self._bit_event = threading.Event()
+        self._frames = queue.Queue(maxsize=64)
+        self._capture_thread = None
+        self._capturing = False
+        metrics.FRAME_QUEUE_DEPTH.set_function(self.reader_id, function=self._frames.qsize)
+
         self.setup_gpio()
 
     def setup_gpio(self):
         try:
-            GPIO.setmode(GPIO.BCM)
-            GPIO.setup(self.data0_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-            GPIO.setup(self.data1_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-            logging.info("GPIO успешно настроен")
+            if self.backend is None:
+                self.backend = create_backend()
+            self.backend.setup_input(self.data0_pin)
+            self.backend.setup_input(self.data1_pin)
+            if os.getenv('PULSE_DIAGNOSTICS', '1') == '1':
+                # Длительность импульса измеряется, если бэкенд сообщает подъем фронта
+                measure_widths = self.capture_mode != 'edge' or self.backend.reports_rising
+                self.pulses = PulseRecorder(frame_gap=self.frame_gap, measure_widths=measure_widths)
+            if self.capture_mode == 'edge':
+                self.start_capture()
+            logging.info(f"GPIO успешно настроен для считывателя {self.reader_id} "
+                         f"(пины {self.data0_pin}/{self.data1_pin}, режим захвата: {self.capture_mode})")
         except Exception as e:
             logging.error(f"Ошибка настройки GPIO: {e}")
             raise
 
-    def validate_card_number(self, card_number):
+    def start_capture(self):
+        """Запуск захвата битов по прерываниям"""
+        self._capturing = True
+        if self.pulses and self.pulses.measure_widths:
+            self.backend.watch_falling(self.zero_pin, self._on_zero, rising=self._on_zero_end)
+            self.backend.watch_falling(self.one_pin, self._on_one, rising=self._on_one_end)
+        else:
+            self.backend.watch_falling(self.zero_pin, self._on_zero)
+            self.backend.watch_falling(self.one_pin, self._on_one)
+        self._capture_thread = threading.Thread(
+            target=self._frame_worker, name=f'wiegand-{self.reader_id}', daemon=True
+        )
+        self._capture_thread.start()
+
+    def stop_capture(self):
+        """Остановка захвата битов по прерываниям"""
+        if not self._capturing:
+            return
+        self._capturing = False
+        self._bit_event.set()
+        for pin in (self.data0_pin, self.data1_pin):
+            try:
+                self.backend.unwatch(pin)
+            except Exception:
+                pass
+        if self._capture_thread:
+            self._capture_thread.join(timeout=1)
+            self._capture_thread = None
+
+    def _on_zero(self, pin, timestamp_ns):
+        self._push_bit(0, timestamp_ns)
+
+    def _on_one(self, pin, timestamp_ns):
+        self._push_bit(1, timestamp_ns)
+
+    def _on_zero_end(self, pin, timestamp_ns):
+        self.pulses.rising(0, timestamp_ns)
+
+    def _on_one_end(self, pin, timestamp_ns):
+        self.pulses.rising(1, timestamp_ns)
+
+    def _push_bit(self, bit, timestamp_ns):
+        if self.pulses:
+            self.pulses.falling(bit, timestamp_ns)
+        with self._bits_lock:
+            self._bits.append(bit)
+            self._last_bit_time = timestamp_ns / 1e9
+        self._bit_event.set()
+
+    def _frame_worker(self):
+        """Сборка кадров: кадр завершается после паузы frame_gap без новых битов"""
+        while self._capturing:
+            if not self._bit_event.wait(0.5):
+                continue
+
+            bits = None
+            while self._capturing:
+                with self._bits_lock:
+                    remaining = self._last_bit_time + self.frame_gap - time.monotonic()
+                    if remaining <= 0:
+                        bits = self._bits
+                        self._bits = []
+                        self._bit_event.clear()
+                if bits is not None:
+                    break
+                time.sleep(remaining)
+
+            if not bits:
+                continue
+            try:
+                self._frames.put_nowait((bits, time.time()))
+            except queue.Full:
+                logging.warning(f"Очередь кадров считывателя {self.reader_id} переполнена, кадр отброшен")
+
+    def validate_card_number(self, card_number, max_value=0x00ffffff):
         """Валидация номера карты"""
         if card_number is None:
             return False
-        
+
         # Проверяем, что номер карты в разумных пределах
-        if card_number < 1 or card_number > 0x00ffffff:
+        if card_number < 1 or card_number > max_value:
             logging.warning(f"Недопустимый номер карты: {card_number}")
             return False
-        
+
         # Проверяем, что номер не равен 0
         if card_number == 0:
             logging.warning("Получен нулевой номер карты")
             return False
-            
+
         return True
 
-    def read_card(self):
-        try:
-            card_number = 0
-            bit_count = 0
+    def _read_bits_polling(self):
+        """Чтение кадра опросом пинов (режим poll)"""
+        bits = []
+        max_timeout = 1000  # Максимальное время ожидания
+
+        while len(bits) < MAX_FRAME_BITS:
+            data0 = self.backend.read(self.data0_pin)
+            data1 = self.backend.read(self.data1_pin)
+
+            # Ждем начала передачи данных с таймаутом;
+            # пауза дольше frame_gap после первого бита завершает кадр
             timeout_counter = 0
-            max_timeout = 1000  # Максимальное время ожидания
-
-            for _ in range(26):
-                data0 = GPIO.input(self.data0_pin)
-                data1 = GPIO.input(self.data1_pin)
-
-                # Ждем начала передачи данных с таймаутом
-                timeout_counter = 0
-                while data0 == 1 and data1 == 1:
-                    data0 = GPIO.input(self.data0_pin)
-                    data1 = GPIO.input(self.data1_pin)
-                    time.sleep(0.0001)
-                    timeout_counter += 1
-                    if timeout_counter > max_timeout:
-                        logging.warning("Таймаут ожидания данных карты")
-                        return None
-
-                card_number = card_number << 1
-
-                if data1 == 1:
-                    card_number = card_number | 0x01
-                bit_count += 1
-
-                # Ждем окончания передачи бита
-                timeout_counter = 0
-                while data0 == 0 or data1 == 0:
-                    data0 = GPIO.input(self.data0_pin)
-                    data1 = GPIO.input(self.data1_pin)
-                    time.sleep(0.0001)
-                    timeout_counter += 1
-                    if timeout_counter > max_timeout:
-                        logging.warning("Таймаут ожидания окончания бита")
-                        return None
-
-            # Обработка полученного номера карты
-            card_number = card_number >> 1
-            card_number = card_number & 0x00ffffff
-
-            # Валидация номера карты
-            if self.validate_card_number(card_number):
-                logging.info(f"Прочитана карта: {card_number}")
-                return card_number
-            else:
-                logging.warning(f"Невалидный номер карты: {card_number}")
+            frame_deadline = time.monotonic() + self.frame_gap
+            while data0 == 1 and data1 == 1:
+                data0 = self.backend.read(self.data0_pin)
+                data1 = self.backend.read(self.data1_pin)
+                time.sleep(0.0001)
+                if bits:
+                    if time.monotonic() > frame_deadline:
+                        return bits
+                    continue
+                timeout_counter += 1
+                if timeout_counter > max_timeout:
+                    logging.warning("Таймаут ожидания данных карты")
+                    return None
+
+            bit = 1 if data1 == 1 else 0
+            bits.append(bit)
+            if self.pulses:
+                if data0 == 0 and data1 == 0:
+                    self.pulses.simultaneous_low += 1
+                self.pulses.falling(bit, time.monotonic_ns())
+
+            # Ждем окончания передачи бита
+            timeout_counter = 0
+            while data0 == 0 or data1 == 0:
+                data0 = self.backend.read(self.data0_pin)
+                data1 = self.backend.read(self.data1_pin)
+                time.sleep(0.0001)
+                timeout_counter += 1
+                if timeout_counter > max_timeout:
+                    metrics.READ_TIMEOUTS.inc(self.reader_id)
+                    logging.warning("Таймаут ожидания окончания бита")
+                    return None
+            if self.pulses:
+                self.pulses.rising(bit, time.monotonic_ns())
+
+        return bits
+
+    def _next_frame(self, timeout):
+        """Следующий кадр (биты, время завершения) или None"""
+        if self.capture_mode == 'edge':
+            try:
+                return self._frames.get(timeout=timeout)
+            except queue.Empty:
                 return None
+        bits = self._read_bits_polling()
+        return (bits, time.time()) if bits is not None else None
 
+    def read_event(self, timeout=1.0):
+        """Ожидание кадра и возврат CardEvent (None, если карты нет)"""
+        try:
+            frame = self._next_frame(timeout)
+            if frame is None:
+                return None
+            bits, timestamp = frame
+            started = time.perf_counter()
+            card = self._decode(bits)
+            metrics.DECODE_SECONDS.observe(self.reader_id, value=time.perf_counter() - started)
+            return CardEvent(self.reader_id, card, timestamp) if card else None
         except Exception as e:
             logging.error(f"Ошибка чтения карты: {e}")
             return None
 
+    def drain_events(self):
+        """События из кадров, собранных до остановки захвата (режим edge)"""
+        events = []
+        while self.capture_mode == 'edge' and not self._frames.empty():
+            event = self.read_event(timeout=0)
+            if event:
+                events.append(event)
+        return events
+
+    def read_frame(self, timeout=1.0):
+        """Ожидание кадра и его декодирование (WiegandCard или None)"""
+        event = self.read_event(timeout)
+        return event.card if event else None
+
+    def _decode(self, bits):
+        """Декодирование и валидация кадра (WiegandCard или None)"""
+        # Кадры с неизвестной длиной или ошибкой четности отбрасываются здесь,
+        # до обращения к базе данных
+        metrics.FRAMES.inc(self.reader_id)
+        try:
+            card = wiegand.decode(bits, self.formats)
+        except wiegand.WiegandError as e:
+            self.frames_rejected += 1
+            metrics.FRAMES_REJECTED.inc(self.reader_id, e.reason)
+            logging.warning(f"Кадр считывателя {self.reader_id} отклонен: {e}")
+            return None
+
+        # Валидация номера карты
+        max_value = self.formats[card.bit_count].max_value
+        if self.validate_card_number(card.value, max_value):
+            logging.info(f"Считыватель {self.reader_id}: прочитана карта {card.value} "
+                         f"(формат {card.format}, объект {card.facility}, номер {card.card_number})")
+            return card
+        else:
+            metrics.FRAMES_REJECTED.inc(self.reader_id, 'range')
+            logging.warning(f"Невалидный номер карты: {card.value}")
+            return None
+
+    def read_card(self, timeout=1.0):
+        """Ожидание кадра и возврат номера карты (None, если карты нет)"""
+        card = self.read_frame(timeout)
+        return card.value if card else None
+
     def cleanup(self):
         try:
-            GPIO.cleanup()
+            self.stop_capture()
+            self.backend.cleanup([self.data0_pin, self.data1_pin])
             logging.info("GPIO очищен")
         except Exception as e:
-            logging.error(f"Ошибка при очистке GPIO: {e}") 
\ No newline at end of file
+            logging.error(f"Ошибка при очистке GPIO: {e}")
\ No newline at end of file
@@ -0,0 +1,275 @@
+"""
+Локальный журнал (spool) событий считывателей
+Каждое событие сначала дописывается в журнал на диске, затем фоновый поток
+переносит записи в БД пакетами и сохраняет позицию (checkpoint).
+"""
+
+import os
+import json
+import glob
+import threading
+import logging
+
+SEGMENT_PATTERN = 'spool-*.log'
+
+
+class CardSpool:
+    def __init__(self, sink, spool_dir=None):
+        # sink(records) сохраняет пакет записей и возвращает число сохраненных с начала пакета
+        self.sink = sink
+        self.spool_dir = spool_dir or os.getenv('SPOOL_DIR', './spool')
+        self.segment_size = int(float(os.getenv('SPOOL_SEGMENT_MB', '4')) * 1024 * 1024)
+        self.max_size = int(float(os.getenv('SPOOL_MAX_MB', '256')) * 1024 * 1024)
+        self.batch_size = int(os.getenv('SPOOL_REPLAY_BATCH', '500'))
+        self.retry_delay = float(os.getenv('SPOOL_RETRY_DELAY', '5'))
+        self.checkpoint_file = os.path.join(self.spool_dir, 'checkpoint.json')
+
+        self.appended = 0
+        self.replayed = 0
+        self.dropped = 0
+
+        self._lock = threading.Lock()
+        self._data_event = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._file = None
+        self._segment = 0
+        # Позиция, до которой данные гарантированно на диске (номер сегмента, смещение)
+        self._durable = (0, 0)
+        self._checkpoint = (0, 0)
+        # Размер всех сегментов: ведется при записи и удалении, чтобы не обходить каталог
+        self._size = 0
+
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._recover()
+
+    def _segment_path(self, segment):
+        return os.path.join(self.spool_dir, f'spool-{segment:06d}.log')
+
+    def _segments(self):
+        segments = []
+        for path in glob.glob(os.path.join(self.spool_dir, SEGMENT_PATTERN)):
+            try:
+                segments.append(int(os.path.basename(path)[6:-4]))
+            except ValueError:
+                continue
+        return sorted(segments)
+
+    def _recover(self):
+        """Восстановление состояния после перезапуска или сбоя"""
+        segments = self._segments()
+        self._segment = segments[-1] if segments else 1
+        path = self._segment_path(self._segment)
+
+        # Недописанная последняя строка (сбой во время записи) отбрасывается
+        if os.path.exists(path):
+            with open(path, 'rb+') as f:
+                data = f.read()
+                end = data.rfind(b'\n') + 1
+                if end != len(data):
+                    f.truncate(end)
+                    logging.warning(f"Журнал {path}: отброшена неполная запись ({len(data) - end} байт)")
+
+        self._file = open(path, 'ab')
+        self._durable = (self._segment, self._file.tell())
+        self._size = self._disk_size()
+
+        try:
+            with open(self.checkpoint_file, 'r') as f:
+                checkpoint = json.load(f)
+            self._checkpoint = (checkpoint['segment'], checkpoint['offset'])
+        except FileNotFoundError:
+            self._checkpoint = (segments[0] if segments else self._segment, 0)
+        except (ValueError, KeyError) as e:
+            logging.error(f"Поврежден checkpoint журнала, чтение с начала: {e}")
+            self._checkpoint = (segments[0] if segments else self._segment, 0)
+
+        pending = self.pending_bytes()
+        if pending:
+            logging.info(f"В журнале {pending} байт незаписанных в БД событий")
+
+    def _file_size(self, segment):
+        try:
+            return os.path.getsize(self._segment_path(segment))
+        except FileNotFoundError:
+            return 0
+
+    def _advance(self, segment, offset):
+        """Сдвиг checkpoint вперед (устаревшие позиции игнорируются)"""
+        with self._lock:
+            if (segment, offset) > self._checkpoint:
+                self._save_checkpoint(segment, offset)
+
+    def _save_checkpoint(self, segment, offset):
+        tmp_file = self.checkpoint_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({'segment': segment, 'offset': offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.checkpoint_file)
+        self._checkpoint = (segment, offset)
+
+    def append(self, records):
+        """Запись пакета событий в журнал с одним fsync на пакет"""
+        if not records:
+            return
+        data = b''.join(
+            json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n'
+            for record in records
+        )
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._durable = (self._segment, self._file.tell())
+            self._size += len(data)
+            self.appended += len(records)
+            if self._durable[1] >= self.segment_size:
+                self._rotate()
+            self._enforce_limit()
+        self._data_event.set()
+
+    def _rotate(self):
+        self._file.close()
+        self._segment += 1
+        self._file = open(self._segment_path(self._segment), 'ab')
+        self._durable = (self._segment, 0)
+
+    def _enforce_limit(self):
+        """Удаление самых старых сегментов при превышении SPOOL_MAX_MB"""
+        if self._size <= self.max_size:
+            return
+        segments = [s for s in self._segments() if s != self._segment]
+        total = self._disk_size()
+        while segments and total > self.max_size:
+            oldest = segments.pop(0)
+            path = self._segment_path(oldest)
+            with open(path, 'rb') as f:
+                if oldest == self._checkpoint[0]:
+                    f.seek(self._checkpoint[1])
+                lost = f.read().count(b'\n') if oldest >= self._checkpoint[0] else 0
+            total -= self._file_size(oldest)
+            os.remove(path)
+            if lost:
+                self.dropped += lost
+                logging.error(f"Журнал превысил {self.max_size} байт, удалено событий: {lost}")
+            if self._checkpoint[0] <= oldest:
+                self._save_checkpoint(oldest + 1, 0)
+        self._size = total
+
+    def _disk_size(self):
+        return sum(self._file_size(s) for s in self._segments())
+
+    def size_bytes(self):
+        """Размер журнала на диске"""
+        return self._size
+
+    def pending_bytes(self):
+        """Объем событий, еще не перенесенных в БД"""
+        segment, offset = self._checkpoint
+        pending = 0
+        for s in self._segments():
+            if s >= segment:
+                pending += max(self._file_size(s) - (offset if s == segment else 0), 0)
+        return pending
+
+    def start(self):
+        """Запуск переноса журнала в БД"""
+        self._stop.clear()
+        self._data_event.set()
+        self._thread = threading.Thread(target=self._replay_loop, name='spool-replay', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._data_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def _read_batch(self):
+        """Очередной пакет записей после checkpoint: (записи, сегмент, конечные смещения)"""
+        while True:
+            with self._lock:
+                segment, offset = self._checkpoint
+                durable_segment, durable_offset = self._durable
+                if segment >= durable_segment:
+                    limit = durable_offset
+                    break
+                limit = self._file_size(segment)
+                if offset < limit:
+                    break
+                # Сегмент полностью перенесен в БД
+                if os.path.exists(self._segment_path(segment)):
+                    os.remove(self._segment_path(segment))
+                    self._size = max(self._size - limit, 0)
+                self._save_checkpoint(segment + 1, 0)
+        if offset >= limit:
+            return [], segment, []
+
+        records = []
+        offsets = []
+        try:
+            f = open(self._segment_path(segment), 'rb')
+        except FileNotFoundError:
+            # Сегмент удален из-за ограничения размера: чтение со следующего
+            self._advance(segment + 1, 0)
+            return self._read_batch()
+        with f:
+            f.seek(offset)
+            position = offset
+            while len(records) < self.batch_size and position < limit:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    break
+                position += len(line)
+                try:
+                    records.append(json.loads(line))
+                    offsets.append(position)
+                except ValueError:
+                    logging.error(f"Поврежденная запись журнала пропущена: {line[:100]!r}")
+                    if records:
+                        offsets[-1] = position
+                    else:
+                        self._advance(segment, position)
+        return records, segment, offsets
+
+    def _replay_loop(self):
+        while not self._stop.is_set():
+            try:
+                records, segment, offsets = self._read_batch()
+            except Exception as e:
+                logging.error(f"Ошибка чтения журнала: {e}")
+                self._stop.wait(self.retry_delay)
+                continue
+
+            if not records:
+                self._data_event.wait(1.0)
+                self._data_event.clear()
+                continue
+
+            try:
+                saved = self.sink(records)
+            except Exception as e:
+                logging.error(f"Ошибка переноса журнала в БД: {e}")
+                saved = 0
+
+            if saved:
+                self._advance(segment, offsets[saved - 1])
+                self.replayed += saved
+            if saved < len(records):
+                # БД недоступна: события остаются в журнале до восстановления связи
+                self._stop.wait(self.retry_delay)
+
+    def stats(self):
+        return {
+            'spool_appended': self.appended,
+            'spool_replayed': self.replayed,
+            'spool_dropped': self.dropped,
+            'spool_pending_bytes': self.pending_bytes(),
+            'spool_size_bytes': self.size_bytes(),
+        }
@@ -0,0 +1,76 @@
+"""
+Состояние демона через Unix-сокет
+Демон отвечает на каждое подключение одной строкой JSON и закрывает соединение,
+поэтому monitor.py получает снимок состояния без systemctl, journalctl и БД.
+"""
+
+import os
+import json
+import socket
+import socketserver
+import threading
+import logging
+
+DEFAULT_SOCKET = './wg_daemon.sock'
+
+
+def socket_path():
+    return os.getenv('STATUS_SOCKET', DEFAULT_SOCKET)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            status = self.server.provider()
+        except Exception as e:
+            status = {'error': str(e)}
+        self.request.sendall(json.dumps(status, ensure_ascii=False, default=str).encode('utf-8') + b'\n')
+
+
+class StatusServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, provider, path=None):
+        # provider() возвращает словарь состояния
+        self.provider = provider
+        self.path = path or socket_path()
+        if os.path.exists(self.path):
+            # Сокет остался от предыдущего запуска
+            os.remove(self.path)
+        super().__init__(self.path, _Handler)
+        os.chmod(self.path, 0o660)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='status-server', daemon=True)
+        self._thread.start()
+        logging.info(f"Состояние демона доступно через сокет {self.path}")
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def query_status(path=None, timeout=1.0):
+    """Снимок состояния запущенного демона (словарь)
+
+    OSError, если демон не запущен или сокет недоступен.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path or socket_path())
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return json.loads(b''.join(chunks))
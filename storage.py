@@ -0,0 +1,269 @@
+"""
+Хранилища проходов
+- mysql: центральная БД (класс Database)
+- sqlite: локальная база SQLite в режиме WAL на контроллере; ReplicationWorker
+  переносит записи в MySQL пакетами в фоне, и запись у двери не зависит от сети
+"""
+
+import os
+import time
+import sqlite3
+import threading
+import logging
+from wiegand import MAX_CARD_VALUE
+import metrics
+
+REPLICATION_STATE = 'mysql'
+
+
+class Storage:
+    """Интерфейс хранилища проходов"""
+
+    name = None
+    # True - хранилище на контроллере (локальный журнал перед ним не нужен)
+    local = False
+
+    def validate_card_data(self, card_number):
+        """Валидация данных карты перед сохранением"""
+        if card_number is None:
+            return False
+
+        # Проверяем, что card_number является числом
+        try:
+            card_number = int(card_number)
+        except (ValueError, TypeError):
+            logging.warning(f"Недопустимый тип данных для номера карты: {type(card_number)}")
+            return False
+
+        # Проверяем диапазон
+        if card_number < 1 or card_number > MAX_CARD_VALUE:
+            logging.warning(f"Номер карты вне допустимого диапазона: {card_number}")
+            return False
+
+        return True
+
+    def save_cards(self, cards):
+        """Пакетное сохранение: cards - список (номер карты, считыватель, время); True при успехе"""
+        raise NotImplementedError
+
+    def count_passes_since(self, since):
+        raise NotImplementedError
+
+    def test_connection(self):
+        raise NotImplementedError
+
+    def check_schema(self):
+        """Проверка схемы после подключения (выполняется в фоне при запуске демона)"""
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteStorage(Storage):
+    """Локальная база SQLite (WAL) с отметкой о репликации"""
+
+    name = 'sqlite'
+    local = True
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('STORAGE_SQLITE_PATH', './passes.db')
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # NORMAL в режиме WAL переживает сбой процесса; FULL - и отключение питания
+        self.connection.execute(f"PRAGMA synchronous={os.getenv('STORAGE_SQLITE_SYNC', 'NORMAL')}")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS pass ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, time INTEGER NOT NULL, "
+            "card INTEGER NOT NULL, reader TEXT)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_pass_time ON pass (time)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS replication_state (name TEXT PRIMARY KEY, last_id INTEGER NOT NULL)"
+        )
+        logging.info(f"Локальное хранилище SQLite: {self.path}")
+
+    def save_cards(self, cards):
+        rows = []
+        for card_number, reader_id, event_time in cards:
+            if not self.validate_card_data(card_number):
+                logging.error(f"Невалидные данные карты: {card_number}")
+                continue
+            rows.append((int(event_time if event_time is not None else time.time()), int(card_number), reader_id))
+        if not rows:
+            return True
+        try:
+            with self._lock:
+                self.connection.execute("BEGIN")
+                try:
+                    self.connection.executemany("INSERT INTO pass (time, card, reader) VALUES (?, ?, ?)", rows)
+                    self.connection.execute("COMMIT")
+                except sqlite3.Error:
+                    self.connection.execute("ROLLBACK")
+                    raise
+            return True
+        except sqlite3.Error as e:
+            logging.error(f"Ошибка записи в локальное хранилище: {e}")
+            return False
+
+    def save_card(self, card_number, reader_id=None, event_time=None):
+        return self.save_cards([(card_number, reader_id, event_time)])
+
+    def count_passes_since(self, since):
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM pass WHERE time > ?", (int(since),)).fetchone()[0]
+
+    def test_connection(self):
+        try:
+            with self._lock:
+                self.connection.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error as e:
+            logging.error(f"Локальное хранилище недоступно: {e}")
+            return False
+
+    def replicated_id(self, name=REPLICATION_STATE):
+        with self._lock:
+            row = self.connection.execute("SELECT last_id FROM replication_state WHERE name = ?",
+                                          (name,)).fetchone()
+        return row[0] if row else 0
+
+    def unreplicated(self, limit, name=REPLICATION_STATE):
+        """Записи после позиции репликации: [(id, время, карта, считыватель)]"""
+        last_id = self.replicated_id(name)
+        with self._lock:
+            return self.connection.execute(
+                "SELECT id, time, card, reader FROM pass WHERE id > ? ORDER BY id LIMIT ?", (last_id, limit)
+            ).fetchall()
+
+    def pending_count(self, name=REPLICATION_STATE):
+        last_id = self.replicated_id(name)
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM pass WHERE id > ?", (last_id,)).fetchone()[0]
+
+    def mark_replicated(self, last_id, name=REPLICATION_STATE):
+        with self._lock:
+            self.connection.execute(
+                "INSERT INTO replication_state (name, last_id) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET last_id = excluded.last_id", (name, last_id)
+            )
+
+    def prune(self, before, name=REPLICATION_STATE):
+        """Удаление реплицированных записей старше before (unix time)"""
+        last_id = self.replicated_id(name)
+        with self._lock:
+            return self.connection.execute("DELETE FROM pass WHERE id <= ? AND time < ?",
+                                           (last_id, int(before))).rowcount
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+class ReplicationWorker:
+    """Фоновый перенос записей локального хранилища в MySQL пакетами"""
+
+    def __init__(self, local, upstream_factory=None):
+        self.local = local
+        self.upstream_factory = upstream_factory
+        self.configure()
+        self.replicated = 0
+        self.last_error = None
+        self._upstream = None
+        self._upstream_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._next_prune = 0
+        metrics.REPLICATION_PENDING.set_function(function=self.local.pending_count)
+
+    def configure(self):
+        self.batch_size = int(os.getenv('REPLICATION_BATCH', '500'))
+        self.interval = float(os.getenv('REPLICATION_INTERVAL', '1'))
+        self.retry_delay = float(os.getenv('REPLICATION_RETRY_DELAY', '10'))
+        # Срок хранения реплицированных записей на контроллере (0 - без удаления)
+        self.retention_days = float(os.getenv('STORAGE_RETENTION_DAYS', '30'))
+
+    def upstream(self):
+        """Подключение к MySQL (создается при первом обращении)"""
+        with self._upstream_lock:
+            if self._upstream is None:
+                if self.upstream_factory is None:
+                    from database import Database
+                    self.upstream_factory = Database
+                self._upstream = self.upstream_factory()
+            return self._upstream
+
+    def reset_upstream(self):
+        """Новое подключение к MySQL при следующем пакете (параметры БД изменились)"""
+        with self._upstream_lock:
+            previous, self._upstream = self._upstream, None
+        if previous is not None:
+            previous.close()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='replication', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def replicate_batch(self):
+        """Перенос одного пакета; возвращает число перенесенных записей"""
+        rows = self.local.unreplicated(self.batch_size)
+        if not rows:
+            return 0
+        if not self.upstream().save_cards([(card, reader, event_time) for _, event_time, card, reader in rows]):
+            raise RuntimeError("MySQL не принял пакет")
+        # Сбой между записью в MySQL и отметкой приведет к повторной отправке пакета
+        self.local.mark_replicated(rows[-1][0])
+        self.replicated += len(rows)
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                count = self.replicate_batch()
+                if self.last_error:
+                    logging.info("Репликация в MySQL восстановлена")
+                self.last_error = None
+            except Exception as e:
+                if self.last_error is None:
+                    logging.error(f"Ошибка репликации в MySQL: {e}")
+                self.last_error = str(e)
+                self._stop.wait(self.retry_delay)
+                continue
+
+            if self.retention_days and time.time() >= self._next_prune:
+                self._next_prune = time.time() + 3600
+                removed = self.local.prune(time.time() - self.retention_days * 86400)
+                if removed:
+                    logging.info(f"Удалено реплицированных записей старше {self.retention_days:g} дней: {removed}")
+
+            if count < self.batch_size:
+                self._stop.wait(self.interval)
+
+    def stats(self):
+        return {
+            'replicated': self.replicated,
+            'replication_pending': self.local.pending_count(),
+            'replication_error': self.last_error,
+        }
+
+
+def create_storage(name=None, connect=True):
+    """Хранилище по имени (по умолчанию из STORAGE_BACKEND, иначе mysql)
+
+    connect=False - подключение к MySQL откладывается до первого запроса.
+    """
+    name = name or os.getenv('STORAGE_BACKEND', 'mysql')
+    if name == 'mysql':
+        from database import Database
+        return Database(connect=connect)
+    if name == 'sqlite':
+        return SQLiteStorage()
+    raise ValueError(f"Неизвестное хранилище: {name}")
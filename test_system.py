@@ -184,6 +184,672 @@ class SystemTester:
             self.print_result("RFID Reader класс", False, str(e))
             return False
     
+    def test_wiegand_decoder(self):
+        """Тест декодера форматов Wiegand"""
+        try:
+            from wiegand import FORMATS, WiegandError, decode
+            
+            for length, fmt in FORMATS.items():
+                bits = fmt.encode(12345)
+                card = decode(bits)
+                assert card.value == 12345, f"{length} бит: получено {card.value}"
+                
+                # Искаженный бит должен отклоняться проверкой четности
+                bits[length // 2] ^= 1
+                try:
+                    decode(bits)
+                    raise AssertionError(f"{length} бит: ошибка четности не обнаружена")
+                except WiegandError:
+                    pass
+            
+            card = decode(FORMATS[26].encode((18 << 16) | 4321))
+            assert (card.facility, card.card_number) == (18, 4321)
+            
+            self.print_result("Декодер Wiegand", True)
+            return True
+        except Exception as e:
+            self.print_result("Декодер Wiegand", False, str(e))
+            return False
+    
+    def test_simulated_capture(self):
+        """Тест захвата кадра через симулированный бэкенд GPIO"""
+        try:
+            from gpio_backends import SimulatedBackend
+            from rfid_reader import RFIDReader
+            from wiegand import FORMATS
+            backend = SimulatedBackend()
+            reader = RFIDReader(backend=backend)
+            
+            # Широкие импульсы, чтобы кадр считывался и в режиме poll
+            bits = FORMATS[26].encode(12345)
+            backend.send_frame(bits, reader.zero_pin, reader.one_pin,
+                               pulse_us=1000, interval_us=3000, block=False)
+            card_number = reader.read_card(timeout=1.0)
+            
+            reader.cleanup()
+            assert card_number == 12345, f"Получено {card_number}"
+            
+            # Подключение по названиям линий: DATA0 передает бит 0
+            os.environ['WIEGAND_SWAP_LINES'] = '1'
+            try:
+                reader = RFIDReader(backend=SimulatedBackend())
+            finally:
+                del os.environ['WIEGAND_SWAP_LINES']
+            assert reader.zero_pin == reader.data0_pin and reader.one_pin == reader.data1_pin
+            reader.backend.send_frame(bits, reader.data0_pin, reader.data1_pin,
+                                      pulse_us=1000, interval_us=3000, block=False)
+            card_number = reader.read_card(timeout=1.0)
+            reader.cleanup()
+            assert card_number == 12345, f"Получено {card_number} при WIEGAND_SWAP_LINES=1"
+            self.print_result("Симуляция захвата", True)
+            return True
+        except Exception as e:
+            self.print_result("Симуляция захвата", False, str(e))
+            return False
+    
+    def test_pulse_stats(self):
+        """Тест кольцевого буфера импульсов и счетчиков аномалий"""
+        try:
+            from pulse_stats import PulseRecorder
+            
+            pulses = PulseRecorder(size=4, frame_gap=0.025)
+            t = 1_000_000_000
+            # Нормальные импульсы 50 мкс с интервалом 2 мс
+            for bit in (1, 0, 1):
+                pulses.falling(bit, t)
+                pulses.rising(bit, t + 50_000)
+                t += 2_000_000
+            # Помеха 5 мкс, затем обе линии в низком уровне, затем длинный интервал
+            pulses.falling(0, t)
+            pulses.rising(0, t + 5_000)
+            pulses.falling(1, t + 100_000)
+            pulses.falling(0, t + 120_000)
+            pulses.rising(1, t + 170_000)
+            pulses.rising(0, t + 180_000)
+            pulses.falling(1, t + 15_000_000)
+            
+            stats = pulses.stats()
+            assert stats['pulses'] == 7 and stats['buffered'] == 4
+            assert stats['short_pulses'] == 1
+            assert stats['simultaneous_low'] == 1
+            assert stats['long_intervals'] == 1
+            assert pulses.records()[0] == (0, 5, 2000)
+            assert sum(count for _, count in stats['width_us']) == 3
+            
+            self.print_result("Диагностика импульсов", True)
+            return True
+        except Exception as e:
+            self.print_result("Диагностика импульсов", False, str(e))
+            return False
+    
+    def test_capture_ring(self):
+        """Тест кольцевого буфера кадров процесса захвата"""
+        try:
+            from capture_process import FrameRing
+            from wiegand import FORMATS
+            
+            ring = FrameRing(bytearray(FrameRing.size(2)), 2)
+            bits = FORMATS[26].encode(12345)
+            assert ring.push(0, bits, 1.5) and ring.push(1, [1] * 70, 2.5)
+            # Буфер полон: кадр отбрасывается и учитывается
+            assert not ring.push(0, bits, 3.5)
+            assert ring.dropped == 1 and ring.depth() == 2
+            assert ring.pop() == (0, bits, 1.5)
+            reader_index, long_bits, _ = ring.pop()
+            assert reader_index == 1 and len(long_bits) == 70
+            assert ring.pop() is None
+            assert ring.push(0, bits, 4.5) and ring.pop() == (0, bits, 4.5)
+            
+            self.print_result("Буфер процесса захвата", True)
+            return True
+        except Exception as e:
+            self.print_result("Буфер процесса захвата", False, str(e))
+            return False
+    
+    def test_write_queue(self):
+        """Тест очереди записи: переполнение не блокирует захват, очередь дописывается при остановке"""
+        try:
+            from card_writer import CardWriter
+            from rfid_reader import CardEvent
+            from wiegand import decode, FORMATS
+            
+            class FakeDB:
+                local = True
+                def __init__(self):
+                    self.cards = []
+                def validate_card_data(self, card_number):
+                    return True
+                def save_cards(self, cards):
+                    self.cards.extend(cards)
+                    return True
+            
+            db = FakeDB()
+            writer = CardWriter(db, max_size=2)
+            events = [CardEvent('1', decode(FORMATS[26].encode(value)), 0) for value in (1, 2, 3)]
+            assert [writer.submit(event) for event in events] == [True, True, False]
+            assert writer.dropped == 1 and writer.depth == 2
+            
+            writer.start()
+            writer.stop()
+            assert [card for card, _, _ in db.cards] == [1, 2]
+            assert writer.written == 2 and writer.depth == 0
+            
+            self.print_result("Очередь записи", True)
+            return True
+        except Exception as e:
+            self.print_result("Очередь записи", False, str(e))
+            return False
+    
+    def test_write_batching(self):
+        """Тест пакетной записи: сброс по WRITE_BATCH_SIZE и по WRITE_FLUSH_MS"""
+        try:
+            from card_writer import CardWriter
+            from rfid_reader import CardEvent
+            from wiegand import decode, FORMATS
+            
+            class FakeDB:
+                local = True
+                def __init__(self):
+                    self.batches = []
+                def validate_card_data(self, card_number):
+                    return True
+                def save_cards(self, cards):
+                    self.batches.append(len(cards))
+                    return True
+            
+            db = FakeDB()
+            writer = CardWriter(db)
+            writer.batch_size = 3
+            writer.flush_interval = 0.05
+            for value in range(1, 8):
+                writer.submit(CardEvent('1', decode(FORMATS[26].encode(value)), 0))
+            
+            started = time.monotonic()
+            while writer.depth:
+                writer.process(writer.next_batch(timeout=0.1))
+            elapsed = time.monotonic() - started
+            assert db.batches == [3, 3, 1], f"Пакеты {db.batches}"
+            # Неполный пакет ждет не дольше flush_interval от первого события
+            assert 0.04 <= elapsed < 0.5, f"Время сброса {elapsed:.3f} с"
+            assert writer.written == 7
+            
+            self.print_result("Пакетная запись", True)
+            return True
+        except Exception as e:
+            self.print_result("Пакетная запись", False, str(e))
+            return False
+    
+    def test_duplicate_filter(self):
+        """Тест подавления повторных чтений"""
+        try:
+            from dedup import DuplicateFilter
+            from rfid_reader import CardEvent
+            from wiegand import decode, FORMATS
+            
+            card = decode(FORMATS[26].encode(12345))
+            dedup = DuplicateFilter(window=3, max_entries=2)
+            assert dedup.accept(CardEvent('1', card, 0), now=0.0) == True
+            assert dedup.accept(CardEvent('1', card, 0), now=1.0) == False
+            # Другой считыватель - отдельное событие
+            assert dedup.accept(CardEvent('2', card, 0), now=1.5) == True
+            # Повтор продлевает окно
+            assert dedup.accept(CardEvent('1', card, 0), now=3.5) == False
+            assert dedup.accept(CardEvent('1', card, 0), now=7.0) == True
+            assert dedup.suppressed == 2
+            assert len(dedup) <= 2
+            
+            self.print_result("Подавление повторов", True)
+            return True
+        except Exception as e:
+            self.print_result("Подавление повторов", False, str(e))
+            return False
+    
+    def test_config_reload(self):
+        """Тест применения новых описаний считывателей без остановки остальных"""
+        saved = {key: os.environ.get(key) for key in ('READERS', 'DEDUP_WINDOW_MS')}
+        daemon = None
+        try:
+            from gpio_backends import SimulatedBackend
+            from wg_daemon import WGDaemon
+            
+            daemon = WGDaemon()
+            daemon.backend = SimulatedBackend()
+            daemon.running = True
+            os.environ['READERS'] = 'r1:5:6'
+            daemon.reload_readers()
+            first = daemon.readers[0]
+            
+            os.environ['READERS'] = 'r1:5:6;r2:7:8'
+            os.environ['DEDUP_WINDOW_MS'] = '500'
+            daemon.apply_config({'READERS', 'DEDUP_WINDOW_MS'})
+            assert [reader.reader_id for reader in daemon.readers] == ['r1', 'r2']
+            # Неизмененный считыватель не пересоздается
+            assert daemon.readers[0] is first
+            assert daemon.dedup.window == 0.5
+            
+            os.environ['READERS'] = 'r2:7:9'
+            daemon.reload_readers()
+            assert [(reader.reader_id, reader.data1_pin) for reader in daemon.readers] == [('r2', 9)]
+            assert set(daemon.capture_threads) == {'r2'}
+            
+            self.print_result("Перечитывание конфигурации", True)
+            return True
+        except Exception as e:
+            self.print_result("Перечитывание конфигурации", False, str(e))
+            return False
+        finally:
+            if daemon:
+                daemon.running = False
+                for reader in daemon.readers:
+                    daemon.stop_reader(reader)
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+    
+    def test_access_list(self):
+        """Тест локального списка доступа и его снимка"""
+        try:
+            import contextlib
+            import tempfile
+            from access import AccessList
+            from rfid_reader import CardEvent
+            from wiegand import decode, FORMATS
+            
+            with tempfile.TemporaryDirectory() as tmp:
+                access = AccessList(snapshot_file=os.path.join(tmp, 'access.snapshot'))
+                access._set(12345, True)
+                access._set(1 << 30, True)
+                access.high_water_mark = 7
+                assert access.allowed(12345) and access.allowed(1 << 30)
+                assert not access.allowed(12346)
+                access.save_snapshot()
+                
+                restored = AccessList(snapshot_file=access.snapshot_file)
+                assert restored.load_snapshot()
+                assert restored.count == 2 and restored.high_water_mark == 7
+                restored._set(12345, False)
+                
+                card = decode(FORMATS[26].encode(12345))
+                assert access.check(CardEvent('1', card, 0)).granted == True
+                assert restored.check(CardEvent('1', card, 0)).granted == False
+                
+                # Без снимка загрузка из БД повторяется, пока БД недоступна
+                class FakeDB:
+                    up = False
+                    @contextlib.contextmanager
+                    def get_connection(self):
+                        if not self.up:
+                            raise ConnectionError("БД недоступна")
+                        yield self
+                    def cursor(self):
+                        return self
+                    def execute(self, sql, params=()):
+                        self.sql = sql
+                    def fetchall(self):
+                        if 'MAX(id)' in self.sql:
+                            return [(3,)]
+                        return [(12345,)] if 'access_card' in self.sql else []
+                    def close(self):
+                        pass
+                
+                db = FakeDB()
+                loading = AccessList(db=db, snapshot_file=os.path.join(tmp, 'db.snapshot'))
+                loading.sync_interval = 0.05
+                loading.start()
+                time.sleep(0.2)
+                assert not loading.loaded and loading.synced is False
+                db.up = True
+                deadline = time.time() + 2
+                while not loading.loaded and time.time() < deadline:
+                    time.sleep(0.02)
+                loading.stop()
+                assert loading.allowed(12345) and loading.high_water_mark == 3
+                assert os.path.exists(loading.snapshot_file)
+                
+                # Изменение, зафиксированное позже изменения с большим id, не теряется
+                class ChangesDB(FakeDB):
+                    up = True
+                    changes = []
+                    def execute(self, sql, params=()):
+                        self.rows = [row for row in sorted(self.changes) if row[0] > params[0]][:params[1]]
+                    def fetchall(self):
+                        return self.rows
+                
+                db = ChangesDB()
+                late = AccessList(db=db, snapshot_file=os.path.join(tmp, 'late.snapshot'))
+                db.changes = [(1, 500, 1), (3, 501, 1)]
+                assert late.sync() == 2 and late.high_water_mark == 3
+                assert late.stats()['access_pending_gaps'] == 1
+                db.changes.append((2, 500, 0))
+                assert late.sync() == 1
+                assert not late.allowed(500) and late.allowed(501)
+                assert late.stats()['access_pending_gaps'] == 0
+                # Незаполненный пропуск считается откатом через sync_settle
+                db.changes.append((5, 502, 1))
+                late.sync_settle = 0
+                late.sync()
+                late.sync()
+                assert late.stats()['access_pending_gaps'] == 0 and late.allowed(502)
+            
+            self.print_result("Список доступа", True)
+            return True
+        except Exception as e:
+            self.print_result("Список доступа", False, str(e))
+            return False
+    
+    def test_metrics(self):
+        """Тест формирования метрик Prometheus"""
+        try:
+            from metrics import Registry, Counter, Gauge, Histogram
+            
+            registry = Registry()
+            frames = Counter('test_frames_total', 'Кадры', ['reader'], registry=registry)
+            depth = Gauge('test_depth', 'Глубина', registry=registry)
+            latency = Histogram('test_seconds', 'Задержка', ['reader'], buckets=(0.1, 1.0), registry=registry)
+            frames.inc('door1')
+            frames.inc('door1')
+            depth.set_function(function=lambda: 5)
+            latency.observe('door1', value=0.05)
+            latency.observe('door1', value=0.5)
+            
+            text = registry.render()
+            assert 'test_frames_total{reader="door1"} 2' in text
+            assert 'test_depth 5' in text
+            assert 'test_seconds_bucket{reader="door1",le="0.1"} 1' in text
+            assert 'test_seconds_bucket{reader="door1",le="+Inf"} 2' in text
+            assert 'test_seconds_count{reader="door1"} 2' in text
+            
+            self.print_result("Метрики", True)
+            return True
+        except Exception as e:
+            self.print_result("Метрики", False, str(e))
+            return False
+    
+    def test_log_rate_limit(self):
+        """Тест подавления повторяющихся предупреждений"""
+        try:
+            import logging
+            from log_setup import RateLimitFilter
+            
+            rate_limit = RateLimitFilter(interval=60)
+            def record(level, message):
+                return logging.LogRecord('test', level, __file__, 0, message, None, None)
+            
+            assert rate_limit.filter(record(logging.WARNING, "Таймаут"))
+            for _ in range(10):
+                assert not rate_limit.filter(record(logging.WARNING, "Таймаут"))
+            assert rate_limit.filter(record(logging.WARNING, "Другое"))
+            assert rate_limit.filter(record(logging.INFO, "Карта"))
+            assert rate_limit.filter(record(logging.INFO, "Карта"))
+            assert rate_limit.pending() == [(logging.WARNING, "Таймаут", 10)]
+            
+            self.print_result("Ограничение частоты логов", True)
+            return True
+        except Exception as e:
+            self.print_result("Ограничение частоты логов", False, str(e))
+            return False
+    
+    def test_status_socket(self):
+        """Тест сокета состояния демона"""
+        try:
+            import tempfile
+            from status_server import StatusServer, query_status
+            
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'status.sock')
+                server = StatusServer(lambda: {'uptime': 5, 'readers': {'door1': {'written': 3}}}, path).start()
+                try:
+                    status = query_status(path)
+                finally:
+                    server.stop()
+                assert status['readers']['door1']['written'] == 3
+                assert not os.path.exists(path)
+            
+            self.print_result("Сокет состояния", True)
+            return True
+        except Exception as e:
+            self.print_result("Сокет состояния", False, str(e))
+            return False
+    
+    def test_event_stream(self):
+        """Тест рассылки событий подписчикам и вытеснения старых событий"""
+        try:
+            import tempfile
+            from event_stream import EventPublisher, iter_events
+            from rfid_reader import CardEvent
+            from wiegand import decode, FORMATS
+            
+            card = decode(FORMATS[26].encode(12345))
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'events.sock')
+                publisher = EventPublisher(buffer_size=2).start(path=path, port=0)
+                try:
+                    events = iter_events(path, timeout=2.0)
+                    # Подписчик регистрируется при подключении, до первого события
+                    deadline = time.time() + 2
+                    while not publisher.subscribers and time.time() < deadline:
+                        time.sleep(0.01)
+                    publisher.publish(CardEvent('door1', card, time.time(), True))
+                    event = next(events)
+                    assert event['seq'] == 1 and event['card'] == 12345 and event['granted'] is True
+                    events.close()
+                    
+                    # Медленный подписчик получает только последние события
+                    slow = publisher.subscribe('slow')
+                    for _ in range(3):
+                        publisher.publish(CardEvent('door1', card, time.time()))
+                    assert slow.dropped == 1
+                    assert len(slow.queue) == 2
+                    assert b'"seq": 3' in slow.queue[0]
+                finally:
+                    publisher.stop()
+                assert not os.path.exists(path)
+            
+            self.print_result("Рассылка событий", True)
+            return True
+        except Exception as e:
+            self.print_result("Рассылка событий", False, str(e))
+            return False
+    
+    def test_log_tail(self):
+        """Тест инкрементального чтения лога и ротации"""
+        try:
+            import tempfile
+            from datetime import datetime
+            from log_tail import LogTailer
+            
+            with tempfile.TemporaryDirectory() as tmp:
+                log_file = os.path.join(tmp, 'wg_daemon.log')
+                stamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S,000')
+                def write(path, lines, mode='a'):
+                    with open(path, mode) as f:
+                        f.writelines(f"{stamp} - {line}\n" for line in lines)
+                
+                write(log_file, ["WARNING - Таймаут ожидания данных карты (повторялось еще 4 раз)",
+                                 "INFO - Демон запущен"])
+                LogTailer(log_file, window=1).poll()
+                
+                # Ротация переименованием: старый файл дочитывается, новый читается с начала
+                write(log_file, ["ERROR - Кадр считывателя 1 отклонен"])
+                os.rename(log_file, log_file + '.1')
+                write(log_file, ["ERROR - Кадр считывателя 1 отклонен"], 'w')
+                tailer = LogTailer(log_file, window=1)
+                tailer.poll()
+                assert tailer.rates() == {'frames:ERROR': 2, 'timeouts:WARNING': 5}
+                
+                # Повторная проверка без новых строк ничего не читает
+                tailer = LogTailer(log_file, window=1)
+                tailer.poll()
+                assert tailer.bytes_read == 0
+            
+            self.print_result("Чтение лога", True)
+            return True
+        except Exception as e:
+            self.print_result("Чтение лога", False, str(e))
+            return False
+    
+    def test_spool(self):
+        """Тест журнала: обрезка недописанной записи, checkpoint, ротация и ограничение размера"""
+        try:
+            import tempfile
+            from spool import CardSpool
+            
+            saved = []
+            def sink(records):
+                saved.extend(record['card'] for record in records)
+                return len(records)
+            
+            def replay(spool, count):
+                spool.start()
+                deadline = time.time() + 5
+                while spool.replayed < count and time.time() < deadline:
+                    time.sleep(0.01)
+                spool.stop()
+            
+            def record(card):
+                return {'reader': '1', 'card': card, 'time': 0, 'format': 'H10301'}
+            
+            with tempfile.TemporaryDirectory() as tmp:
+                spool = CardSpool(sink, tmp)
+                spool.append([record(1), record(2)])
+                spool.stop()
+                # Сбой во время записи: неполная последняя строка
+                with open(spool._segment_path(spool._segment), 'ab') as f:
+                    f.write(b'{"reader":"1","ca')
+                
+                spool = CardSpool(sink, tmp)
+                assert spool.pending_bytes() == spool.size_bytes()
+                replay(spool, 2)
+                assert saved == [1, 2]
+                
+                # После перезапуска переносятся только новые события
+                spool = CardSpool(sink, tmp)
+                assert spool.pending_bytes() == 0
+                spool.append([record(3)])
+                replay(spool, 1)
+                assert saved == [1, 2, 3]
+                
+                # Ротация сегментов и удаление самых старых при превышении размера
+                spool = CardSpool(sink, tmp)
+                spool.segment_size = 100
+                spool.max_size = 250
+                for card in range(10, 20):
+                    spool.append([record(card)])
+                assert len(spool._segments()) > 1
+                assert spool.size_bytes() <= 250 + 100
+                # Размер ведется без обхода каталога и совпадает с размером на диске
+                assert spool.size_bytes() == spool._disk_size()
+                assert spool.dropped > 0
+                replay(spool, 10 - spool.dropped)
+                assert saved[3:] == list(range(10 + spool.dropped, 20))
+                assert spool.size_bytes() == spool._disk_size()
+            
+            self.print_result("Локальный журнал", True)
+            return True
+        except Exception as e:
+            self.print_result("Локальный журнал", False, str(e))
+            return False
+    
+    def test_storage(self):
+        """Тест локального хранилища SQLite и репликации"""
+        try:
+            import tempfile
+            from storage import SQLiteStorage, ReplicationWorker
+            
+            class Upstream:
+                def __init__(self):
+                    self.cards = []
+                    self.available = False
+                def save_cards(self, cards):
+                    if self.available:
+                        self.cards.extend(cards)
+                    return self.available
+            
+            with tempfile.TemporaryDirectory() as tmp:
+                local = SQLiteStorage(os.path.join(tmp, 'passes.db'))
+                now = int(time.time())
+                assert local.save_cards([(12345, 'reader1', now - 86400 * 40), (0, 'reader1', now),
+                                         (67890, 'reader2', now)])
+                assert local.pending_count() == 2
+                
+                # MySQL недоступен: записи остаются в локальном хранилище
+                upstream = Upstream()
+                worker = ReplicationWorker(local, upstream_factory=lambda: upstream)
+                try:
+                    worker.replicate_batch()
+                    assert False, "пакет должен быть отклонен"
+                except RuntimeError:
+                    pass
+                assert local.pending_count() == 2
+                
+                upstream.available = True
+                assert worker.replicate_batch() == 2
+                assert upstream.cards == [(12345, 'reader1', now - 86400 * 40), (67890, 'reader2', now)]
+                assert local.pending_count() == 0 and worker.replicate_batch() == 0
+                
+                # Удаляются только реплицированные записи старше срока хранения
+                local.save_card(11111, 'reader1', now - 86400 * 40)
+                assert local.prune(now - 86400 * 30) == 1
+                assert local.pending_count() == 1
+                local.close()
+            
+            self.print_result("Локальное хранилище", True)
+            return True
+        except Exception as e:
+            self.print_result("Локальное хранилище", False, str(e))
+            return False
+    
+    def test_prepared_batch(self):
+        """Тест повторного использования подготовленного пакетного INSERT"""
+        try:
+            from database import Database
+            
+            class FakeCursor:
+                def __init__(self):
+                    self.prepares = 0
+                    self._executed = None
+                def execute(self, operation, params=()):
+                    # Как у MySQLCursorPrepared: повторная подготовка при другом объекте строки
+                    if operation is not self._executed:
+                        self.prepares += 1
+                        self._executed = operation
+                def close(self):
+                    pass
+            
+            class FakeConnection:
+                def __init__(self):
+                    self.cursors = []
+                def is_connected(self):
+                    return True
+                def cursor(self, prepared=False):
+                    cursor = FakeCursor()
+                    self.cursors.append(cursor)
+                    return cursor
+                def start_transaction(self):
+                    pass
+                def commit(self):
+                    pass
+                def rollback(self):
+                    pass
+            
+            db = Database(pool_size=0, connect=False)
+            db.use_prepared = True
+            db.has_reader_column = True
+            db.connection = FakeConnection()
+            cards = [(12345, '1', 1000), (12346, '1', 1001), (12347, '2', 1002)]
+            assert db.save_cards(cards)
+            assert db.save_cards(cards)
+            assert len(db.connection.cursors) == 1
+            assert db.connection.cursors[0].prepares == 1
+            
+            self.print_result("Подготовленная пакетная запись", True)
+            return True
+        except Exception as e:
+            self.print_result("Подготовленная пакетная запись", False, str(e))
+            return False
+    
     def test_database_class(self):
         """Тест класса Database"""
         try:
@@ -236,6 +902,23 @@ class SystemTester:
             ("Директория логов", self.test_log_directory),
             ("PID файл", self.test_pid_file_access),
             ("RFID Reader класс", self.test_rfid_reader_class),
+            ("Декодер Wiegand", self.test_wiegand_decoder),
+            ("Симуляция захвата", self.test_simulated_capture),
+            ("Диагностика импульсов", self.test_pulse_stats),
+            ("Буфер процесса захвата", self.test_capture_ring),
+            ("Очередь записи", self.test_write_queue),
+            ("Пакетная запись", self.test_write_batching),
+            ("Подавление повторов", self.test_duplicate_filter),
+            ("Перечитывание конфигурации", self.test_config_reload),
+            ("Список доступа", self.test_access_list),
+            ("Метрики", self.test_metrics),
+            ("Ограничение частоты логов", self.test_log_rate_limit),
+            ("Сокет состояния", self.test_status_socket),
+            ("Рассылка событий", self.test_event_stream),
+            ("Чтение лога", self.test_log_tail),
+            ("Локальный журнал", self.test_spool),
+            ("Локальное хранилище", self.test_storage),
+            ("Подготовленная пакетная запись", self.test_prepared_batch),
             ("Database класс", self.test_database_class),
             ("Systemd сервис", self.test_systemd_service)
         ]
@@ -97,12 +97,10 @@ if [ -f "$INSTALL_DIR/rfid-reader.service" ]; then
     systemctl daemon-reload
 fi
 
-# Обновление ротации логов
-print_message "Обновление ротации логов..."
-if [ -f "$INSTALL_DIR/logrotate.conf" ]; then
-    sed "s|/opt/rfid-reader|$INSTALL_DIR|g" "$INSTALL_DIR/logrotate.conf" > /etc/logrotate.d/rfid-reader
-    sed -i "s/User=pi/User=$SERVICE_USER/g" /etc/logrotate.d/rfid-reader
-    sed -i "s/Group=pi/Group=$SERVICE_USER/g" /etc/logrotate.d/rfid-reader
+# Демон сам ротирует свой лог: старая конфигурация logrotate конфликтует с ним
+if [ -f /etc/logrotate.d/rfid-reader ]; then
+    print_message "Удаление конфигурации logrotate (ротацию выполняет демон)..."
+    rm -f /etc/logrotate.d/rfid-reader
 fi
 
 # Обновление виртуального окружения
@@ -1,64 +1,299 @@
 #!/usr/bin/env python3
+import time
+
+# Отсчет времени запуска: до импорта остальных модулей
+STARTED = time.monotonic()
+
 import os
 import sys
-import time
+import json
 import logging
 import signal
-from daemonize import Daemonize
-from dotenv import load_dotenv
-from database import Database
-from rfid_reader import RFIDReader
+import threading
+from dotenv import load_dotenv, dotenv_values, find_dotenv
+from storage import create_storage, ReplicationWorker
+from card_writer import CardWriter
+from access import AccessList
+from log_setup import setup_logging
+from status_server import StatusServer, socket_path, query_status
+import metrics
+from dedup import DuplicateFilter
+from gpio_backends import create_backend
+from rfid_reader import RFIDReader, load_reader_configs
 
-load_dotenv()
+# Путь определяется при импорте: по SIGHUP перечитывается тот же файл
+env_file = find_dotenv()
+load_dotenv(env_file)
 
-# Настройка логирования
-log_dir = os.getenv('LOG_DIR')
-os.makedirs(log_dir, exist_ok=True)
+# Настройка логирования (каталог создается при запуске демона)
+log_dir = os.path.abspath(os.getenv('LOG_DIR', './logs'))
 log_file = os.path.join(log_dir, 'wg_daemon.log')
 
-logging.basicConfig(
-    filename=log_file,
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    maxBytes=10*1024*1024,  # 10MB
-    backupCount=5
-)
+# Параметры подключения к БД: при изменении по SIGHUP создается новое подключение
+STORAGE_KEYS = ('DB_HOST', 'DB_USER', 'DB_PASSWORD', 'DB_NAME', 'DB_POOL_SIZE', 'DB_POOL_NAME', 'DB_PREPARED',
+                'DB_PREPARED_CACHE', 'DB_POOL_TIMEOUT', 'DB_INSERT_CHUNK')
+# Общие параметры считывателей: при изменении пересоздаются все считыватели
+READER_KEYS = ('CAPTURE_MODE', 'WIEGAND_FRAME_GAP_MS', 'WIEGAND_FORMATS', 'WIEGAND_SWAP_LINES',
+               'PULSE_DIAGNOSTICS', 'PULSE_BUFFER_SIZE', 'PULSE_MIN_US', 'PULSE_MAX_US', 'PULSE_MAX_INTERVAL_US')
+# Параметры, которые применяются только при перезапуске
+RESTART_KEYS = ('STORAGE_BACKEND', 'STORAGE_SQLITE_PATH', 'REPLICATION_ENABLED', 'GPIO_BACKEND', 'CAPTURE_PROCESS',
+                'DAEMON_MODE', 'ACCESS_CONTROL', 'ACCESS_SNAPSHOT', 'METRICS_PORT', 'METRICS_HOST', 'STATUS_SOCKET',
+                'LOG_DIR', 'PID_FILE', 'SPOOL_ENABLED', 'SPOOL_DIR', 'WRITE_QUEUE_SIZE', 'EVENT_SOCKET',
+                'EVENT_PORT', 'EVENT_HOST')
 
 class WGDaemon:
+    mode = 'thread'
+
     def __init__(self):
         self.pid_file = os.getenv('PID_FILE')
         self.db = None
-        self.reader = None
+        self.backend = None
+        self.readers = []
+        # Описания считывателей по идентификатору (для сравнения при перечитывании конфигурации)
+        self.reader_configs = {}
+        self.capture_threads = {}
+        # Отдельный процесс захвата с кольцевым буфером в разделяемой памяти (CAPTURE_PROCESS=1)
+        self.capture_process = None
+        # Общий конвейер записи для всех считывателей
+        self.writer = None
+        # Репликация локального хранилища в MySQL (STORAGE_BACKEND=sqlite)
+        self.replicator = None
+        self.dedup = DuplicateFilter()
+        # Локальный список доступа (ACCESS_CONTROL=1)
+        self.access = None
+        self.metrics_server = None
+        self.status_server = None
+        # Рассылка событий проходов подписчикам (EVENT_SOCKET, EVENT_PORT)
+        self.events = None
+        # Время последнего чтения карты по считывателям
+        self.last_card_time = {}
+        self.log_pipeline = None
         self.running = False
-        self.cards_processed = 0
+        self.stop_event = threading.Event()
+        # SIGHUP: конфигурация перечитывается в основном цикле
+        self.reload_event = threading.Event()
+        self._reload_lock = threading.Lock()
+        # Значения из .env на момент последнего чтения (удаленные из файла ключи сбрасываются)
+        self.env_values = dotenv_values(env_file)
+        self.reloads = 0
+        self.last_reload = None
         self.errors_count = 0
         self.start_time = None
+        # Время от запуска процесса до готовности захвата и хранилища, мс
+        self.startup = {}
+
+    def start_logging(self):
+        """Логирование через очередь с ротацией файла (запускается в процессе демона)"""
+        os.makedirs(log_dir, exist_ok=True)
+        self.log_pipeline = setup_logging(log_file)
 
     def signal_handler(self, signum, frame):
         """Обработчик сигналов для корректного завершения"""
         logging.info(f"Получен сигнал {signum}, завершение работы...")
         self.running = False
+        self.stop_event.set()
+
+    def reload_handler(self, signum, frame):
+        """Обработчик SIGHUP: перечитывание конфигурации без остановки захвата"""
+        logging.info("Получен сигнал SIGHUP, перечитывание конфигурации...")
+        self.reload_event.set()
 
     def setup(self):
         try:
             # Настройка обработчиков сигналов
             signal.signal(signal.SIGTERM, self.signal_handler)
             signal.signal(signal.SIGINT, self.signal_handler)
+            signal.signal(signal.SIGHUP, self.reload_handler)
             
-            # Инициализация компонентов
-            self.db = Database()
-            self.reader = RFIDReader()
+            # Сначала считыватели: карты читаются, пока БД еще недоступна
+            configs = load_reader_configs()
+            self.reader_configs = {config['reader_id']: config for config in configs}
+            if os.getenv('CAPTURE_PROCESS', '0') == '1':
+                from capture_process import CaptureProcess
+                self.capture_process = CaptureProcess(configs)
+                self.capture_process.start()
+                self.readers = self.capture_process.readers
+            else:
+                self.backend = create_backend()
+                for config in configs:
+                    self.readers.append(RFIDReader(backend=self.backend, **config))
             
-            # Тестирование подключений
-            if not self.db.test_connection():
-                raise Exception("Не удалось подключиться к базе данных")
+            # Подключение к БД откладывается до первого запроса (см. start_storage)
+            self.db = create_storage(connect=False)
+            self.writer = CardWriter(self.db)
+            if self.db.local and os.getenv('REPLICATION_ENABLED', '1') == '1':
+                self.replicator = ReplicationWorker(self.db)
+            if os.getenv('ACCESS_CONTROL', '0') == '1':
+                # Список доступа синхронизируется с MySQL и при локальном хранилище
+                self.access = AccessList(self.replicator.upstream if self.replicator else self.db)
+            metrics_port = int(os.getenv('METRICS_PORT', '0'))
+            if metrics_port:
+                self.metrics_server = metrics.start_server(metrics_port, os.getenv('METRICS_HOST', '127.0.0.1'))
+            if socket_path():
+                try:
+                    self.status_server = StatusServer(self.status).start()
+                except OSError as e:
+                    logging.error(f"Не удалось открыть сокет состояния {socket_path()}: {e}")
+            if os.getenv('EVENT_SOCKET', '') or int(os.getenv('EVENT_PORT', '0')):
+                from event_stream import EventPublisher
+                try:
+                    self.events = EventPublisher().start()
+                except OSError as e:
+                    logging.error(f"Не удалось открыть сокет событий: {e}")
             
-            logging.info("Демон успешно инициализирован")
+            logging.info(f"Демон инициализирован за {(time.monotonic() - STARTED) * 1000:.0f} мс")
             return True
         except Exception as e:
             logging.error(f"Ошибка инициализации демона: {e}")
             return False
 
+    def start_storage(self):
+        """Запуск записи; проверка БД и загрузка списка доступа - в фоне"""
+        self.writer.start(thread=self.mode == 'thread')
+        if self.replicator:
+            self.replicator.start()
+        threading.Thread(target=self._check_storage, name='storage-check', daemon=True).start()
+
+    def _check_storage(self):
+        """Ожидание БД без остановки захвата: события до подключения остаются в журнале"""
+        if self.access:
+            # Снимок списка доступа загружается сразу; загрузка из БД (если снимка нет)
+            # и синхронизация повторяются в фоне, пока БД недоступна
+            self.access.start()
+        retry_delay = float(os.getenv('DB_CONNECT_RETRY', '10'))
+        while self.running:
+            if self.db.test_connection():
+                break
+            logging.warning(f"Хранилище {self.db.name} недоступно, повтор через {retry_delay:g} с")
+            self.stop_event.wait(retry_delay)
+        else:
+            return
+        try:
+            self.db.check_schema()
+        except Exception as e:
+            logging.error(f"Ошибка проверки схемы хранилища: {e}")
+        self.startup['storage_ms'] = round((time.monotonic() - STARTED) * 1000)
+        logging.info(f"Хранилище {self.db.name} готово через {self.startup['storage_ms']} мс после запуска")
+
+    def reload(self):
+        """Перечитывание .env и применение изменений на ходу
+
+        Очередь записи, журнал и окно подавления повторов сохраняются; пересоздаются
+        только измененные считыватели и подключение к БД при изменении его параметров.
+        """
+        with self._reload_lock:
+            previous = dict(os.environ)
+            values = dotenv_values(env_file)
+            # Ключи, удаленные из .env, больше не действуют
+            for key in self.env_values.keys() - values.keys():
+                os.environ.pop(key, None)
+            load_dotenv(env_file, override=True)
+            self.env_values = values
+            changed = {key for key in previous.keys() | os.environ.keys()
+                       if previous.get(key) != os.environ.get(key)}
+            self.apply_config(changed)
+            self.reloads += 1
+            self.last_reload = time.time()
+
+    def apply_config(self, changed):
+        """Применение новых значений окружения; changed - измененные ключи"""
+        restart = sorted(changed.intersection(RESTART_KEYS))
+        if restart:
+            logging.warning(f"Параметры применятся только после перезапуска: {', '.join(restart)}")
+
+        try:
+            self.dedup.configure()
+            if self.writer:
+                self.writer.configure()
+            if self.replicator:
+                self.replicator.configure()
+            if self.access:
+                self.access.configure()
+            if self.events:
+                self.events.configure()
+        except ValueError as e:
+            logging.error(f"Ошибка в параметрах конфигурации: {e}")
+
+        if changed.intersection(STORAGE_KEYS):
+            try:
+                self.reload_storage()
+            except Exception as e:
+                logging.error(f"Не удалось применить параметры подключения к БД: {e}")
+
+        try:
+            self.reload_readers(recreate_all=bool(changed.intersection(READER_KEYS)))
+        except Exception as e:
+            logging.error(f"Не удалось применить описания считывателей: {e}")
+        logging.info(f"Конфигурация перечитана, изменено параметров: {len(changed)}")
+
+    def reload_storage(self):
+        """Новое подключение к MySQL; события в очереди и журнале записываются через него"""
+        if self.db.local:
+            # Локальное хранилище не меняется, MySQL используется репликацией
+            if self.replicator:
+                self.replicator.reset_upstream()
+            if self.access:
+                self.access.db = self.replicator.upstream if self.replicator else self.db
+            logging.info("Подключение репликации к MySQL будет создано заново")
+            return
+        db = create_storage(self.db.name, connect=False)
+        previous, self.db = self.db, db
+        self.writer.db = db
+        if self.access:
+            self.access.db = db
+        # Дожидается запроса, выполняемого через старое подключение
+        previous.close()
+        logging.info(f"Подключение к БД заменено ({os.getenv('DB_HOST')}/{os.getenv('DB_NAME')})")
+
+    def reload_readers(self, recreate_all=False):
+        """Добавление, удаление и пересоздание измененных считывателей"""
+        configs = {config['reader_id']: config for config in load_reader_configs()}
+        unchanged = {reader_id for reader_id, config in configs.items()
+                     if not recreate_all and self.reader_configs.get(reader_id) == config}
+        if len(unchanged) == len(configs) == len(self.reader_configs):
+            return
+        if self.capture_process:
+            logging.warning("Изменение считывателей при CAPTURE_PROCESS=1 применится только после перезапуска")
+            return
+
+        removed = [reader for reader in self.readers if reader.reader_id not in unchanged]
+        # Потоки захвата удаленных считывателей завершаются, увидев себя вне списка
+        self.readers = [reader for reader in self.readers if reader.reader_id in unchanged]
+        for reader in removed:
+            self.stop_reader(reader)
+            self.reader_configs.pop(reader.reader_id, None)
+
+        readers = {reader.reader_id: reader for reader in self.readers}
+        added = []
+        for reader_id, config in configs.items():
+            if reader_id in unchanged:
+                continue
+            try:
+                readers[reader_id] = RFIDReader(backend=self.backend, **config)
+            except Exception as e:
+                logging.error(f"Не удалось создать считыватель {reader_id}: {e}")
+                continue
+            self.reader_configs[reader_id] = config
+            added.append(readers[reader_id])
+        self.readers = [readers[reader_id] for reader_id in configs if reader_id in readers]
+        for reader in added:
+            self.start_reader(reader)
+        logging.info(f"Считыватели обновлены: удалено {len(removed)}, запущено {len(added)}, "
+                     f"всего {len(self.readers)}")
+
+    def stop_reader(self, reader):
+        """Остановка считывателя; кадры, собранные до остановки, обрабатываются"""
+        self.join_capture(reader)
+        reader.stop_capture()
+        for event in reader.drain_events():
+            self.handle_event(event)
+        reader.cleanup()
+
+    def join_capture(self, reader):
+        thread = self.capture_threads.pop(reader.reader_id, None)
+        if thread:
+            thread.join(timeout=2)
+
     def log_statistics(self):
         """Логирование статистики работы"""
         if self.start_time:
@@ -67,44 +302,133 @@ class WGDaemon:
             minutes = int((uptime % 3600) // 60)
             seconds = int(uptime % 60)
             
+            stats = self.writer.stats()
+            by_reader = ', '.join(f"{reader.reader_id}: {self.writer.written_by_reader.get(reader.reader_id, 0)}"
+                                  for reader in self.readers)
             logging.info(f"Статистика: Время работы: {hours:02d}:{minutes:02d}:{seconds:02d}, "
-                        f"Карт обработано: {self.cards_processed}, Ошибок: {self.errors_count}")
+                        f"Карт обработано: {stats['written']} ({by_reader}), "
+                        f"Ошибок: {self.errors_count + stats['failed']}, "
+                        f"Очередь записи: {stats['queue_depth']}/{stats['queue_size']}, "
+                        f"Отброшено: {stats['dropped']}, Повторов подавлено: {self.dedup.suppressed}"
+                        + (f", В журнале: {stats['spool_pending_bytes']} байт" if 'spool_pending_bytes' in stats else "")
+                        + (f", Доступ разрешен/запрещен: {self.access.granted}/{self.access.denied}" if self.access else "")
+                        + (f", Ожидают репликации: {self.replicator.local.pending_count()}" if self.replicator else ""))
+
+    def status(self):
+        """Снимок состояния для сокета состояния"""
+        stats = self.writer.stats() if self.writer else {}
+        readers = {}
+        for reader in self.readers:
+            readers[reader.reader_id] = {
+                'capture_mode': reader.capture_mode,
+                'frames': metrics.FRAMES.value(reader.reader_id),
+                'rejected': reader.frames_rejected,
+                'duplicates': self.dedup.suppressed_by_reader.get(reader.reader_id, 0),
+                'written': self.writer.written_by_reader.get(reader.reader_id, 0) if self.writer else 0,
+                'last_card_time': self.last_card_time.get(reader.reader_id),
+            }
+            if reader.pulses:
+                readers[reader.reader_id]['pulses'] = reader.pulses.stats()
+        status = {
+            'pid': os.getpid(),
+            'mode': self.mode,
+            'running': self.running,
+            'start_time': self.start_time,
+            'uptime': time.time() - self.start_time if self.start_time else 0,
+            'errors': self.errors_count + stats.get('failed', 0),
+            'last_card_time': max(self.last_card_time.values(), default=None),
+            'dedup_suppressed': self.dedup.suppressed,
+            'startup': self.startup,
+            'reloads': self.reloads,
+            'last_reload': self.last_reload,
+            'readers': readers,
+            'writer': stats,
+        }
+        if self.access:
+            status['access'] = self.access.stats()
+        if self.replicator:
+            status['replication'] = self.replicator.stats()
+        if self.capture_process:
+            status['capture_process'] = self.capture_process.stats()
+        if self.events:
+            status['events'] = self.events.stats()
+        return status
+
+    def handle_event(self, event):
+        """Обработка прочитанной карты: решение о доступе, подавление повторов, запись"""
+        self.last_card_time[event.reader_id] = event.timestamp
+        if self.access:
+            # Решение принимается по локальному списку, без обращения к БД
+            event = self.access.check(event)
+        if self.dedup.accept(event):
+            if event.granted is not None:
+                logging.info(f"Считыватель {event.reader_id}: карта {event.card.value} - "
+                             f"доступ {'разрешен' if event.granted else 'запрещен'}")
+            # Подписчики получают событие до записи в БД
+            if self.events:
+                self.events.publish(event)
+            self.writer.submit(event)
+
+    def capture_loop(self, reader):
+        """Захват кадров одного считывателя в общую очередь записи"""
+        while self.running and reader in self.readers:
+            try:
+                # В режиме edge вызов блокируется до готовности кадра
+                event = reader.read_event(timeout=1.0)
+                if event:
+                    self.handle_event(event)
+                elif reader.capture_mode == 'poll':
+                    time.sleep(0.1)  # Небольшая задержка для снижения нагрузки на CPU
+            except Exception as e:
+                self.errors_count += 1
+                logging.error(f"Ошибка захвата считывателя {reader.reader_id}: {e}")
+                time.sleep(1)  # Пауза перед повторной попыткой
+
+    def start_reader(self, reader):
+        """Запуск потока захвата считывателя"""
+        thread = threading.Thread(
+            target=self.capture_loop, args=(reader,),
+            name=f'capture-{reader.reader_id}', daemon=True
+        )
+        thread.start()
+        self.capture_threads[reader.reader_id] = thread
+
+    def start_capture(self):
+        """Запуск потоков захвата для всех считывателей"""
+        for reader in self.readers:
+            self.start_reader(reader)
 
     def run(self):
+        self.start_logging()
         if not self.setup():
             logging.error("Не удалось инициализировать демон")
             sys.exit(1)
             
         self.running = True
         self.start_time = time.time()
-        logging.info("Демон запущен")
+        self.start_capture()
+        self.startup['capture_ms'] = round((time.monotonic() - STARTED) * 1000)
+        logging.info(f"Демон запущен, считывателей: {len(self.readers)}, "
+                     f"захват готов через {self.startup['capture_ms']} мс")
+        self.start_storage()
+        next_stats_time = self.start_time + 600
+        next_stats_count = 100
         
         try:
             while self.running:
                 try:
-                    card_number = self.reader.read_card()
-                    if card_number:
-                        retry_count = 0
-                        success = False
-                        
-                        while retry_count < 5 and not success:
-                            if self.db.save_card(card_number):
-                                self.cards_processed += 1
-                                success = True
-                                break
-                            retry_count += 1
-                            time.sleep(1)
-                        
-                        if not success:
-                            self.errors_count += 1
-                            logging.error(f"Не удалось сохранить карту {card_number} после 5 попыток")
+                    # Захват и запись идут в своих потоках, здесь только статистика
+                    self.stop_event.wait(1.0)
+                    
+                    if self.reload_event.is_set():
+                        self.reload_event.clear()
+                        self.reload()
                     
                     # Логирование статистики каждые 100 карт или каждые 10 минут
-                    if (self.cards_processed > 0 and self.cards_processed % 100 == 0) or \
-                       (time.time() - self.start_time) % 600 < 0.1:
+                    if self.writer.written >= next_stats_count or time.time() >= next_stats_time:
                         self.log_statistics()
-                    
-                    time.sleep(0.1)  # Небольшая задержка для снижения нагрузки на CPU
+                        next_stats_time = time.time() + 600
+                        next_stats_count = (self.writer.written // 100 + 1) * 100
                     
                 except Exception as e:
                     self.errors_count += 1
@@ -121,10 +445,31 @@ class WGDaemon:
     def cleanup(self):
         """Корректное завершение работы демона"""
         try:
+            self.running = False
+            
+            for thread in self.capture_threads.values():
+                thread.join(timeout=2)
+            for reader in self.readers:
+                reader.cleanup()
+            if self.capture_process:
+                self.capture_process.stop()
+            
+            if self.access:
+                self.access.stop()
+            
+            # Дозапись событий, оставшихся в очереди
+            if self.writer:
+                self.writer.stop()
+            if self.replicator:
+                self.replicator.stop()
             self.log_statistics()
             
-            if self.reader:
-                self.reader.cleanup()
+            if self.metrics_server:
+                self.metrics_server.shutdown()
+            if self.status_server:
+                self.status_server.stop()
+            if self.events:
+                self.events.stop()
             
             if self.db:
                 del self.db
@@ -132,14 +477,66 @@ class WGDaemon:
             logging.info("Демон остановлен")
         except Exception as e:
             logging.error(f"Ошибка при завершении работы: {e}")
+        finally:
+            if self.log_pipeline:
+                self.log_pipeline.stop()
+
+def print_pulse_stats(status):
+    """Вывод диагностики импульсов по считывателям из снимка состояния"""
+    for reader_id, reader in status['readers'].items():
+        pulses = reader.get('pulses')
+        if not pulses:
+            print(f"Считыватель {reader_id}: диагностика импульсов выключена")
+            continue
+        print(f"Считыватель {reader_id}: импульсов {pulses['pulses']} (в буфере {pulses['buffered']}), "
+              f"коротких {pulses['short_pulses']}, длинных {pulses['long_pulses']}, "
+              f"длинных интервалов {pulses['long_intervals']}, "
+              f"одновременно низких линий {pulses['simultaneous_low']}")
+        histograms = [('Длительность импульса', pulses['width_us']), ('Интервал между битами', pulses['interval_us'])]
+        if not pulses['measure_widths']:
+            histograms = histograms[1:]
+        for title, buckets in histograms:
+            print(f"  {title}, мкс:")
+            previous = 0
+            for bound, count in buckets:
+                label = f"{previous}-{bound}" if bound is not None else f">{previous}"
+                print(f"    {label:>12}: {count}")
+                previous = bound
+
 
 def main():
-    daemon = WGDaemon()
+    # thread - поток на считыватель (по умолчанию), asyncio - цикл событий
+    if os.getenv('DAEMON_MODE', 'thread') == 'asyncio':
+        from async_daemon import AsyncWGDaemon
+        daemon = AsyncWGDaemon()
+    else:
+        daemon = WGDaemon()
     
-    if len(sys.argv) != 2 or sys.argv[1] not in ['start', 'stop', 'restart', 'status']:
-        print("Использование: python wg_daemon.py [start|stop|restart|status]")
+    if len(sys.argv) != 2 or sys.argv[1] not in ['start', 'stop', 'restart', 'reload', 'status', 'pulses', 'events']:
+        print("Использование: python wg_daemon.py [start|stop|restart|reload|status|pulses|events]")
         sys.exit(1)
 
+    if sys.argv[1] == 'pulses':
+        try:
+            status = query_status()
+        except (OSError, ValueError) as e:
+            print(f"Нет связи с демоном через сокет состояния: {e}")
+            sys.exit(1)
+        print_pulse_stats(status)
+        sys.exit(0)
+
+    if sys.argv[1] == 'events':
+        from event_stream import iter_events
+        try:
+            for event in iter_events(port=int(os.getenv('EVENT_PORT', '0')), host=os.getenv('EVENT_HOST')):
+                print(json.dumps(event, ensure_ascii=False), flush=True)
+        except (OSError, ValueError) as e:
+            print(f"Нет связи с демоном через сокет событий: {e}")
+            sys.exit(1)
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
     if sys.argv[1] == 'status':
         if os.path.exists(daemon.pid_file):
             try:
@@ -147,6 +544,13 @@ def main():
                     pid = int(f.read().strip())
                 os.kill(pid, 0)  # Проверяем существование процесса
                 print(f"Демон запущен (PID: {pid})")
+                try:
+                    status = query_status()
+                    print(f"Время работы: {int(status['uptime'])} с, "
+                          f"карт записано: {status['writer']['written']}, "
+                          f"очередь записи: {status['writer']['queue_depth']}")
+                except (OSError, ValueError, KeyError):
+                    pass
             except (ProcessLookupError, ValueError):
                 print("Демон не запущен (PID файл устарел)")
                 if os.path.exists(daemon.pid_file):
@@ -171,6 +575,17 @@ def main():
             print("Демон не запущен")
         sys.exit(0)
 
+    if sys.argv[1] == 'reload':
+        try:
+            with open(daemon.pid_file, 'r') as f:
+                pid = int(f.read().strip())
+            os.kill(pid, signal.SIGHUP)
+            print("Конфигурация демона будет перечитана")
+        except (FileNotFoundError, ProcessLookupError, ValueError):
+            print("Демон не запущен")
+            sys.exit(1)
+        sys.exit(0)
+
     if sys.argv[1] == 'restart':
         if os.path.exists(daemon.pid_file):
             try:
@@ -181,13 +596,19 @@ def main():
             except ProcessLookupError:
                 pass
 
+    from daemonize import Daemonize
     daemonize = Daemonize(
         app="wg_daemon",
         pid=daemon.pid_file,
         action=daemon.run,
-        foreground=False
+        foreground=False,
+        # Относительные пути из .env (журнал, сокеты, снимок доступа, SQLite)
+        # отсчитываются от каталога запуска, а не от /
+        chdir=os.getcwd()
     )
     daemonize.start()
 
 if __name__ == "__main__":
+    # async_daemon импортирует этот модуль по имени - без его повторного выполнения
+    sys.modules.setdefault('wg_daemon', sys.modules[__name__])
     main() 
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+Декодирование кадров Wiegand по таблице форматов с проверкой четности
+"""
+
+import os
+from collections import namedtuple
+
+# Результат декодирования кадра.
+# value - все биты данных без битов четности; для 26-битного формата совпадает
+# с номером карты, который сохранялся в БД ранее (facility << 16 | card_number).
+WiegandCard = namedtuple('WiegandCard', ['format', 'facility', 'card_number', 'value', 'raw', 'bit_count'])
+
+
+class WiegandError(ValueError):
+    """Кадр отклонен: неизвестная длина или ошибка четности"""
+
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+def _mask(length, positions):
+    """Битовая маска по позициям кадра (позиция 0 передается первой)"""
+    mask = 0
+    for position in positions:
+        mask |= 1 << (length - 1 - position)
+    return mask
+
+
+def _ones(value):
+    return bin(value).count('1')
+
+
+class WiegandFormat:
+    """Описание формата Wiegand
+
+    Диапазоны полей задаются как (первая позиция, последняя позиция) включительно,
+    позиция 0 - первый переданный бит. Проверки четности задаются как
+    (позиция бита четности, 'even' | 'odd', позиции, которые он покрывает)
+    в порядке вычисления при кодировании.
+    """
+
+    def __init__(self, name, length, facility, card_number, value, parity):
+        self.name = name
+        self.length = length
+        self._fields = {}
+        for field, (first, last) in (('facility', facility), ('card_number', card_number), ('value', value)):
+            width = last - first + 1
+            self._fields[field] = (length - 1 - last, (1 << width) - 1)
+        self.value_bits = value[1] - value[0] + 1
+        self.max_value = (1 << self.value_bits) - 1
+        self.parity = []
+        for position, kind, covered in parity:
+            covered = set(covered) | {position}
+            self.parity.append((position, 1 if kind == 'odd' else 0, _mask(length, covered)))
+
+    def field(self, raw, name):
+        shift, mask = self._fields[name]
+        return (raw >> shift) & mask
+
+    def check_parity(self, raw):
+        for position, expected, mask in self.parity:
+            if _ones(raw & mask) & 1 != expected:
+                return False
+        return True
+
+    def decode(self, raw):
+        if not self.check_parity(raw):
+            raise WiegandError('parity', f"Ошибка четности в кадре {self.name}")
+        return WiegandCard(
+            format=self.name,
+            facility=self.field(raw, 'facility'),
+            card_number=self.field(raw, 'card_number'),
+            value=self.field(raw, 'value'),
+            raw=raw,
+            bit_count=self.length
+        )
+
+    def encode(self, value):
+        """Кадр (список битов) для значения без битов четности"""
+        shift, mask = self._fields['value']
+        raw = (value & mask) << shift
+        for position, expected, parity_mask in self.parity:
+            bit = 1 << (self.length - 1 - position)
+            if _ones(raw & parity_mask & ~bit) & 1 != expected:
+                raw |= bit
+        return [(raw >> (self.length - 1 - i)) & 1 for i in range(self.length)]
+
+
+FORMATS = {
+    # HID H10301: 8 бит кода объекта, 16 бит номера карты
+    26: WiegandFormat(
+        'H10301', 26,
+        facility=(1, 8), card_number=(9, 24), value=(1, 24),
+        parity=[(0, 'even', range(1, 13)), (25, 'odd', range(13, 25))]
+    ),
+    # HID H10306: 16 бит кода объекта, 16 бит номера карты
+    34: WiegandFormat(
+        'H10306', 34,
+        facility=(1, 16), card_number=(17, 32), value=(1, 32),
+        parity=[(0, 'even', range(1, 17)), (33, 'odd', range(17, 33))]
+    ),
+    # HID H10304: 16 бит кода объекта, 19 бит номера карты
+    37: WiegandFormat(
+        'H10304', 37,
+        facility=(1, 16), card_number=(17, 35), value=(1, 35),
+        parity=[(0, 'even', range(1, 19)), (36, 'odd', range(18, 36))]
+    ),
+    # HID Corporate 1000 (48 бит): 22 бита кода компании, 23 бита номера карты
+    48: WiegandFormat(
+        'C1000-48', 48,
+        facility=(2, 23), card_number=(24, 46), value=(2, 46),
+        parity=[
+            (1, 'even', [p for p in range(2, 46) if p % 3 != 1]),
+            (47, 'odd', [p for p in range(1, 47) if p % 3 != 0]),
+            (0, 'odd', range(1, 48)),
+        ]
+    ),
+}
+
+MAX_CARD_VALUE = max(fmt.max_value for fmt in FORMATS.values())
+
+
+def parse_formats(spec=None):
+    """Список допустимых форматов из строки вида '26,34' (по умолчанию WIEGAND_FORMATS или все)"""
+    spec = spec if spec is not None else os.getenv('WIEGAND_FORMATS', '')
+    if not spec.strip():
+        return dict(FORMATS)
+    formats = {}
+    for item in spec.split(','):
+        length = int(item.strip())
+        if length not in FORMATS:
+            raise ValueError(f"Неподдерживаемый формат Wiegand: {length} бит")
+        formats[length] = FORMATS[length]
+    return formats
+
+
+def decode(bits, formats=None):
+    """Декодирование кадра; WiegandError, если длина неизвестна или не сходится четность"""
+    formats = FORMATS if formats is None else formats
+    fmt = formats.get(len(bits))
+    if fmt is None:
+        raise WiegandError('length', f"Неподдерживаемая длина кадра: {len(bits)} бит")
+    raw = 0
+    for bit in bits:
+        raw = (raw << 1) | bit
+    return fmt.decode(raw)